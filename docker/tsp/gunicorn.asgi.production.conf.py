@@ -0,0 +1,18 @@
+# pylint: disable=invalid-name
+
+import multiprocessing
+import os
+
+GUNICORN_WORKER_COUNT = int(os.environ.get("GUNICORN_WORKER_COUNT", "0"), 10)
+HOST = os.environ.get("HOST", "0.0.0.0")  # nosec
+PORT = os.environ.get("PORT", "8000")
+
+bind = f"{HOST}:{PORT}"
+# Each worker runs an event loop holding many requests at once, one per CPU is enough.
+workers = GUNICORN_WORKER_COUNT or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+# Let clients keep their connections open between requests, e.g. while polling solutions.
+keepalive = 30
+
+# access_logfile = "/var/log/myfolab_api/gunicorn.log"
+# error_logfile = "/var/log/myfolab_api/gunicorn.err.log"
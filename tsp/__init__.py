@@ -0,0 +1,4 @@
+import time
+
+# Imported first by every entry point, this marks the start of the process for startup metrics.
+STARTED_AT = time.monotonic()
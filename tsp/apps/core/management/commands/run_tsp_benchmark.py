@@ -0,0 +1,82 @@
+"""
+Benchmark command for the TSP solving library.
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tsp.utils.benchmark import find_regressions, generate_instance, load_instances, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmarks distance matrix construction, scaling and solving on generated and TSPLIB instances."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="50,100,200,500",
+            help="Comma separated sizes of the generated instances.",
+        )
+        parser.add_argument(
+            "--instance",
+            action="append",
+            dest="instances",
+            type=Path,
+            help="TSPLIB instance to benchmark instead of the bundled ones. Can be repeated.",
+        )
+        parser.add_argument(
+            "--time-limit",
+            default=5,
+            type=float,
+            help="Search time limit (in seconds) of each solve.",
+        )
+        parser.add_argument(
+            "--vehicles",
+            default=4,
+            type=int,
+            help="Number of vehicles of the multiple vehicle solves.",
+        )
+        parser.add_argument(
+            "--max-pure-size",
+            default=1000,
+            type=int,
+            help="Largest instance the pure-Python distance matrix is benchmarked on.",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="File the JSON report is written to, printed when omitted.",
+        )
+        parser.add_argument(
+            "--baseline",
+            type=Path,
+            help="Previous JSON report to compare against.",
+        )
+        parser.add_argument(
+            "--threshold",
+            default=1.25,
+            type=float,
+            help="Fail when a wall time or objective exceeds the baseline's by this factor.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size]
+        problems = [generate_instance(size) for size in sizes] + load_instances(options["instances"])
+
+        report = run_benchmark(problems, options["time_limit"], options["vehicles"], options["max_pure_size"])
+        report_json = json.dumps(report, indent=2)
+
+        if options["output"]:
+            options["output"].write_text(report_json, encoding="utf-8")
+        else:
+            self.stdout.write(report_json)
+
+        if options["baseline"]:
+            baseline = json.loads(options["baseline"].read_text(encoding="utf-8"))
+            regressions = find_regressions(report, baseline, options["threshold"])
+
+            if regressions:
+                raise CommandError("Regressions found:\n" + "\n".join(regressions))
+
+            self.stdout.write(self.style.SUCCESS("No regressions found."))
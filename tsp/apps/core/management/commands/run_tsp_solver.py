@@ -1,23 +1,75 @@
 """
 TSP-solving background worker's run command.
 """
-import json
+import functools
 import logging
 import socket
+import sqlite3
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
 
 import pika.exceptions
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from pika.adapters.blocking_connection import BlockingChannel
 from pika.spec import Basic, BasicProperties
 
-from tsp.utils.amqp import Consumer, Publisher
+from tsp.utils import metrics
+from tsp.utils.amqp import AMQPBase, Consumer
+from tsp.utils.cache import get_problem_key, get_solution_cache
 from tsp.utils.common import retry_with_backoff
-from tsp.utils.tsplib import find_route
+from tsp.utils.progress import (
+    CANCELLED,
+    EXPIRED,
+    FAILED,
+    QUEUED,
+    SOLVED,
+    SOLVING,
+    CancellationCheck,
+    ProgressReporter,
+    is_cancelled,
+    set_progress,
+)
+from tsp.utils.scheduling import TIERS, parse_tier_concurrency
+from tsp.utils.serialization import dumps, get_content_type, loads
+from tsp.utils.store import get_solution_store
+from tsp.utils.tsplib import find_route_for_problem, prewarm
 
 logger = logging.getLogger(__name__)
 
+# Errors of problems that fail the same way however many times they're solved, so they're never retried.
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError, IndexError)
+
+# Id, data and error of a problem that couldn't be solved.
+FailedProblem = Tuple[str, Dict[str, Any], Exception]
+
+
+def find_route_with_metrics(
+    problem_data: Dict[str, Any], on_solution: ProgressReporter, should_stop: Optional[CancellationCheck] = None
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, metrics.HistogramSnapshot]]:
+    """
+    Solves a problem in a pool process, returning the solution along with the observations made meanwhile.
+
+    Pool processes keep their own metrics, which are merged back into the
+    worker's so they are all exposed from one place.
+    """
+    before = metrics.snapshot()
+    solution = find_route_for_problem(problem_data, on_solution, should_stop)
+
+    return solution, metrics.get_changes(before)
+
 
 class Command(BaseCommand):
+    # Concurrency of each tier the worker consumes, and their process pools when not solving inline.
+    tiers: Dict[str, int]
+    pools: Dict[str, ProcessPoolExecutor]
+    # Whether the routing solver is loaded before taking problems, see `prewarm`.
+    prewarm_solver: bool
+    # Whether the worker has been ready once, i.e. its startup is over.
+    started: bool
+
     def add_arguments(self, parser):
         # Named (optional) arguments
         parser.add_argument(
@@ -26,47 +78,461 @@ class Command(BaseCommand):
             type=int,
             help="Maximum number of retries for establishing consumer connection.",
         )
+        parser.add_argument(
+            "--concurrency",
+            default=1,
+            type=int,
+            help=(
+                "Number of problems of each tier solved in parallel by a process pool. "
+                "Solves inline when 1 and no tier sets its own concurrency."
+            ),
+        )
+        parser.add_argument(
+            "--tiers",
+            default=",".join(TIERS),
+            help=(
+                "Comma separated tiers of problems to consume, each optionally followed by its own concurrency, "
+                "e.g. interactive=4,standard."
+            ),
+        )
+        parser.add_argument(
+            "--metrics-port",
+            default=0,
+            type=int,
+            help="Port serving the worker's metrics and health check over HTTP. Disabled when 0.",
+        )
+        parser.add_argument(
+            "--no-prewarm",
+            action="store_true",
+            help="Load the routing solver on the first problem instead of before consuming.",
+        )
 
     @staticmethod
-    def _solve_problem(channel: BlockingChannel, method: Basic.Deliver, properties: BasicProperties, body: bytes):
-        del properties
+    def _decode_problems(properties: BasicProperties, body: bytes) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Returns the id and data of every problem in a message, sent alone or as a batch.
+
+        Messages are decoded according to their content type, JSON if unset.
+        """
+        message = loads(body, properties.content_type)
+        problems = message["problems"] if "problems" in message else [message]
+        return [(problem["id"], problem["problem"]) for problem in problems]
+
+    @staticmethod
+    def _save_solution(problem_id: str, problem_data: Dict[str, Any], solution: Optional[Dict[str, Any]]) -> None:
+        get_solution_store().set(
+            problem_id,
+            {
+                "id": problem_id,
+                "solution": solution,
+                # Maps the solution's routes onto the locations of problems warm-started from it.
+                "locations": problem_data.get("locations"),
+            },
+        )
+
+        if solution is not None:
+            get_solution_cache().set(get_problem_key(problem_data), solution)
 
-        problem = json.loads(body)
-        problem_id = problem["id"]
-        problem_data = problem["problem"]
+        set_progress(problem_id, SOLVED, solution["objective"] if solution else None)
 
+    @staticmethod
+    def _report_failure(problem_id: str, problem_data: Dict[str, Any], error: Exception) -> None:
+        """
+        Stores an error solution for a problem that won't be solved, so readers stop waiting for it.
+        """
         try:
-            with Publisher() as publisher:
-                publisher.publish_solution(
-                    json.dumps(
-                        {
-                            "id": problem_id,
-                            "solution": find_route(
-                                problem_data["locations"],
-                                problem_data.get("time_windows"),
-                                problem_data.get("depot", 0),
-                                problem_data.get("num_vehicles", 1),
-                            ),
-                        }
-                    ).encode()
-                )
+            get_solution_store().set(
+                problem_id,
+                {
+                    "id": problem_id,
+                    "solution": None,
+                    "error": f"{type(error).__name__}: {error}",
+                    "locations": problem_data.get("locations"),
+                },
+            )
+            set_progress(problem_id, FAILED)
+        except sqlite3.Error:
+            logger.error("Could not report failure of problem with id: %s", problem_id, exc_info=True)
 
-            channel.basic_ack(delivery_tag=method.delivery_tag)
+    @staticmethod
+    def _reply(
+        channel: BlockingChannel,
+        properties: BasicProperties,
+        problem_id: str,
+        status: str,
+        solution: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Sends the outcome of a problem to its publisher's reply queue, if it asked for one.
+
+        The solution is stored either way, a lost reply only makes the
+        publisher fall back to reading it from the store.
+        """
+        # pylint:disable=too-many-arguments
+        if not properties.reply_to:
+            return
 
-            logger.info("Solved problem with id: %s", problem_id)
+        content_type = get_content_type(properties.content_type)
+
+        try:
+            channel.basic_publish(
+                exchange="",
+                routing_key=properties.reply_to,
+                body=dumps({"id": problem_id, "status": status, "solution": solution}, content_type),
+                properties=BasicProperties(content_type=content_type, correlation_id=problem_id),
+            )
+        except pika.exceptions.AMQPError:
+            logger.warning("Could not reply to problem with id: %s", problem_id, exc_info=True)
+
+    @staticmethod
+    def _observe_queue_wait(properties: BasicProperties) -> None:
+        enqueued_at = (properties.headers or {}).get(AMQPBase.ENQUEUED_AT_HEADER)
+
+        # Messages published before the header was introduced have no enqueue time.
+        if enqueued_at is not None:
+            metrics.QUEUE_WAIT_SECONDS.observe(max(time.time() - enqueued_at, 0.0))
+
+    @staticmethod
+    def _drop_problem(channel: BlockingChannel, properties: BasicProperties, problem_id: str, status: str) -> None:
+        logger.info("Dropped %s problem with id: %s", status, problem_id)
+        set_progress(problem_id, status)
+        Command._reply(channel, properties, problem_id, status)
+
+    @staticmethod
+    def _drop_stale_problem(channel: BlockingChannel, properties: BasicProperties, problem_id: str) -> bool:
+        """
+        Drops a problem that expired in the queue or was cancelled before being solved, returns whether it did.
+        """
+        expires_at = (properties.headers or {}).get(AMQPBase.EXPIRES_AT_HEADER)
+
+        if expires_at is not None and time.time() >= expires_at:
+            Command._drop_problem(channel, properties, problem_id, EXPIRED)
+        elif is_cancelled(problem_id):
+            Command._drop_problem(channel, properties, problem_id, CANCELLED)
+        else:
+            return False
+
+        return True
+
+    @staticmethod
+    def _finish_problem(
+        channel: BlockingChannel,
+        properties: BasicProperties,
+        problem_id: str,
+        problem_data: Dict[str, Any],
+        solution: Optional[Dict[str, Any]],
+    ) -> None:
+        """
+        Saves the solution of a problem and replies with it, unless the problem was cancelled while being solved.
+        """
+        # pylint:disable=too-many-arguments
+        # The search may have ended early on cancellation, its solution is discarded either way.
+        if is_cancelled(problem_id):
+            Command._drop_problem(channel, properties, problem_id, CANCELLED)
+            return
+
+        Command._save_solution(problem_id, problem_data, solution)
+
+        logger.info("Solved problem with id: %s", problem_id)
+
+        Command._reply(channel, properties, problem_id, SOLVED, solution)
+
+    @staticmethod
+    def _receive_problems(
+        channel: BlockingChannel, method: Basic.Deliver, properties: BasicProperties, body: bytes
+    ) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Returns the problems of a message, or `None` after dead-lettering it if it can't be decoded.
+
+        Redelivered messages count as a failed try and are requeued or
+        dead-lettered without being solved, see `_handle_failures`. Their
+        previous delivery may have killed the worker, e.g. by running out of
+        memory, before any exception could be counted.
+        """
+        Command._observe_queue_wait(properties)
+
+        try:
+            problems = Command._decode_problems(properties, body)
         except Exception:  # pylint:disable=broad-except
+            logger.error("Could not decode message, dead-lettering it", exc_info=True)
+            channel.basic_publish(
+                exchange=AMQPBase.DEAD_LETTER_EXCHANGE_NAME,
+                routing_key=method.routing_key,
+                body=body,
+                properties=properties,
+            )
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+
+            return None
+
+        if not method.redelivered:
+            return problems
+
+        logger.warning("Message was redelivered, counting it as a failed try")
+        error = RuntimeError("The problem was redelivered, its previous try didn't finish.")
+        Command._handle_failures(
+            channel, method, properties, [(problem_id, problem_data, error) for problem_id, problem_data in problems]
+        )
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+        return None
+
+    @staticmethod
+    def _handle_failures(
+        channel: BlockingChannel, method: Basic.Deliver, properties: BasicProperties, problems: List[FailedProblem]
+    ) -> None:
+        """
+        Requeues the failed problems of a message for another try, or fails and dead-letters them.
+
+        Only failed problems are published again, in a message of their own,
+        so the rest of a batch isn't solved twice. Problems are retried up to
+        `QUEUE_MAX_RETRIES` times, unless their errors are permanent. Must be
+        called before acknowledging the message, so none of them is lost.
+        """
+        if not problems:
+            return
+
+        headers = dict(properties.headers or {})
+        retry_count = headers.get(AMQPBase.RETRY_COUNT_HEADER, 0)
+        retry = retry_count < settings.QUEUE_MAX_RETRIES and not any(
+            isinstance(error, PERMANENT_ERRORS) for _, _, error in problems
+        )
+
+        if retry:
+            headers[AMQPBase.RETRY_COUNT_HEADER] = retry_count + 1
+
+            # Marked queued first, another worker may solve the problems before publishing returns.
+            for problem_id, _, _ in problems:
+                logger.info("Requeuing problem with id %s, retry %s", problem_id, retry_count + 1)
+
+                try:
+                    set_progress(problem_id, QUEUED)
+                except sqlite3.Error:
+                    logger.error("Could not report requeuing of problem with id: %s", problem_id, exc_info=True)
+
+        content_type = get_content_type(properties.content_type)
+        channel.basic_publish(
+            exchange="" if retry else AMQPBase.DEAD_LETTER_EXCHANGE_NAME,
+            routing_key=method.routing_key,
+            body=dumps(
+                {
+                    "problems": [
+                        {"id": problem_id, "problem": problem_data} for problem_id, problem_data, _ in problems
+                    ]
+                },
+                content_type,
+            ),
+            # Expired problems are dropped on the next try thanks to their headers.
+            properties=BasicProperties(
+                content_type=content_type,
+                headers=headers,
+                reply_to=properties.reply_to,
+                correlation_id=properties.correlation_id,
+            ),
+        )
+
+        if retry:
+            return
+
+        for problem_id, problem_data, error in problems:
+            Command._report_failure(problem_id, problem_data, error)
+            Command._reply(channel, properties, problem_id, FAILED)
+
+    @staticmethod
+    def _solve_problem(channel: BlockingChannel, method: Basic.Deliver, properties: BasicProperties, body: bytes):
+        problems = Command._receive_problems(channel, method, properties, body)
+
+        if problems is None:
+            return
+
+        failed: List[FailedProblem] = []
+
+        for problem_id, problem_data in problems:
+            try:
+                if not Command._drop_stale_problem(channel, properties, problem_id):
+                    set_progress(problem_id, SOLVING)
+
+                    solution = find_route_for_problem(
+                        problem_data, ProgressReporter(problem_id), CancellationCheck(problem_id)
+                    )
+                    Command._finish_problem(channel, properties, problem_id, problem_data, solution)
+            except Exception as exc:  # pylint:disable=broad-except
+                logger.error("Could not solve problem with id: %s", problem_id, exc_info=True, stack_info=True)
+                failed.append((problem_id, problem_data, exc))
+
+        Command._handle_failures(channel, method, properties, failed)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    @staticmethod
+    def _complete_problem(
+        channel: BlockingChannel,
+        properties: BasicProperties,
+        problem_id: str,
+        problem_data: Dict[str, Any],
+        future: Future,
+    ) -> Optional[Exception]:
+        """
+        Finishes a pooled solve like `_finish_problem` does and returns its error if it failed.
+        """
+        # pylint:disable=too-many-arguments
+        try:
+            solution, changes = future.result()
+            metrics.merge(changes)
+
+            Command._finish_problem(channel, properties, problem_id, problem_data, solution)
+        except Exception as exc:  # pylint:disable=broad-except
             logger.error("Could not solve problem with id: %s", problem_id, exc_info=True, stack_info=True)
 
+            return exc
+
+        return None
+
+    def _dispatch_problem(
+        self, tier: str, channel: BlockingChannel, method: Basic.Deliver, properties: BasicProperties, body: bytes
+    ):
+        """
+        Hands the problems of a message to its tier's process pool without blocking the connection thread.
+
+        The message is acked once all of them are done, after handling failures like inline solves do.
+        """
+        # pylint:disable=too-many-arguments
+        problems = self._receive_problems(channel, method, properties, body)
+
+        if problems is None:
+            return
+
+        # Only touched from the connection thread, the only thread allowed to use `channel`.
+        pending_count = len(problems)
+        failed: List[FailedProblem] = []
+
+        def record_outcome(problem_id: str, problem_data: Dict[str, Any], error: Optional[Exception]) -> None:
+            nonlocal pending_count
+            pending_count -= 1
+
+            if error is not None:
+                failed.append((problem_id, problem_data, error))
+
+            if not pending_count:
+                self._handle_failures(channel, method, properties, failed)
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+
+        def on_done(problem_id: str, problem_data: Dict[str, Any], future: Future) -> None:
+            try:
+                channel.connection.add_callback_threadsafe(
+                    lambda: record_outcome(
+                        problem_id,
+                        problem_data,
+                        self._complete_problem(channel, properties, problem_id, problem_data, future),
+                    )
+                )
+            except pika.exceptions.AMQPError:
+                # The message is redelivered once the consumer reconnects.
+                logger.warning("Connection lost before problem with id %s was acknowledged", problem_id)
+
+        for problem_id, problem_data in problems:
+            try:
+                future = self._submit_problem(tier, channel, properties, problem_id, problem_data)
+            except Exception as exc:  # pylint:disable=broad-except
+                logger.error("Could not solve problem with id: %s", problem_id, exc_info=True, stack_info=True)
+                record_outcome(problem_id, problem_data, exc)
+                continue
+
+            if future is None:
+                record_outcome(problem_id, problem_data, None)
+            else:
+                future.add_done_callback(functools.partial(on_done, problem_id, problem_data))
+
+    def _submit_problem(
+        self,
+        tier: str,
+        channel: BlockingChannel,
+        properties: BasicProperties,
+        problem_id: str,
+        problem_data: Dict[str, Any],
+    ) -> Optional[Future]:
+        """
+        Hands a problem to its tier's process pool, returns `None` if it was dropped instead.
+
+        A pool is broken for good once one of its processes dies, e.g. killed
+        for running out of memory, so it is replaced by a new one.
+        """
+        # pylint:disable=too-many-arguments
+        if self._drop_stale_problem(channel, properties, problem_id):
+            return None
+
+        set_progress(problem_id, SOLVING)
+        task = (find_route_with_metrics, problem_data, ProgressReporter(problem_id), CancellationCheck(problem_id))
+
+        try:
+            return self.pools[tier].submit(*task)
+        except BrokenProcessPool:
+            logger.warning("Process pool of tier %s is broken, replacing it", tier)
+            self.pools[tier].shutdown(wait=False)
+            self.pools[tier] = self._create_pool(tier)
+
+            return self.pools[tier].submit(*task)
+
+    def _create_pool(self, tier: str) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.tiers[tier], initializer=prewarm if self.prewarm_solver else None)
+
     def _real_handle(self):
         try:
             with Consumer() as consumer:
-                consumer.consume_problem(self._solve_problem)
+                for tier, concurrency in self.tiers.items():
+                    if self.pools:
+                        # Prefetch is tied to the pool size so each process has one problem at a time.
+                        consumer.subscribe_problem(
+                            functools.partial(self._dispatch_problem, tier), prefetch_count=concurrency, tier=tier
+                        )
+                    else:
+                        # One problem at a time, so the rest of every tier is left to other workers meanwhile.
+                        consumer.subscribe_problem(self._solve_problem, prefetch_count=1, tier=tier)
+
+                self._declare_ready()
+                consumer.start_consuming()
         except KeyboardInterrupt:
             consumer.close()
+        finally:
+            # Not ready again until reconnected.
+            metrics.READY.clear()
+
+    def _declare_ready(self) -> None:
+        if not self.started:
+            self.started = True
+            logger.info("Ready to solve problems %.3f seconds after start", metrics.observe_startup())
+
+        metrics.READY.set()
 
     def handle(self, *args, **options):
         max_retry = options["max_retry"]
+        concurrency = options["concurrency"]
 
-        return retry_with_backoff(
-            self._real_handle, retries=max_retry, exceptions=(pika.exceptions.AMQPError, socket.gaierror)
-        )
+        try:
+            tiers = parse_tier_concurrency(options["tiers"])
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.tiers = {tier: tier_concurrency or concurrency for tier, tier_concurrency in tiers.items()}
+        self.pools = {}
+        self.prewarm_solver = not options["no_prewarm"]
+        self.started = False
+
+        # Started first, so health checks report the worker as starting rather than down.
+        if options["metrics_port"]:
+            metrics.start_metrics_server(options["metrics_port"])
+
+        # Forked pool processes inherit the loaded solver, others load it as they start.
+        if self.prewarm_solver:
+            prewarm()
+
+        # Each tier gets its own processes, so long solves of one tier never hold up another one.
+        if concurrency > 1 or any(tiers.values()):
+            self.pools = {tier: self._create_pool(tier) for tier in self.tiers}
+
+        try:
+            return retry_with_backoff(
+                self._real_handle, retries=max_retry, exceptions=(pika.exceptions.AMQPError, socket.gaierror)
+            )
+        finally:
+            for pool in self.pools.values():
+                pool.shutdown(wait=False)
@@ -0,0 +1,292 @@
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import msgpack
+import pytest
+from pika import BasicProperties
+from pika.spec import Basic
+
+from tsp.apps.core.management.commands import run_tsp_solver
+from tsp.utils import metrics
+from tsp.utils.amqp import AMQPBase
+from tsp.utils.progress import cancel_problem, get_progress
+
+
+def test_dispatch_problem_acks_from_connection_thread(solution_store):
+    channel = mock.MagicMock()
+    connection_callbacks = []
+    channel.connection.add_callback_threadsafe.side_effect = connection_callbacks.append
+
+    command = run_tsp_solver.Command()
+    command.pools = {"standard": ThreadPoolExecutor(max_workers=1)}
+
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+    command._dispatch_problem("standard", channel, Basic.Deliver(delivery_tag=7), BasicProperties(), body)
+    command.pools["standard"].shutdown(wait=True)
+
+    # Nothing touches the channel until the connection thread runs the callback.
+    channel.basic_ack.assert_not_called()
+
+    for callback in connection_callbacks:
+        callback()
+
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+    assert solution_store.get("problem")["solution"]["objective"] > 0
+    assert get_progress("problem")["status"] == "solved"
+
+
+def test_dispatch_problem_replaces_broken_pools(solution_store, monkeypatch):
+    channel = mock.MagicMock()
+    channel.connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+    broken_pool = mock.Mock(submit=mock.Mock(side_effect=BrokenProcessPool()))
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(run_tsp_solver.Command, "_create_pool", lambda self, tier: pool)
+
+    command = run_tsp_solver.Command()
+    command.pools = {"standard": broken_pool}
+
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+    command._dispatch_problem("standard", channel, Basic.Deliver(delivery_tag=7), BasicProperties(), body)
+    pool.shutdown(wait=True)
+
+    broken_pool.shutdown.assert_called_once_with(wait=False)
+    assert command.pools["standard"] is pool
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+    assert solution_store.get("problem")["solution"]["objective"] > 0
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_dispatch_problem_retries_problems_it_could_not_submit(monkeypatch):
+    monkeypatch.setattr(run_tsp_solver, "set_progress", mock.Mock(side_effect=sqlite3.OperationalError("locked")))
+    channel = mock.MagicMock()
+    method = Basic.Deliver(delivery_tag=7, routing_key="tspproblems")
+
+    command = run_tsp_solver.Command()
+    command.pools = {"standard": mock.Mock()}
+
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+    command._dispatch_problem("standard", channel, method, BasicProperties(), body)
+
+    command.pools["standard"].submit.assert_not_called()
+    assert channel.basic_publish.call_args.kwargs["properties"].headers[AMQPBase.RETRY_COUNT_HEADER] == 1
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+
+def test_solve_problem_acks_batches_once(solution_store):
+    channel = mock.MagicMock()
+    body = json.dumps(
+        {
+            "problems": [
+                {"id": "solved", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}},
+                {"id": "failed", "problem": {"locations": [[0, 0], [3, 4]], "metric": "unknown"}},
+            ]
+        }
+    ).encode()
+
+    run_tsp_solver.Command._solve_problem(channel, Basic.Deliver(delivery_tag=7), BasicProperties(), body)
+
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+    assert solution_store.get("solved")["solution"]["objective"] > 0
+    assert get_progress("failed")["status"] == "failed"
+
+    # Invalid problems are dead-lettered without a retry, and without the rest of their batch.
+    dead_letter = channel.basic_publish.call_args.kwargs
+    assert dead_letter["exchange"] == AMQPBase.DEAD_LETTER_EXCHANGE_NAME
+    assert [problem["id"] for problem in json.loads(dead_letter["body"])["problems"]] == ["failed"]
+    assert solution_store.get("failed")["error"].startswith("ValueError")
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_solve_problem_observes_queue_wait():
+    before = metrics.snapshot()
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+    properties = BasicProperties(headers={AMQPBase.ENQUEUED_AT_HEADER: time.time() - 2})
+
+    run_tsp_solver.Command._solve_problem(mock.MagicMock(), Basic.Deliver(delivery_tag=7), properties, body)
+
+    changes = metrics.get_changes(before)
+    assert changes[metrics.QUEUE_WAIT_SECONDS.name][2] == 1
+    assert changes[metrics.QUEUE_WAIT_SECONDS.name][1] >= 2
+    assert changes[metrics.SOLVE_SECONDS.name][2] == 1
+
+
+def test_find_route_with_metrics_returns_observations():
+    solution, changes = run_tsp_solver.find_route_with_metrics({"locations": [[0, 0], [3, 4], [6, 8]]}, mock.Mock())
+
+    assert solution["objective"] > 0
+    assert changes[metrics.SOLVE_SECONDS.name][2] == 1
+
+
+def test_solve_problem_decodes_msgpack_messages(solution_store):
+    channel = mock.MagicMock()
+    body = msgpack.packb({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}})
+
+    run_tsp_solver.Command._solve_problem(
+        channel, Basic.Deliver(delivery_tag=7), BasicProperties(content_type="application/msgpack"), body
+    )
+
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+    assert solution_store.get("problem")["solution"]["objective"] > 0
+
+
+def test_handle_consumes_each_tier_with_its_own_pool(monkeypatch):
+    consumer = mock.MagicMock()
+    consumer.__enter__.return_value = consumer
+    monkeypatch.setattr(run_tsp_solver, "Consumer", mock.Mock(return_value=consumer))
+    monkeypatch.setattr(run_tsp_solver, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    command = run_tsp_solver.Command()
+    command.handle(max_retry=0, concurrency=1, tiers="interactive=3,bulk", metrics_port=0, no_prewarm=True)
+
+    assert {tier: pool._max_workers for tier, pool in command.pools.items()} == {"interactive": 3, "bulk": 1}
+    assert [
+        (call.kwargs["tier"], call.kwargs["prefetch_count"]) for call in consumer.subscribe_problem.call_args_list
+    ] == [("interactive", 3), ("bulk", 1)]
+    consumer.start_consuming.assert_called_once()
+
+
+def test_handle_prefetches_one_problem_per_tier_when_solving_inline(monkeypatch):
+    consumer = mock.MagicMock()
+    consumer.__enter__.return_value = consumer
+    monkeypatch.setattr(run_tsp_solver, "Consumer", mock.Mock(return_value=consumer))
+
+    run_tsp_solver.Command().handle(
+        max_retry=0, concurrency=1, tiers="interactive,bulk", metrics_port=0, no_prewarm=True
+    )
+
+    assert [call.kwargs["prefetch_count"] for call in consumer.subscribe_problem.call_args_list] == [1, 1]
+
+
+def test_solve_problem_replies_to_publisher(solution_store):
+    channel = mock.MagicMock()
+    body = msgpack.packb({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}})
+    properties = BasicProperties(content_type="application/msgpack", reply_to="amq.gen-reply")
+
+    run_tsp_solver.Command._solve_problem(channel, Basic.Deliver(delivery_tag=7), properties, body)
+
+    reply = channel.basic_publish.call_args.kwargs
+    assert reply["routing_key"] == "amq.gen-reply"
+    assert reply["properties"].correlation_id == "problem"
+    assert msgpack.unpackb(reply["body"]) == {
+        "id": "problem",
+        "status": "solved",
+        "solution": solution_store.get("problem")["solution"],
+    }
+
+
+def test_handle_prewarms_before_declaring_itself_ready(monkeypatch):
+    consumer = mock.MagicMock()
+    consumer.__enter__.return_value = consumer
+    readiness = []
+    consumer.start_consuming.side_effect = lambda: readiness.append(metrics.READY.is_set())
+    monkeypatch.setattr(run_tsp_solver, "Consumer", mock.Mock(return_value=consumer))
+    _, _, prewarm_count = metrics.PREWARM_SECONDS.snapshot()
+    _, _, startup_count = metrics.STARTUP_SECONDS.snapshot()
+
+    run_tsp_solver.Command().handle(max_retry=0, concurrency=1, tiers="standard", metrics_port=0, no_prewarm=False)
+
+    assert metrics.PREWARM_SECONDS.snapshot()[2] == prewarm_count + 1
+    assert metrics.STARTUP_SECONDS.snapshot()[2] == startup_count + 1
+    assert readiness == [True]
+    assert not metrics.READY.is_set()
+
+
+def test_solve_problem_drops_expired_and_cancelled_problems(solution_store):
+    channel = mock.MagicMock()
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+    properties = BasicProperties(headers={AMQPBase.EXPIRES_AT_HEADER: time.time() - 1}, reply_to="amq.gen-reply")
+
+    run_tsp_solver.Command._solve_problem(channel, Basic.Deliver(delivery_tag=7), properties, body)
+
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+    assert json.loads(channel.basic_publish.call_args.kwargs["body"])["status"] == "expired"
+    assert get_progress("problem")["status"] == "expired"
+
+    cancel_problem("problem")
+    run_tsp_solver.Command._solve_problem(channel, Basic.Deliver(delivery_tag=8), BasicProperties(), body)
+
+    channel.basic_ack.assert_called_with(delivery_tag=8)
+    assert get_progress("problem")["status"] == "cancelled"
+    assert solution_store.get("problem") is None
+
+
+def test_solve_problem_discards_solution_of_problem_cancelled_while_solving(solution_store, monkeypatch):
+    def find_route_for_problem(problem_data, on_solution, should_stop):
+        del problem_data, on_solution
+        cancel_problem("problem")
+        assert should_stop()
+
+        return {"objective": 42}
+
+    monkeypatch.setattr(run_tsp_solver, "find_route_for_problem", find_route_for_problem)
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+
+    run_tsp_solver.Command._solve_problem(mock.MagicMock(), Basic.Deliver(delivery_tag=7), BasicProperties(), body)
+
+    assert get_progress("problem")["status"] == "cancelled"
+    assert solution_store.get("problem") is None
+
+
+def test_solve_problem_retries_failures_then_dead_letters_them(solution_store, settings, monkeypatch):
+    settings.QUEUE_MAX_RETRIES = 1
+    monkeypatch.setattr(run_tsp_solver, "find_route_for_problem", mock.Mock(side_effect=RuntimeError("crash")))
+    channel = mock.MagicMock()
+    method = Basic.Deliver(delivery_tag=7, routing_key="tspproblems.standard")
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+
+    run_tsp_solver.Command._solve_problem(channel, method, BasicProperties(reply_to="amq.gen-reply"), body)
+
+    retry = channel.basic_publish.call_args.kwargs
+    assert (retry["exchange"], retry["routing_key"]) == ("", "tspproblems.standard")
+    assert retry["properties"].headers[AMQPBase.RETRY_COUNT_HEADER] == 1
+    assert retry["properties"].reply_to == "amq.gen-reply"
+    assert get_progress("problem")["status"] == "queued"
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    channel.reset_mock()
+    run_tsp_solver.Command._solve_problem(channel, method, retry["properties"], retry["body"])
+
+    dead_letter, reply = [call.kwargs for call in channel.basic_publish.call_args_list]
+    assert json.loads(reply["body"])["status"] == "failed"
+    assert dead_letter["exchange"] == AMQPBase.DEAD_LETTER_EXCHANGE_NAME
+    assert get_progress("problem")["status"] == "failed"
+    assert solution_store.get("problem")["error"] == "RuntimeError: crash"
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+
+def test_solve_problem_dead_letters_undecodable_messages():
+    channel = mock.MagicMock()
+
+    run_tsp_solver.Command._solve_problem(channel, Basic.Deliver(delivery_tag=7), BasicProperties(), b"{")
+
+    dead_letter = channel.basic_publish.call_args.kwargs
+    assert (dead_letter["exchange"], dead_letter["body"]) == (AMQPBase.DEAD_LETTER_EXCHANGE_NAME, b"{")
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+
+def test_solve_problem_counts_redeliveries_as_failed_tries(solution_store, settings, monkeypatch):
+    # A redelivered message may have killed the worker, it is never solved again in place.
+    settings.QUEUE_MAX_RETRIES = 1
+    find_route_for_problem = mock.Mock()
+    monkeypatch.setattr(run_tsp_solver, "find_route_for_problem", find_route_for_problem)
+    channel = mock.MagicMock()
+    method = Basic.Deliver(delivery_tag=7, redelivered=True, routing_key="tspproblems")
+    body = json.dumps({"id": "problem", "problem": {"locations": [[0, 0], [3, 4], [6, 8]]}}).encode()
+
+    run_tsp_solver.Command._solve_problem(channel, method, BasicProperties(), body)
+
+    retry = channel.basic_publish.call_args.kwargs
+    assert (retry["exchange"], retry["properties"].headers[AMQPBase.RETRY_COUNT_HEADER]) == ("", 1)
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    channel.reset_mock()
+    run_tsp_solver.Command._solve_problem(channel, method, retry["properties"], retry["body"])
+
+    assert channel.basic_publish.call_args.kwargs["exchange"] == AMQPBase.DEAD_LETTER_EXCHANGE_NAME
+    assert get_progress("problem")["status"] == "failed"
+    assert solution_store.get("problem")["error"].startswith("RuntimeError")
+    find_route_for_problem.assert_not_called()
@@ -1,6 +1,334 @@
-from django.test.client import Client
+import json
+import subprocess  # nosec
+import sys
+from unittest import mock
+from uuid import UUID, uuid4
+
+import msgpack
+import pika.exceptions
+import pytest
+from asgiref.sync import async_to_sync
+from django.test.client import Client, RequestFactory
 from django.urls import reverse
 
+from tsp.apps.core.views import get_tsp_solution_async, solve_tsp_async
+from tsp.utils.amqp import async_publisher_pool, publisher_pool
+from tsp.utils.cache import get_problem_key, get_solution_cache
+from tsp.utils.progress import QUEUED, SOLVED, get_progress, is_cancelled, set_progress
+
 
 def test_health_check_returns_ok(client: Client):
     assert client.get(reverse("health-check")).content == b"ok"
+
+
+def test_web_process_never_loads_the_solver(settings):
+    # Checked in a fresh interpreter, this one has loaded it for other tests.
+    code = "import sys, tsp.asgi, tsp.urls; sys.exit('ortools' in sys.modules)"
+
+    assert (
+        subprocess.run([sys.executable, "-c", code], cwd=settings.BASE_DIR.parent, check=False).returncode == 0
+    )  # nosec
+
+
+def test_solve_tsp_rejects_invalid_solver_options(client: Client):
+    response = client.post(
+        reverse("solve-tsp"),
+        {"locations": [[0, 0], [1, 1]], "solver_options": {"time_limit": -1}},
+        content_type="application/json",
+    )
+
+    assert response.status_code == 400
+
+
+def test_solve_tsp_rejects_more_decomposition_clusters_than_vehicles(client: Client):
+    problem = {
+        "locations": [[0, 0], [1, 1], [2, 3]],
+        "num_vehicles": 3,
+        "solver_options": {"decomposition": "sweep", "decomposition_clusters": 5},
+    }
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(reverse("solve-tsp"), problem, content_type="application/json")
+
+    assert response.status_code == 400
+    publish_problem.assert_not_called()
+
+
+def test_solve_tsp_rejects_decomposition_of_matrices(client: Client):
+    problem = {"distance_matrix": [[0, 1], [1, 0]], "num_vehicles": 2, "solver_options": {"decomposition": "sweep"}}
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(reverse("solve-tsp"), problem, content_type="application/json")
+
+    assert response.status_code == 400
+    assert response.json()["message"] == "Decomposition requires locations."
+    publish_problem.assert_not_called()
+
+
+def test_get_tsp_solution_reads_solution_store(client: Client, solution_store):
+    problem_id = str(uuid4())
+    url = reverse("get-tsp-solution", kwargs={"problem_id": problem_id})
+
+    assert client.get(url).json() == {"id": problem_id, "solution": None}
+
+    solution_store.set(problem_id, {"id": problem_id, "solution": {"objective": 42}})
+
+    assert client.get(url).json() == {"id": problem_id, "solution": {"objective": 42}}
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_solve_tsp_reuses_cached_solution(client: Client):
+    problem = {"locations": [[0, 0], [1, 1]]}
+    get_solution_cache().set(get_problem_key(problem), {"objective": 42})
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(reverse("solve-tsp"), problem, content_type="application/json")
+
+    publish_problem.assert_not_called()
+    assert client.get(response.json()["solution_location"]).json()["solution"] == {"objective": 42}
+
+
+def test_stream_tsp_solution_streams_progress_until_solved(client: Client, solution_store, settings):
+    settings.SOLUTION_PROGRESS_INTERVAL = 0
+    problem_id = str(uuid4())
+    solution_store.set(problem_id, {"id": problem_id, "solution": {"objective": 42}})
+    set_progress(problem_id, SOLVED, 42)
+
+    response = client.get(reverse("stream-tsp-solution", kwargs={"problem_id": problem_id}))
+
+    async def read_events() -> str:
+        return b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+    assert response["Content-Type"] == "text/event-stream"
+    assert async_to_sync(read_events)().split("\n\n")[:2] == [
+        f'event: progress\ndata: {{"id": "{problem_id}", "status": "solved", "objective": 42}}',
+        f'event: solution\ndata: {{"id": "{problem_id}", "solution": {{"objective": 42}}}}',
+    ]
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_solve_tsp_batch_publishes_uncached_problems(client: Client, settings):
+    settings.BATCH_MESSAGE_SIZE = 2
+    problems = [{"locations": [[0, 0], [index, index]]} for index in range(1, 6)]
+    get_solution_cache().set(get_problem_key(problems[0]), {"objective": 42})
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(
+            reverse("solve-tsp-batch"),
+            "\n".join(json.dumps(problem) for problem in problems),
+            content_type="application/x-ndjson",
+        )
+
+    problem_ids = response.json()["ids"]
+    messages = [json.loads(call.args[0])["problems"] for call in publish_problem.call_args_list]
+
+    assert [len(message) for message in messages] == [2, 2]
+    assert [problem["id"] for message in messages for problem in message] == problem_ids[1:]
+    assert [call.args[2] for call in publish_problem.call_args_list] == ["interactive", "interactive"]
+    assert (get_progress(problem_ids[1]) or {}).get("status") == QUEUED
+    assert client.post(
+        response.json()["solutions_location"], {"ids": problem_ids[:2]}, content_type="application/json"
+    ).json() == {
+        "solutions": [
+            {"id": problem_ids[0], "solution": {"objective": 42}},
+            {"id": problem_ids[1], "solution": None},
+        ]
+    }
+
+
+def test_solve_tsp_batch_rejects_invalid_problems(client: Client):
+    response = client.post(
+        reverse("solve-tsp-batch"),
+        [{"locations": [[0, 0], [1, 1]]}, {"locations": [[0, 0]], "solver_options": {"time_limit": -1}}],
+        content_type="application/json",
+    )
+
+    assert response.status_code == 400
+    assert response.json()["message"].startswith("Problem 1:")
+    assert client.post(reverse("solve-tsp-batch"), {}, content_type="application/json").status_code == 400
+
+
+def test_solve_tsp_batch_limits_ndjson_bodies(client: Client, settings):
+    settings.BATCH_MAX_SIZE = 2
+    line = json.dumps({"locations": [[0, 0], [1, 1]]}) + "\n"
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(reverse("solve-tsp-batch"), line * 5, content_type="application/x-ndjson")
+
+        assert response.status_code == 400
+        assert "between 1 and 2" in response.json()["message"]
+
+        settings.BATCH_MAX_BYTES = len(line) * 2 - 1
+        response = client.post(reverse("solve-tsp-batch"), line * 2, content_type="application/x-ndjson")
+
+        assert response.status_code == 400
+        publish_problem.assert_not_called()
+
+
+def test_metrics_renders_histograms(client: Client):
+    response = client.get(reverse("metrics"))
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert b"# TYPE tsp_solution_lookup_seconds histogram" in response.content
+
+
+def test_solve_tsp_warm_starts_from_previous_solution(client: Client, solution_store):
+    previous_problem_id = str(uuid4())
+    solution_store.set(
+        previous_problem_id,
+        {
+            "id": previous_problem_id,
+            "solution": {"route_plans": [{"routes": [{"route_index": index} for index in (0, 2, 1, 0)]}]},
+            "locations": [[0, 0], [1, 1], [2, 2]],
+        },
+    )
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(
+            reverse("solve-tsp"),
+            {"locations": [[0, 0], [2, 2], [3, 3]], "previous_problem_id": previous_problem_id},
+            content_type="application/json",
+        )
+
+    assert response.status_code == 200
+    assert json.loads(publish_problem.call_args.args[0])["problem"] == {
+        "locations": [[0, 0], [2, 2], [3, 3]],
+        "initial_routes": [[1]],
+    }
+
+    response = client.post(
+        reverse("solve-tsp"),
+        {"locations": [[0, 0], [2, 2]], "previous_problem_id": str(uuid4())},
+        content_type="application/json",
+    )
+
+    assert response.status_code == 400
+
+
+def test_solve_tsp_accepts_and_returns_msgpack(client: Client, solution_store):
+    problem = {"locations": [[0.5, 0], [1, 1], [2, 2]]}
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        response = client.post(
+            reverse("solve-tsp"),
+            msgpack.packb(problem),
+            content_type="application/msgpack",
+            HTTP_ACCEPT="application/msgpack",
+        )
+
+    body, content_type = publish_problem.call_args.args[:2]
+
+    assert response["Content-Type"] == "application/msgpack"
+    assert content_type == "application/msgpack"
+    assert msgpack.unpackb(body)["problem"] == problem
+
+    problem_id = msgpack.unpackb(response.content)["id"]
+    solution_store.set(problem_id, {"id": problem_id, "solution": {"objective": 42}})
+    url = reverse("get-tsp-solution", kwargs={"problem_id": problem_id})
+
+    assert msgpack.unpackb(client.get(url, HTTP_ACCEPT="application/msgpack").content) == {
+        "id": problem_id,
+        "solution": {"objective": 42},
+    }
+    assert client.get(url).json()["solution"] == {"objective": 42}
+
+
+def test_async_views_publish_and_read_without_blocking(rf: RequestFactory, solution_store):
+    request = rf.post(reverse("solve-tsp"), {"locations": [[0, 0], [1, 1]]}, content_type="application/json")
+
+    with mock.patch.object(async_publisher_pool, "publish_problem", mock.AsyncMock()) as publish_problem:
+        response = async_to_sync(solve_tsp_async)(request)
+
+    problem_id = json.loads(response.content)["id"]
+
+    assert json.loads(publish_problem.await_args_list[0].args[0])["id"] == problem_id
+    assert (get_progress(problem_id) or {}).get("status") == QUEUED
+
+    solution_store.set(problem_id, {"id": problem_id, "solution": {"objective": 42}})
+    response = async_to_sync(get_tsp_solution_async)(rf.get("/"), UUID(problem_id))
+
+    assert json.loads(response.content) == {"id": problem_id, "solution": {"objective": 42}}
+    assert async_to_sync(get_tsp_solution_async)(rf.post("/"), UUID(problem_id)).status_code == 405
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_solve_tsp_waits_for_solution(client: Client):
+    problem = {"locations": [[0, 0], [1, 1], [2, 3]]}
+    url = reverse("solve-tsp") + "?wait=5"
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem, mock.patch.object(
+        publisher_pool, "wait_for_reply", side_effect=lambda problem_id, timeout: None
+    ) as wait_for_reply:
+        response = client.post(url, problem, content_type="application/json")
+
+    problem_id = response.json()["id"]
+
+    # Timed out, the solution is read later as usual.
+    assert response.status_code == 202
+    assert "solution" not in response.json()
+    assert publish_problem.call_args.args[3] == problem_id
+    wait_for_reply.assert_called_once_with(problem_id, 5.0)
+
+    with mock.patch.object(publisher_pool, "publish_problem"), mock.patch.object(
+        publisher_pool,
+        "wait_for_reply",
+        side_effect=lambda problem_id, timeout: {"id": problem_id, "status": SOLVED, "solution": {"objective": 42}},
+    ):
+        response = client.post(url, problem, content_type="application/json")
+
+    assert response.status_code == 200
+    assert response.json()["solution"] == {"objective": 42}
+    assert client.post(reverse("solve-tsp") + "?wait=-1", problem, content_type="application/json").status_code == 400
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_solve_tsp_sets_problem_ttl(client: Client, settings):
+    problem = {"locations": [[0, 0], [1, 1], [2, 3]]}
+    settings.API_PROBLEM_TTL = 60
+
+    with mock.patch.object(publisher_pool, "publish_problem") as publish_problem:
+        client.post(reverse("solve-tsp"), problem, content_type="application/json")
+        client.post(reverse("solve-tsp") + "?ttl=0", problem, content_type="application/json")
+
+    assert [call.args[4] for call in publish_problem.call_args_list] == [60.0, 0.0]
+    assert client.post(reverse("solve-tsp") + "?ttl=inf", problem, content_type="application/json").status_code == 400
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_cancel_tsp_problem_only_cancels_unfinished_problems(client: Client):
+    queued_id, solved_id = str(uuid4()), str(uuid4())
+    set_progress(queued_id, QUEUED)
+    set_progress(solved_id, SOLVED, 42)
+
+    response = client.post(reverse("cancel-tsp-problem", kwargs={"problem_id": queued_id}))
+
+    assert response.status_code == 202
+    assert response.json() == {"id": queued_id, "status": QUEUED}
+    assert is_cancelled(queued_id)
+
+    assert client.post(reverse("cancel-tsp-problem", kwargs={"problem_id": solved_id})).status_code == 409
+    assert not is_cancelled(solved_id)
+    assert client.post(reverse("cancel-tsp-problem", kwargs={"problem_id": str(uuid4())})).status_code == 404
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_solve_tsp_marks_problem_queued_before_publishing(client: Client):
+    problem = {"locations": [[0, 0], [1, 1], [2, 3]]}
+    statuses = []
+
+    def publish_problem(message, *args):
+        del args
+        statuses.append((get_progress(json.loads(message)["id"]) or {}).get("status"))
+
+    with mock.patch.object(publisher_pool, "publish_problem", side_effect=publish_problem):
+        client.post(reverse("solve-tsp"), problem, content_type="application/json")
+
+    assert statuses == [QUEUED]
+
+    with mock.patch.object(publisher_pool, "publish_problem", side_effect=pika.exceptions.AMQPConnectionError):
+        with mock.patch("tsp.apps.core.views.uuid4", return_value=UUID(int=1)):
+            response = client.post(reverse("solve-tsp"), problem, content_type="application/json")
+
+    assert response.status_code == 500
+    assert get_progress(str(UUID(int=1))) is None
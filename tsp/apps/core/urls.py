@@ -1,9 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import get_tsp_solution, health_check, solve_tsp
+from .views import (
+    cancel_tsp_problem,
+    get_tsp_solution,
+    get_tsp_solution_async,
+    get_tsp_solutions,
+    health_check,
+    metrics,
+    solve_tsp,
+    solve_tsp_async,
+    solve_tsp_batch,
+    stream_tsp_solution,
+)
 
 urlpatterns = [
     path("health/", health_check, name="health-check"),
-    path("api/solve-tsp/", solve_tsp, name="solve-tsp"),
-    path("api/solve-tsp/<uuid:problem_id>/", get_tsp_solution, name="get-tsp-solution"),
+    path("metrics", metrics, name="metrics"),
+    path("api/solve-tsp/", solve_tsp_async if settings.API_ASYNC_VIEWS else solve_tsp, name="solve-tsp"),
+    path("api/solve-tsp/batch/", solve_tsp_batch, name="solve-tsp-batch"),
+    path("api/solve-tsp/solutions/", get_tsp_solutions, name="get-tsp-solutions"),
+    path(
+        "api/solve-tsp/<uuid:problem_id>/",
+        get_tsp_solution_async if settings.API_ASYNC_VIEWS else get_tsp_solution,
+        name="get-tsp-solution",
+    ),
+    path("api/solve-tsp/<uuid:problem_id>/events/", stream_tsp_solution, name="stream-tsp-solution"),
+    path("api/solve-tsp/<uuid:problem_id>/cancel/", cancel_tsp_problem, name="cancel-tsp-problem"),
 ]
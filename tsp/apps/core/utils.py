@@ -1,28 +1,241 @@
+import asyncio
 import json
+import math
 import time
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import UUID
 
-from tsp.utils.amqp import Consumer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.http.request import HttpRequest
+from django.http.response import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
 
+from tsp.utils.cache import get_solution_cache
+from tsp.utils.metrics import SOLUTION_LOOKUP_SECONDS
+from tsp.utils.progress import FINAL_STATUSES, SOLVED, get_progress, set_progress
+from tsp.utils.serialization import JSON_CONTENT_TYPE, dumps, get_accepted_content_type, loads
+from tsp.utils.store import get_solution_store
+from tsp.utils.warm_start import get_solution_routes, validate_initial_routes
 
-def get_solution_from_queue(problem_id: str) -> Optional[Dict[str, Any]]:
-    retry_count = 5
-    result = None
+# Number of seconds after which an idle progress stream sends a comment to keep the connection open.
+STREAM_KEEP_ALIVE_INTERVAL = 15
 
-    with Consumer() as consumer:
-        while retry_count:
-            method_frame, _, body = consumer.channel.basic_get(consumer.SOLUTION_QUEUE_NAME, auto_ack=False)
 
-            if not method_frame or method_frame.NAME == "Basic.GetEmpty":
-                time.sleep(0.1)
-            else:
-                json_body = json.loads(body)
+def get_solution(problem_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the solution of a problem, or `None` until the worker has stored it.
+    """
+    with SOLUTION_LOOKUP_SECONDS.time():
+        record = get_solution_store().get(problem_id)
 
-                if json_body["id"] == problem_id:
-                    consumer.channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+    return record["solution"] if record else None
 
-                    result = json_body["solution"]
 
-            retry_count -= 1
+def get_solutions(problem_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Returns the solution of every problem, `None` for those that aren't solved yet.
+    """
+    with SOLUTION_LOOKUP_SECONDS.time():
+        records = get_solution_store().get_many(problem_ids)
 
-    return result
+    return [
+        {
+            "id": problem_id,
+            "solution": records[problem_id]["solution"] if problem_id in records else None,
+        }
+        for problem_id in problem_ids
+    ]
+
+
+def encode_response(request: HttpRequest, data: Dict[str, Any], status: int = 200) -> HttpResponse:
+    """
+    Returns a response with `data` encoded as the request's `Accept` header prefers, JSON by default.
+    """
+    content_type = get_accepted_content_type(
+        f"{media_type.main_type}/{media_type.sub_type}" for media_type in request.accepted_types
+    )
+
+    if content_type == JSON_CONTENT_TYPE:
+        response: HttpResponse = JsonResponse(data, status=status)
+    else:
+        response = HttpResponse(dumps(data, content_type), content_type=content_type, status=status)
+
+    patch_vary_headers(response, ("Accept",))
+
+    return response
+
+
+def _read_ndjson_problems(request: HttpRequest) -> List[Any]:
+    # Read line by line so NDJSON bodies aren't subject to DATA_UPLOAD_MAX_MEMORY_SIZE, but to their own limit.
+    problems: List[Any] = []
+    size = 0
+
+    while len(problems) <= settings.BATCH_MAX_SIZE:
+        line = request.readline(settings.BATCH_MAX_BYTES - size + 1)
+
+        if not line:
+            break
+
+        size += len(line)
+
+        if size > settings.BATCH_MAX_BYTES:
+            raise RequestDataTooBig("Batch body exceeded settings.BATCH_MAX_BYTES.")
+
+        if line.strip():
+            problems.append(json.loads(line))
+
+    return problems
+
+
+def read_problems(request: HttpRequest) -> List[Any]:
+    """
+    Returns the problems of a batch request, sent as a JSON or msgpack array or as NDJSON.
+
+    NDJSON bodies are read up to `BATCH_MAX_SIZE` + 1 problems, enough to tell
+    the batch is too large. Raises `ValueError` when the body can't be
+    decoded, and `RequestDataTooBig` when an NDJSON body exceeds
+    `BATCH_MAX_BYTES`.
+    """
+    if request.content_type == "application/x-ndjson":
+        return _read_ndjson_problems(request)
+
+    problems = loads(request.body, request.content_type)
+
+    if not isinstance(problems, list):
+        raise ValueError("Expected a list of problems.")
+
+    return problems
+
+
+def resolve_warm_start(problem: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns `problem` with its `previous_problem_id` replaced by the `initial_routes` of that problem's solution.
+
+    Raises `ValueError` if the initial routes are invalid, both are given, or
+    the previous problem has no solution.
+    """
+    validate_initial_routes(problem.get("initial_routes"))
+
+    if problem.get("previous_problem_id") is None:
+        return problem
+
+    if problem.get("initial_routes") is not None:
+        raise ValueError("Only one of initial_routes and previous_problem_id can be provided.")
+
+    try:
+        previous_problem_id = str(UUID(problem["previous_problem_id"]))
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Invalid previous problem id.") from None
+
+    record = get_solution_store().get(previous_problem_id)
+
+    if not record or not record["solution"]:
+        raise ValueError(f"Problem {previous_problem_id} has no solution.")
+
+    problem = {key: value for key, value in problem.items() if key != "previous_problem_id"}
+    problem["initial_routes"] = get_solution_routes(
+        record["solution"], record.get("locations"), problem.get("locations")
+    )
+
+    return problem
+
+
+def reuse_cached_solution(problem_id: str, problem_key: str, locations: Optional[List[List[float]]] = None) -> bool:
+    """
+    Stores the cached solution of an identical problem under `problem_id`.
+
+    Returns `False` if there is none and the problem has to be solved. The
+    problem's `locations` are stored along with it for later warm starts.
+    """
+    solution = get_solution_cache().get(problem_key)
+
+    if solution is None:
+        return False
+
+    get_solution_store().set(
+        problem_id,
+        {
+            "id": problem_id,
+            "solution": solution,
+            "locations": locations,
+        },
+    )
+    set_progress(problem_id, SOLVED, solution["objective"])
+
+    return True
+
+
+def get_wait_timeout(request: HttpRequest) -> float:
+    """
+    Returns the number of seconds a solve request waits for its solution, from its `wait` query parameter.
+
+    Raises `ValueError` if it isn't a number between 0 and `API_SOLVE_MAX_WAIT`.
+    """
+    try:
+        timeout = float(request.GET.get("wait", 0))
+    except ValueError:
+        raise ValueError("Invalid wait provided.") from None
+
+    if not 0 <= timeout <= settings.API_SOLVE_MAX_WAIT:
+        raise ValueError(f"Wait must be between 0 and {settings.API_SOLVE_MAX_WAIT} seconds.")
+
+    return timeout
+
+
+def get_problem_ttl(request: HttpRequest) -> float:
+    """
+    Returns the number of seconds after which a new problem is dropped if not solved yet, from its `ttl` query parameter.
+
+    Defaults to `API_PROBLEM_TTL`, 0 meaning never. Raises `ValueError` if it
+    isn't a finite number of seconds, at least 0.
+    """
+    try:
+        ttl = float(request.GET.get("ttl", settings.API_PROBLEM_TTL))
+    except ValueError:
+        raise ValueError("Invalid ttl provided.") from None
+
+    if not math.isfinite(ttl) or ttl < 0:
+        raise ValueError("TTL must be a finite number of seconds, at least 0.")
+
+    return ttl
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_progress(problem_id: str) -> AsyncIterator[str]:
+    """
+    Yields a server-sent event for every status or objective change of a problem.
+
+    The stream ends with a `solution` event once the problem is solved or
+    failed, or silently after `SOLUTION_STREAM_TIMEOUT` seconds.
+    """
+    started_at = last_sent_at = time.monotonic()
+    last_state = None
+
+    while time.monotonic() - started_at < settings.SOLUTION_STREAM_TIMEOUT:
+        progress = await sync_to_async(get_progress, thread_sensitive=False)(problem_id)
+        state = (progress["status"], progress["objective"]) if progress else None
+
+        if progress and state != last_state:
+            last_state = state
+            last_sent_at = time.monotonic()
+
+            yield format_event(
+                "progress", {"id": problem_id, "status": progress["status"], "objective": progress["objective"]}
+            )
+
+            if progress["status"] in FINAL_STATUSES:
+                solution = await sync_to_async(get_solution, thread_sensitive=False)(problem_id)
+
+                yield format_event("solution", {"id": problem_id, "solution": solution})
+                return
+        elif time.monotonic() - last_sent_at >= STREAM_KEEP_ALIVE_INTERVAL:
+            last_sent_at = time.monotonic()
+
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(settings.SOLUTION_PROGRESS_INTERVAL)
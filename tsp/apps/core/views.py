@@ -1,18 +1,46 @@
-import json
 import logging
 import socket
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from uuid import UUID, uuid4
 
 import pika.exceptions
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
-from django.http.response import HttpResponse, JsonResponse
+from django.http.request import HttpRequest
+from django.http.response import HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from tsp.utils.amqp import Publisher
+from tsp.utils.amqp import ASYNC_AMQP_ERRORS, async_publisher_pool, publisher_pool
+from tsp.utils.cache import get_problem_key
+from tsp.utils.metrics import CONTENT_TYPE, render_metrics
+from tsp.utils.progress import (
+    FINAL_STATUSES,
+    QUEUED,
+    SOLVED,
+    cancel_problem,
+    delete_progress,
+    get_progress,
+    set_progress,
+    set_progress_many,
+)
+from tsp.utils.scheduling import get_tier
+from tsp.utils.serialization import dumps, get_content_type, loads
 
-from .utils import get_solution_from_queue
+from .utils import (
+    encode_response,
+    get_problem_ttl,
+    get_solution,
+    get_solutions,
+    get_wait_timeout,
+    read_problems,
+    resolve_warm_start,
+    reuse_cached_solution,
+    stream_progress,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,44 +51,449 @@ def health_check(request: WSGIRequest):
     return HttpResponse(b"ok")
 
 
+@require_http_methods(["GET"])
+def metrics(request: WSGIRequest):
+    """
+    Exposes the metrics of this server process in the Prometheus text format.
+    """
+    del request
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
+
+
+def _prepare_problem(request: HttpRequest) -> Union[HttpResponse, Tuple[str, Optional[bytes], str, str]]:
+    """
+    Validates the problem of a solve request and stores the cached solution of an identical problem if any.
+
+    Returns an error response, or the id of the new problem along with its
+    queue message, content type and tier. There is no message to queue when
+    a cached solution was reused.
+    """
+    # pylint:disable=too-many-return-statements
+    try:
+        problem_data = loads(request.body, request.content_type)
+    except ValueError:  # Includes JSON, msgpack and unicode decoding errors.
+        return encode_response(
+            request,
+            {
+                "message": "Invalid data provided.",
+            },
+            status=400,
+        )
+
+    if not isinstance(problem_data, dict):
+        return encode_response(
+            request,
+            {
+                "message": "Invalid data provided.",
+            },
+            status=400,
+        )
+
+    try:
+        # Also validates the solver options.
+        problem_key = get_problem_key(problem_data)
+        problem_data = resolve_warm_start(problem_data)
+    except ValueError as exc:
+        return encode_response(
+            request,
+            {
+                "message": str(exc),
+            },
+            status=400,
+        )
+    except TypeError:
+        return encode_response(
+            request,
+            {
+                "message": "Invalid data provided.",
+            },
+            status=400,
+        )
+
+    problem_id = str(uuid4())
+    content_type = get_content_type(request.content_type)
+    tier = get_tier(problem_data)
+
+    try:
+        if reuse_cached_solution(problem_id, problem_key, problem_data.get("locations")):
+            return problem_id, None, content_type, tier
+    except sqlite3.Error as exc:
+        logger.exception(exc, exc_info=True)
+
+        return encode_response(
+            request,
+            {
+                "message": "Something went wrong. Try again later.",
+            },
+            status=500,
+        )
+
+    message = dumps(
+        {
+            "id": problem_id,
+            "problem": problem_data,
+        },
+        content_type,
+    )
+
+    return problem_id, message, content_type, tier
+
+
+def _get_problem_response(
+    request: HttpRequest, problem_id: str, reply: Optional[Dict[str, Any]] = None, status: int = 200
+) -> HttpResponse:
+    """
+    Returns the locations of a new problem, along with its status and solution if `reply` has them.
+    """
+    data = {
+        "id": problem_id,
+        "solution_location": request.build_absolute_uri(
+            reverse("get-tsp-solution", kwargs={"problem_id": problem_id})
+        ),
+        "progress_location": request.build_absolute_uri(
+            reverse("stream-tsp-solution", kwargs={"problem_id": problem_id})
+        ),
+    }
+
+    if reply is not None:
+        data.update(status=reply["status"], solution=reply["solution"])
+
+    return encode_response(request, data, status=status)
+
+
+def _get_query_parameter(request: HttpRequest, get: Callable[[HttpRequest], float]) -> Union[HttpResponse, float]:
+    """
+    Returns a query parameter read by `get`, or an error response if it is invalid.
+    """
+    try:
+        return get(request)
+    except ValueError as exc:
+        return encode_response(
+            request,
+            {
+                "message": str(exc),
+            },
+            status=400,
+        )
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def solve_tsp(request: WSGIRequest):
+    """
+    Queues a problem, and waits up to `?wait=<seconds>` for its solution to return it inline.
+
+    Responds with 202 when the solution didn't come in time, it can then be
+    read from the solution location as usual.
+    """
+    # pylint:disable=too-many-return-statements
+    timeout = _get_query_parameter(request, get_wait_timeout)
+
+    if isinstance(timeout, HttpResponse):
+        return timeout
+
+    ttl = _get_query_parameter(request, get_problem_ttl)
+
+    if isinstance(ttl, HttpResponse):
+        return ttl
+
+    prepared_problem = _prepare_problem(request)
+
+    if isinstance(prepared_problem, HttpResponse):
+        return prepared_problem
+
+    problem_id, message, content_type, tier = prepared_problem
+
+    try:
+        if message is None:
+            reply = {"status": SOLVED, "solution": get_solution(problem_id)} if timeout else None
+
+            return _get_problem_response(request, problem_id, reply)
+
+        # Marked queued first, a worker may solve the problem before publishing returns.
+        set_progress(problem_id, QUEUED)
+
+        try:
+            publisher_pool.publish_problem(message, content_type, tier, problem_id if timeout else None, ttl)
+        except (pika.exceptions.AMQPError, socket.gaierror):
+            delete_progress([problem_id])
+            raise
+
+        if not timeout:
+            return _get_problem_response(request, problem_id)
+
+        reply = publisher_pool.wait_for_reply(problem_id, timeout)
+
+        return _get_problem_response(request, problem_id, reply, status=200 if reply else 202)
+    except (pika.exceptions.AMQPError, socket.gaierror, sqlite3.Error) as exc:
+        logger.exception(exc, exc_info=True)
+
+        return encode_response(
+            request,
+            {
+                "message": "Something went wrong. Try again later.",
+            },
+            status=500,
+        )
+
+
+async def solve_tsp_async(request: HttpRequest):
+    """
+    Async equivalent of `solve_tsp`, publishing without blocking the event loop.
+
+    SQLite reads and writes run in threads. Meant to be served by the ASGI
+    application, see `API_ASYNC_VIEWS`.
+    """
+    # pylint:disable=too-many-return-statements
+    # The method decorators don't support async views.
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    timeout = _get_query_parameter(request, get_wait_timeout)
+
+    if isinstance(timeout, HttpResponse):
+        return timeout
+
+    ttl = _get_query_parameter(request, get_problem_ttl)
+
+    if isinstance(ttl, HttpResponse):
+        return ttl
+
+    prepared_problem = await sync_to_async(_prepare_problem, thread_sensitive=False)(request)
+
+    if isinstance(prepared_problem, HttpResponse):
+        return prepared_problem
+
+    problem_id, message, content_type, tier = prepared_problem
+
+    try:
+        if message is None:
+            reply = None
+
+            if timeout:
+                reply = {
+                    "status": SOLVED,
+                    "solution": await sync_to_async(get_solution, thread_sensitive=False)(problem_id),
+                }
+
+            return _get_problem_response(request, problem_id, reply)
+
+        # Marked queued first, a worker may solve the problem before publishing returns.
+        await sync_to_async(set_progress, thread_sensitive=False)(problem_id, QUEUED)
+
+        try:
+            await async_publisher_pool.publish_problem(
+                message, content_type, tier, problem_id if timeout else None, ttl
+            )
+        except ASYNC_AMQP_ERRORS:
+            await sync_to_async(delete_progress, thread_sensitive=False)([problem_id])
+            raise
+
+        if not timeout:
+            return _get_problem_response(request, problem_id)
+
+        # Waiting only holds this coroutine, the event loop keeps serving other requests.
+        reply = await async_publisher_pool.wait_for_reply(problem_id, timeout)
+
+        return _get_problem_response(request, problem_id, reply, status=200 if reply else 202)
+    except (*ASYNC_AMQP_ERRORS, sqlite3.Error) as exc:
+        logger.exception(exc, exc_info=True)
+
+        return encode_response(
+            request,
+            {
+                "message": "Something went wrong. Try again later.",
+            },
+            status=500,
+        )
+
+
+# `csrf_exempt` doesn't support async views, it would turn them into sync ones.
+solve_tsp_async.csrf_exempt = True  # type: ignore[attr-defined]
+
+
+def _publish_problems(problems: List[Dict[str, Any]], content_type: str, ttl: float) -> None:
+    """
+    Publishes problems in messages of up to `BATCH_MESSAGE_SIZE` problems of one tier, marking them queued.
+
+    Problems are marked queued first, a worker may solve them before
+    publishing returns. Those left unpublished by an error are unmarked.
+    """
+    tiered_problems: Dict[str, List[Dict[str, Any]]] = {}
+
+    for problem in problems:
+        tiered_problems.setdefault(get_tier(problem["problem"]), []).append(problem)
+
+    unpublished_ids = {problem["id"] for problem in problems}
+    set_progress_many(unpublished_ids, QUEUED)
+
+    try:
+        # All messages go through this thread's pooled channel, each one confirmed by the broker.
+        for tier, tier_problems in tiered_problems.items():
+            for start in range(0, len(tier_problems), settings.BATCH_MESSAGE_SIZE):
+                message_problems = tier_problems[start : start + settings.BATCH_MESSAGE_SIZE]
+                publisher_pool.publish_problem(
+                    dumps(
+                        {
+                            "problems": message_problems,
+                        },
+                        content_type,
+                    ),
+                    content_type,
+                    tier,
+                    ttl=ttl,
+                )
+                unpublished_ids.difference_update(problem["id"] for problem in message_problems)
+    except (pika.exceptions.AMQPError, socket.gaierror):
+        delete_progress(unpublished_ids)
+        raise
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def solve_tsp_batch(request: WSGIRequest):
+    """
+    Queues many problems at once, sent as a JSON array or as NDJSON.
+    """
+    # pylint:disable=too-many-return-statements
+    ttl = _get_query_parameter(request, get_problem_ttl)
+
+    if isinstance(ttl, HttpResponse):
+        return ttl
+
     try:
-        request_body = request.body
-        json_body = json.loads(request_body)
-    except json.JSONDecodeError:
-        return JsonResponse(
+        problems = read_problems(request)
+    except ValueError:  # Includes JSON and unicode decoding errors.
+        return encode_response(
+            request,
             {
                 "message": "Invalid data provided.",
             },
             status=400,
         )
 
+    if not problems or len(problems) > settings.BATCH_MAX_SIZE:
+        return encode_response(
+            request,
+            {
+                "message": f"A batch must contain between 1 and {settings.BATCH_MAX_SIZE} problems.",
+            },
+            status=400,
+        )
+
+    problem_keys = []
+
+    for index, problem in enumerate(problems):
+        try:
+            if not isinstance(problem, dict):
+                raise TypeError
+
+            problem_keys.append(get_problem_key(problem))
+            problems[index] = resolve_warm_start(problem)
+        except ValueError as exc:
+            return encode_response(
+                request,
+                {
+                    "message": f"Problem {index}: {exc}",
+                },
+                status=400,
+            )
+        except TypeError:
+            return encode_response(
+                request,
+                {
+                    "message": f"Problem {index}: Invalid data provided.",
+                },
+                status=400,
+            )
+        except sqlite3.Error as exc:
+            logger.exception(exc, exc_info=True)
+
+            return encode_response(
+                request,
+                {
+                    "message": "Something went wrong. Try again later.",
+                },
+                status=500,
+            )
+
+    try:
+        problem_ids = [str(uuid4()) for _ in problems]
+        queued_problems = [
+            {
+                "id": problem_id,
+                "problem": problem,
+            }
+            for problem_id, problem, problem_key in zip(problem_ids, problems, problem_keys)
+            if not reuse_cached_solution(problem_id, problem_key, problem.get("locations"))
+        ]
+
+        _publish_problems(queued_problems, get_content_type(request.content_type), ttl)
+
+        return encode_response(
+            request,
+            {
+                "ids": problem_ids,
+                "solutions_location": request.build_absolute_uri(reverse("get-tsp-solutions")),
+            },
+        )
+    except (pika.exceptions.AMQPError, socket.gaierror, sqlite3.Error) as exc:
+        logger.exception(exc, exc_info=True)
+
+        return encode_response(
+            request,
+            {
+                "message": "Something went wrong. Try again later.",
+            },
+            status=500,
+        )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def cancel_tsp_problem(request: WSGIRequest, problem_id: UUID):
+    """
+    Cancels a queued or solving problem.
+
+    The worker then drops the problem, or ends its search early and discards
+    the solution, and reports it as cancelled.
+    """
     try:
-        problem_id = str(uuid4())
-        with Publisher() as publisher:
-            publisher.publish_problem(
-                json.dumps(
-                    {
-                        "id": problem_id,
-                        "problem": json_body,
-                    }
-                ).encode()
+        progress = get_progress(str(problem_id))
+
+        if progress is None:
+            return encode_response(
+                request,
+                {
+                    "message": "Problem not found.",
+                },
+                status=404,
             )
 
-            return JsonResponse(
+        if progress["status"] in FINAL_STATUSES:
+            return encode_response(
+                request,
                 {
-                    "id": problem_id,
-                    "solution_location": request.build_absolute_uri(
-                        reverse("get-tsp-solution", kwargs={"problem_id": problem_id})
-                    ),
-                }
+                    "message": f"Problem is already {progress['status']}.",
+                },
+                status=409,
             )
-    except (pika.exceptions.AMQPError, socket.gaierror) as exc:
+
+        cancel_problem(str(problem_id))
+
+        return encode_response(
+            request,
+            {
+                "id": str(problem_id),
+                "status": progress["status"],
+            },
+            status=202,
+        )
+    except sqlite3.Error as exc:
         logger.exception(exc, exc_info=True)
 
-        return JsonResponse(
+        return encode_response(
+            request,
             {
                 "message": "Something went wrong. Try again later.",
             },
@@ -70,23 +503,106 @@ def solve_tsp(request: WSGIRequest):
 
 @require_http_methods(["GET"])
 def get_tsp_solution(request: WSGIRequest, problem_id: UUID):
-    del request
+    try:
+        solution = get_solution(str(problem_id))
+
+        return encode_response(
+            request,
+            {
+                "id": str(problem_id),
+                "solution": solution,
+            },
+        )
+    except sqlite3.Error as exc:
+        logger.exception(exc, exc_info=True)
+
+        return encode_response(
+            request,
+            {
+                "message": "Something went wrong. Try again later.",
+            },
+            status=500,
+        )
+
+
+async def get_tsp_solution_async(request: HttpRequest, problem_id: UUID):
+    """
+    Async equivalent of `get_tsp_solution`, reading the solution store from a thread.
+    """
+    # The method decorators don't support async views.
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
 
     try:
-        solution = get_solution_from_queue(str(problem_id))
+        solution = await sync_to_async(get_solution, thread_sensitive=False)(str(problem_id))
 
-        return JsonResponse(
+        return encode_response(
+            request,
             {
-                "id": problem_id,
+                "id": str(problem_id),
                 "solution": solution,
-            }
+            },
+        )
+    except sqlite3.Error as exc:
+        logger.exception(exc, exc_info=True)
+
+        return encode_response(
+            request,
+            {
+                "message": "Something went wrong. Try again later.",
+            },
+            status=500,
+        )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def get_tsp_solutions(request: WSGIRequest):
+    """
+    Returns the solutions of many problems, given as `{"ids": [...]}`.
+    """
+    try:
+        problem_ids = [str(UUID(problem_id)) for problem_id in loads(request.body, request.content_type)["ids"]]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return encode_response(
+            request,
+            {
+                "message": "Invalid data provided.",
+            },
+            status=400,
         )
-    except (pika.exceptions.AMQPError, socket.gaierror) as exc:
+
+    try:
+        return encode_response(
+            request,
+            {
+                "solutions": get_solutions(problem_ids),
+            },
+        )
+    except sqlite3.Error as exc:
         logger.exception(exc, exc_info=True)
 
-        return JsonResponse(
+        return encode_response(
+            request,
             {
                 "message": "Something went wrong. Try again later.",
             },
             status=500,
         )
+
+
+async def stream_tsp_solution(request: HttpRequest, problem_id: UUID):
+    """
+    Streams the progress of a problem as server-sent events.
+
+    Must be served by the ASGI application to stream while the problem is solved.
+    """
+    # The method decorators don't support async views.
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    response = StreamingHttpResponse(stream_progress(str(problem_id)), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+
+    return response
@@ -0,0 +1,26 @@
+from typing import Iterator
+
+import pytest
+
+from tsp.utils.cache import get_solution_cache
+from tsp.utils.progress import get_cancellation_store, get_progress_store
+from tsp.utils.store import SolutionStore, get_solution_store
+
+
+@pytest.fixture
+def solution_store(settings, tmp_path) -> Iterator[SolutionStore]:
+    """
+    Points the process-wide solution store, cache, progress and cancellations at a temporary database.
+    """
+    settings.SOLUTION_STORE_PATH = str(tmp_path / "solutions.sqlite3")
+    get_solution_store.cache_clear()
+    get_solution_cache.cache_clear()
+    get_progress_store.cache_clear()
+    get_cancellation_store.cache_clear()
+
+    yield get_solution_store()
+
+    get_solution_store.cache_clear()
+    get_solution_cache.cache_clear()
+    get_progress_store.cache_clear()
+    get_cancellation_store.cache_clear()
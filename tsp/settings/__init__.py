@@ -1,2 +1,6 @@
 from .amqp import *
+from .api import *
 from .core import *
+from .scheduling import *
+from .solver import *
+from .store import *
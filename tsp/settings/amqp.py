@@ -1,3 +1,9 @@
 from decouple import config
 
 RABBITMQ_URL = config("RABBITMQ_URL")
+
+# Number of times a problem whose solve failed unexpectedly is requeued before it is dead-lettered.
+QUEUE_MAX_RETRIES = config("QUEUE_MAX_RETRIES", default=3, cast=int)
+
+# Number of seconds dead-lettered problems are kept in their queue.
+QUEUE_DEAD_LETTER_TTL = config("QUEUE_DEAD_LETTER_TTL", default=604800, cast=float)
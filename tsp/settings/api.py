@@ -0,0 +1,19 @@
+from decouple import config
+
+# Maximum number of problems accepted by a single batch request.
+BATCH_MAX_SIZE = config("BATCH_MAX_SIZE", default=10000, cast=int)
+
+# Maximum size in bytes of an NDJSON batch request, JSON and msgpack ones are limited by DATA_UPLOAD_MAX_MEMORY_SIZE.
+BATCH_MAX_BYTES = config("BATCH_MAX_BYTES", default=104857600, cast=int)
+
+# Number of problems of a batch request published in a single queue message.
+BATCH_MESSAGE_SIZE = config("BATCH_MESSAGE_SIZE", default=50, cast=int)
+
+# Serve the write and read APIs with async views, for servers running the ASGI application.
+API_ASYNC_VIEWS = config("API_ASYNC_VIEWS", default=False, cast=bool)
+
+# Maximum number of seconds a solve request may wait for its solution with `?wait=`.
+API_SOLVE_MAX_WAIT = config("API_SOLVE_MAX_WAIT", default=30, cast=float)
+
+# Default number of seconds after which a queued problem is dropped rather than solved. Never when 0.
+API_PROBLEM_TTL = config("API_PROBLEM_TTL", default=0, cast=float)
@@ -39,3 +39,7 @@ USE_TZ = True
 # The full Python path of the WSGI application object that Django’s built-in
 # servers (e.g. runserver) will use.
 WSGI_APPLICATION = "tsp.wsgi.application"
+
+# The maximum size in bytes that a request body may be before a
+# SuspiciousOperation (RequestDataTooBig) is raised.
+DATA_UPLOAD_MAX_MEMORY_SIZE = config("DATA_UPLOAD_MAX_MEMORY_SIZE", default=2621440, cast=int)
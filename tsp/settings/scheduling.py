@@ -0,0 +1,8 @@
+from decouple import config
+
+# Problems up to this size are queued in the interactive tier. A problem's size
+# is its number of locations, counted twice when it has time windows.
+SCHEDULING_INTERACTIVE_MAX_SIZE = config("SCHEDULING_INTERACTIVE_MAX_SIZE", default=100, cast=int)
+
+# Larger problems up to this size are queued in the standard tier, the rest in the bulk tier.
+SCHEDULING_STANDARD_MAX_SIZE = config("SCHEDULING_STANDARD_MAX_SIZE", default=2000, cast=int)
@@ -0,0 +1,24 @@
+from decouple import config
+
+# Search time limit (in seconds) applied to problems that don't set one.
+SOLVER_DEFAULT_TIME_LIMIT = config("SOLVER_DEFAULT_TIME_LIMIT", default=30, cast=float)
+
+# Upper bound (in seconds) for a problem's search time limit.
+SOLVER_MAX_TIME_LIMIT = config("SOLVER_MAX_TIME_LIMIT", default=300, cast=float)
+
+# Upper bound for the number of solutions a problem's search may explore.
+SOLVER_MAX_SOLUTION_LIMIT = config("SOLVER_MAX_SOLUTION_LIMIT", default=100000, cast=int)
+
+# Problems with at least this many locations (and no matrix or time windows)
+# are solved over a sparse graph of candidate arcs instead of a dense matrix.
+SOLVER_SPARSE_MIN_LOCATIONS = config("SOLVER_SPARSE_MIN_LOCATIONS", default=5000, cast=int)
+
+# Number of nearest neighbours each location may be routed to in a sparse graph.
+SOLVER_CANDIDATE_NEIGHBORS = config("SOLVER_CANDIDATE_NEIGHBORS", default=16, cast=int)
+
+# Upper bound for a problem's number of candidate neighbours.
+SOLVER_MAX_CANDIDATE_NEIGHBORS = config("SOLVER_MAX_CANDIDATE_NEIGHBORS", default=256, cast=int)
+
+# Single vehicle problems without time windows of up to this many locations are
+# solved by the lightweight engine of `tsp.utils.fast_engine` instead of OR-Tools.
+SOLVER_FAST_ENGINE_MAX_LOCATIONS = config("SOLVER_FAST_ENGINE_MAX_LOCATIONS", default=15, cast=int)
@@ -0,0 +1,38 @@
+from decouple import config
+
+from .common import BASE_DIR
+
+# Path of the SQLite database solutions are written to by the background
+# worker and read from by the API. Must be shared by both.
+SOLUTION_STORE_PATH = config("SOLUTION_STORE_PATH", default=str(BASE_DIR.parent / "solutions.sqlite3"))
+
+# Number of seconds a solution is kept in the store.
+SOLUTION_STORE_TTL = config("SOLUTION_STORE_TTL", default=86400, cast=int)
+
+# Number of solutions kept in each process's in-memory cache.
+SOLUTION_STORE_CACHE_SIZE = config("SOLUTION_STORE_CACHE_SIZE", default=1024, cast=int)
+
+# Number of seconds a cached solution of a repeated problem is reused.
+SOLUTION_CACHE_TTL = config("SOLUTION_CACHE_TTL", default=604800, cast=int)
+
+# Maximum number of cached solutions kept for repeated problems.
+SOLUTION_CACHE_SIZE = config("SOLUTION_CACHE_SIZE", default=10000, cast=int)
+
+# Number of seconds between two progress updates written by the worker.
+SOLUTION_PROGRESS_INTERVAL = config("SOLUTION_PROGRESS_INTERVAL", default=0.5, cast=float)
+
+# Number of seconds between two checks for the cancellation of a problem being solved.
+SOLUTION_CANCELLATION_INTERVAL = config("SOLUTION_CANCELLATION_INTERVAL", default=1.0, cast=float)
+
+# Maximum number of seconds a solution progress stream stays open.
+SOLUTION_STREAM_TIMEOUT = config("SOLUTION_STREAM_TIMEOUT", default=300, cast=float)
+
+# Directory distance matrices are shared through by the background worker's
+# processes. Disabled when empty.
+MATRIX_STORE_PATH = config("MATRIX_STORE_PATH", default="")
+
+# Maximum total size (in bytes) of the stored matrices.
+MATRIX_STORE_MAX_SIZE = config("MATRIX_STORE_MAX_SIZE", default=2**30, cast=int)
+
+# Number of locations from which a problem's matrix is stored.
+MATRIX_STORE_MIN_LOCATIONS = config("MATRIX_STORE_MIN_LOCATIONS", default=500, cast=int)
@@ -1,22 +1,87 @@
 import abc
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
 
+import aio_pika
+import aio_pika.abc
+import aio_pika.exceptions
 import pika
 import pika.exceptions
 from django.conf import settings
 
+from tsp.utils.common import async_retry_with_backoff, retry_with_backoff
+from tsp.utils.metrics import AMQP_CONNECT_SECONDS, PUBLISH_SECONDS
+from tsp.utils.scheduling import STANDARD, TIERS
+from tsp.utils.serialization import JSON_CONTENT_TYPE, loads
+
+logger = logging.getLogger(__name__)
+
 
 class AMQPBase(abc.ABC):
     PROBLEM_QUEUE_NAME = "tspproblems"
     SOLUTION_QUEUE_NAME = "tspsolutions"
 
+    # The worker publishes the messages it gives up on to the dead letter queue itself. Problem queues don't
+    # dead-letter through arguments, which the broker refuses to add to existing queues.
+    DEAD_LETTER_EXCHANGE_NAME = "tspproblems.dead"
+    DEAD_LETTER_QUEUE_NAME = "tspproblems.dead"
+
+    # Header with the UNIX time at which a problem was published.
+    ENQUEUED_AT_HEADER = "x-enqueued-at"
+
+    # Header with the UNIX time after which a problem is dropped rather than solved.
+    EXPIRES_AT_HEADER = "x-expires-at"
+
+    # Header with the number of times the worker requeued a problem after failing to solve it.
+    RETRY_COUNT_HEADER = "x-retry-count"
+
+    @classmethod
+    def get_problem_headers(cls, ttl: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Returns the headers of a problem published now, expiring after `ttl` seconds if given.
+        """
+        now = time.time()
+        headers = {cls.ENQUEUED_AT_HEADER: now}
+
+        if ttl:
+            headers[cls.EXPIRES_AT_HEADER] = now + ttl
+
+        return headers
+
+    @staticmethod
+    def get_dead_letter_queue_arguments() -> Dict[str, Any]:
+        # Dead problems are kept for inspection, but not forever.
+        return {"x-message-ttl": int(settings.QUEUE_DEAD_LETTER_TTL * 1000)}
+
+    @classmethod
+    def get_problem_queue_name(cls, tier: str = STANDARD) -> str:
+        """
+        Returns the queue of a tier's problems, the standard one being the queue of untiered problems.
+        """
+        return cls.PROBLEM_QUEUE_NAME if tier == STANDARD else f"{cls.PROBLEM_QUEUE_NAME}.{tier}"
+
     def __init__(self) -> None:
-        self.connection: pika.BlockingConnection = pika.BlockingConnection(
-            pika.URLParameters(settings.RABBITMQ_URL),
-        )
-        self.channel: pika.adapters.blocking_connection.BlockingChannel = self.connection.channel()
+        with AMQP_CONNECT_SECONDS.time():
+            self.connection: pika.BlockingConnection = pika.BlockingConnection(
+                pika.URLParameters(settings.RABBITMQ_URL),
+            )
+            self.channel: pika.adapters.blocking_connection.BlockingChannel = self.connection.channel()
+
+            self.channel.exchange_declare(self.DEAD_LETTER_EXCHANGE_NAME, exchange_type="fanout", durable=True)
+            self.channel.queue_declare(
+                queue=self.DEAD_LETTER_QUEUE_NAME, durable=True, arguments=self.get_dead_letter_queue_arguments()
+            )
+            self.channel.queue_bind(self.DEAD_LETTER_QUEUE_NAME, self.DEAD_LETTER_EXCHANGE_NAME)
+
+            for tier in TIERS:
+                self.channel.queue_declare(queue=self.get_problem_queue_name(tier), durable=True)
 
-        self.channel.queue_declare(queue=self.PROBLEM_QUEUE_NAME, durable=True)
-        self.channel.queue_declare(queue=self.SOLUTION_QUEUE_NAME, durable=True)
+            self.channel.queue_declare(queue=self.SOLUTION_QUEUE_NAME, durable=True)
 
     def __enter__(self):
         return self
@@ -38,18 +103,377 @@ class AMQPBase(abc.ABC):
 
 
 class Publisher(AMQPBase):
-    def publish_problem(self, body: bytes) -> None:
-        self.channel.basic_publish(exchange="", routing_key=self.PROBLEM_QUEUE_NAME, body=body)
+    def __init__(self) -> None:
+        super().__init__()
+
+        # Publishing blocks until the broker has taken responsibility for the message.
+        self.channel.confirm_delivery()
+
+        # Replies awaited on this connection by correlation id, `None` until received.
+        self.replies: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.reply_queue: Optional[str] = None
+
+    def _get_reply_queue(self) -> str:
+        if self.reply_queue is None:
+            # Server-named and exclusive, so only this connection reads it and it's deleted along with it.
+            self.reply_queue = self.channel.queue_declare(queue="", exclusive=True).method.queue
+            self.channel.basic_consume(self.reply_queue, on_message_callback=self._on_reply, auto_ack=True)
+
+        return self.reply_queue
+
+    def _on_reply(self, channel, method, properties: pika.BasicProperties, body: bytes) -> None:
+        del channel, method
+
+        # Replies arriving after their wait timed out are dropped.
+        if properties.correlation_id in self.replies:
+            self.replies[properties.correlation_id] = loads(body, properties.content_type)
+
+    def publish_problem(
+        self,
+        body: bytes,
+        content_type: str = JSON_CONTENT_TYPE,
+        tier: str = STANDARD,
+        correlation_id: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Queues a problem, whose solution the worker sends back to this connection when `correlation_id` is set.
+
+        With a `ttl`, the worker drops the problem if it consumes it too late,
+        reporting it as expired. The message itself doesn't expire, the broker
+        would discard it without anyone hearing of the problem.
+        """
+        # pylint:disable=too-many-arguments
+        reply_to = None
+
+        if correlation_id is not None:
+            reply_to = self._get_reply_queue()
+            self.replies[correlation_id] = None
+
+        self.channel.basic_publish(
+            exchange="",
+            routing_key=self.get_problem_queue_name(tier),
+            body=body,
+            properties=pika.BasicProperties(
+                content_type=content_type,
+                headers=self.get_problem_headers(ttl),
+                reply_to=reply_to,
+                correlation_id=correlation_id,
+            ),
+        )
+
+    def wait_for_reply(self, correlation_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Returns the reply to the problem published with `correlation_id`, `None` if it doesn't come within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+
+        try:
+            while self.replies.get(correlation_id) is None and time.monotonic() < deadline:
+                self.connection.process_data_events(time_limit=deadline - time.monotonic())
+
+            return self.replies.get(correlation_id)
+        finally:
+            self.replies.pop(correlation_id, None)
 
     def publish_solution(self, body: bytes) -> None:
         self.channel.basic_publish(exchange="", routing_key=self.SOLUTION_QUEUE_NAME, body=body)
 
 
 class Consumer(AMQPBase):
-    def consume_problem(self, callback) -> None:
-        self.channel.basic_consume(self.PROBLEM_QUEUE_NAME, on_message_callback=callback)
+    def subscribe_problem(self, callback, prefetch_count: int = 0, tier: str = STANDARD) -> None:
+        """
+        Consumes the problems of a tier with `callback` once consuming starts, unlimited when `prefetch_count` is 0.
+
+        The prefetch count applies to this subscription only, so each tier's
+        unacknowledged problems are limited separately.
+        """
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        self.channel.basic_consume(self.get_problem_queue_name(tier), on_message_callback=callback)
+
+    def consume_problem(self, callback, prefetch_count: int = 0, tiers: Iterable[str] = TIERS) -> None:
+        for tier in tiers:
+            self.subscribe_problem(callback, prefetch_count, tier)
+
+        self.start_consuming()
+
+    def start_consuming(self) -> None:
         self.channel.start_consuming()
 
     def consume_solution(self, callback) -> None:
         self.channel.basic_consume(self.SOLUTION_QUEUE_NAME, on_message_callback=callback)
         self.channel.start_consuming()
+
+
+class PublisherPool:
+    """
+    Keeps one long-lived `Publisher` per thread of the current process.
+
+    Connections are opened lazily and queues are declared once per connection,
+    so a publish costs a single round trip after the first one. A publisher
+    created before a fork is never reused by the child. When a publish fails
+    the connection is dropped and re-established with `retry_with_backoff`.
+    """
+
+    def __init__(self, retries: int = 3, backoff_in_seconds: float = 0.1) -> None:
+        self.retries = retries
+        self.backoff_in_seconds = backoff_in_seconds
+        self._local = threading.local()
+
+    def _get_publisher(self) -> Publisher:
+        publisher: Optional[Publisher] = getattr(self._local, "publisher", None)
+
+        if publisher is None or self._local.pid != os.getpid() or not publisher.connection.is_open:
+            publisher = self._local.publisher = Publisher()
+            self._local.pid = os.getpid()
+
+        return publisher
+
+    def _discard_publisher(self) -> None:
+        publisher: Optional[Publisher] = getattr(self._local, "publisher", None)
+        self._local.publisher = None
+
+        if publisher is not None and self._local.pid == os.getpid():
+            publisher.close()
+
+    def _run(self, func: Callable[[Publisher], Any]) -> Any:
+        def attempt() -> Any:
+            try:
+                return func(self._get_publisher())
+            except pika.exceptions.AMQPError:
+                self._discard_publisher()
+                raise
+
+        try:
+            return attempt()
+        except pika.exceptions.AMQPError:
+            # Usually a connection closed by the broker while idle, reconnect right away.
+            logger.warning("Publisher connection lost, reconnecting")
+
+        return retry_with_backoff(
+            attempt,
+            retries=self.retries,
+            backoff_in_seconds=self.backoff_in_seconds,
+            exceptions=(pika.exceptions.AMQPError,),
+        )
+
+    def publish_problem(
+        self,
+        body: bytes,
+        content_type: str = JSON_CONTENT_TYPE,
+        tier: str = STANDARD,
+        correlation_id: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        # pylint:disable=too-many-arguments
+        with PUBLISH_SECONDS.time():
+            self._run(lambda publisher: publisher.publish_problem(body, content_type, tier, correlation_id, ttl))
+
+    def wait_for_reply(self, correlation_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Waits for the reply to a problem published by this thread with `correlation_id`, see `Publisher.wait_for_reply`.
+
+        Returns `None` if the connection was lost meanwhile, the solution can
+        still be read from the store once solved.
+        """
+        publisher: Optional[Publisher] = getattr(self._local, "publisher", None)
+
+        if publisher is None or self._local.pid != os.getpid():
+            return None
+
+        try:
+            return publisher.wait_for_reply(correlation_id, timeout)
+        except pika.exceptions.AMQPError:
+            logger.warning("Publisher connection lost while waiting for a reply")
+            self._discard_publisher()
+
+            return None
+
+    def publish_solution(self, body: bytes) -> None:
+        self._run(lambda publisher: publisher.publish_solution(body))
+
+
+publisher_pool = PublisherPool()
+
+
+# Errors of `AsyncPublisherPool`, from the broker or the network.
+ASYNC_AMQP_ERRORS = (
+    aio_pika.exceptions.AMQPError,
+    aio_pika.exceptions.ChannelInvalidStateError,
+    asyncio.TimeoutError,
+    OSError,
+)
+
+AsyncConnection = Tuple[aio_pika.abc.AbstractConnection, aio_pika.abc.AbstractChannel]
+
+
+class AsyncPublisherPool:
+    """
+    Asyncio counterpart of `PublisherPool` for async views.
+
+    Keeps one long-lived connection and confirming channel per event loop of
+    the current process, so concurrent requests of an ASGI worker share them.
+    Each event loop opens its own connection, which makes this pool a poor fit
+    for servers that run every async view in a new event loop, e.g. WSGI ones.
+    """
+
+    def __init__(self, retries: int = 3, backoff_in_seconds: float = 0.1) -> None:
+        self.retries = retries
+        self.backoff_in_seconds = backoff_in_seconds
+        self._channels: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncConnection]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+        self._reply_queues: "weakref.WeakKeyDictionary[aio_pika.abc.AbstractChannel, str]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # Replies awaited by correlation id, each resolved in the event loop that published its problem.
+        self._replies: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
+    @staticmethod
+    async def _connect() -> AsyncConnection:
+        with AMQP_CONNECT_SECONDS.time():
+            connection = await aio_pika.connect(settings.RABBITMQ_URL)
+            # Publishing waits until the broker has taken responsibility for the message.
+            channel = await connection.channel(publisher_confirms=True)
+
+            dead_letter_exchange = await channel.declare_exchange(
+                AMQPBase.DEAD_LETTER_EXCHANGE_NAME, aio_pika.ExchangeType.FANOUT, durable=True
+            )
+            dead_letter_queue = await channel.declare_queue(
+                AMQPBase.DEAD_LETTER_QUEUE_NAME, durable=True, arguments=AMQPBase.get_dead_letter_queue_arguments()
+            )
+            await dead_letter_queue.bind(dead_letter_exchange)
+
+            for tier in TIERS:
+                await channel.declare_queue(AMQPBase.get_problem_queue_name(tier), durable=True)
+
+            await channel.declare_queue(AMQPBase.SOLUTION_QUEUE_NAME, durable=True)
+
+        return connection, channel
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        loop = asyncio.get_running_loop()
+        lock = self._locks.setdefault(loop, asyncio.Lock())
+
+        # Requests arriving while connecting wait for the connection instead of opening their own.
+        async with lock:
+            _, channel = self._channels.get(loop, (None, None))
+
+            if channel is None or channel.is_closed:
+                _, channel = self._channels[loop] = await self._connect()
+
+        return channel
+
+    async def _get_reply_queue(self, channel: aio_pika.abc.AbstractChannel) -> str:
+        # Requests publishing meanwhile wait for the queue instead of declaring their own.
+        async with self._locks[asyncio.get_running_loop()]:
+            if channel not in self._reply_queues:
+                # Server-named and exclusive, so only this connection reads it and it's deleted along with it.
+                queue = await channel.declare_queue(exclusive=True)
+                await queue.consume(self._on_reply, no_ack=True)
+                self._reply_queues[channel] = queue.name
+
+        return self._reply_queues[channel]
+
+    async def _on_reply(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        future = self._replies.get(message.correlation_id or "")
+
+        # Replies arriving after their wait timed out are dropped.
+        if future is not None and not future.done():
+            future.set_result(loads(message.body, message.content_type))
+
+    async def _discard_channel(self, channel: aio_pika.abc.AbstractChannel) -> None:
+        loop = asyncio.get_running_loop()
+        connection, current_channel = self._channels.get(loop, (None, None))
+
+        # Concurrent requests failing on the same channel must not discard the one replacing it.
+        if connection is None or current_channel is not channel:
+            return
+
+        del self._channels[loop]
+
+        try:
+            await connection.close()
+        except ASYNC_AMQP_ERRORS:
+            pass
+
+    async def _run(self, func: Callable[[aio_pika.abc.AbstractChannel], Awaitable[Any]]) -> Any:
+        async def attempt() -> Any:
+            channel = await self._get_channel()
+
+            try:
+                return await func(channel)
+            except ASYNC_AMQP_ERRORS:
+                await self._discard_channel(channel)
+                raise
+
+        try:
+            return await attempt()
+        except ASYNC_AMQP_ERRORS:
+            # Usually a connection closed by the broker while idle, reconnect right away.
+            logger.warning("Publisher connection lost, reconnecting")
+
+        return await async_retry_with_backoff(
+            attempt,
+            retries=self.retries,
+            backoff_in_seconds=self.backoff_in_seconds,
+            exceptions=ASYNC_AMQP_ERRORS,
+        )
+
+    async def publish_problem(
+        self,
+        body: bytes,
+        content_type: str = JSON_CONTENT_TYPE,
+        tier: str = STANDARD,
+        correlation_id: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Queues a problem like `Publisher.publish_problem` does.
+        """
+        # pylint:disable=too-many-arguments
+        headers: aio_pika.abc.HeadersType = AMQPBase.get_problem_headers(ttl)
+
+        async def publish(channel: aio_pika.abc.AbstractChannel) -> None:
+            reply_to = await self._get_reply_queue(channel) if correlation_id is not None else None
+            message = aio_pika.Message(
+                body,
+                content_type=content_type,
+                headers=headers,
+                reply_to=reply_to,
+                correlation_id=correlation_id,
+            )
+
+            await channel.default_exchange.publish(message, routing_key=AMQPBase.get_problem_queue_name(tier))
+
+        if correlation_id is not None:
+            self._replies[correlation_id] = asyncio.get_running_loop().create_future()
+
+        try:
+            with PUBLISH_SECONDS.time():
+                await self._run(publish)
+        except BaseException:
+            if correlation_id is not None:
+                self._replies.pop(correlation_id, None)
+
+            raise
+
+    async def wait_for_reply(self, correlation_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Returns the reply to the problem published with `correlation_id`, `None` if it doesn't come within `timeout` seconds.
+        """
+        future = self._replies.get(correlation_id)
+
+        if future is None:
+            return None
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._replies.pop(correlation_id, None)
+
+
+async_publisher_pool = AsyncPublisherPool()
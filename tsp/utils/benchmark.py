@@ -0,0 +1,257 @@
+"""
+Benchmark harness for `tsp.utils.tsplib`.
+"""
+import functools
+import math
+import platform
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from tsp.utils.tsplib import (
+    EUCLIDEAN,
+    HAVERSINE,
+    create_distance_matrix,
+    create_distance_matrix_array,
+    find_route,
+    scale_to_range,
+)
+
+# TSPLIB-format instances shipped with the benchmark.
+INSTANCES_DIR = Path(__file__).resolve().parent / "benchmarks"
+
+# Wall times below this many seconds are too noisy to flag as regressions.
+MIN_REGRESSION_WALL_TIME = 0.05
+
+
+def parse_tsplib(text: str) -> Dict[str, Any]:
+    """
+    Parses a TSPLIB instance into a problem payload.
+
+    Supports `EUC_2D` and `GEO` node coordinates and `EXPLICIT` edge weights
+    given as a `FULL_MATRIX`.
+    """
+    # pylint:disable=too-many-branches
+    specification: Dict[str, str] = {}
+    lines = iter(line.strip() for line in text.splitlines())
+    locations: List[List[float]] = []
+    weights: List[float] = []
+
+    for line in lines:
+        if not line or line == "EOF":
+            continue
+
+        if line == "NODE_COORD_SECTION":
+            dimension = int(specification["DIMENSION"])
+            locations = [[float(value) for value in next(lines).split()[1:3]] for _ in range(dimension)]
+        elif line == "EDGE_WEIGHT_SECTION":
+            dimension = int(specification["DIMENSION"])
+
+            while len(weights) < dimension * dimension:
+                weights.extend(float(value) for value in next(lines).split())
+        elif ":" in line:
+            key, value = line.split(":", 1)
+            specification[key.strip()] = value.strip()
+
+    edge_weight_type = specification.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    problem: Dict[str, Any] = {"name": specification.get("NAME", "")}
+
+    if edge_weight_type == "EUC_2D":
+        problem.update(locations=locations, metric=EUCLIDEAN)
+    elif edge_weight_type == "GEO":
+        # TSPLIB stores geographical coordinates as DDD.MM (degrees and minutes).
+        problem.update(
+            locations=[
+                [math.trunc(value) + (value - math.trunc(value)) * 5 / 3 for value in row] for row in locations
+            ],
+            metric=HAVERSINE,
+        )
+    elif edge_weight_type == "EXPLICIT" and specification.get("EDGE_WEIGHT_FORMAT") == "FULL_MATRIX":
+        dimension = int(specification["DIMENSION"])
+        problem["distance_matrix"] = [weights[i * dimension : (i + 1) * dimension] for i in range(dimension)]
+    else:
+        raise ValueError(f"Unsupported TSPLIB edge weights: {edge_weight_type}.")
+
+    return problem
+
+
+def load_instances(paths: Optional[Iterable[Path]] = None) -> List[Dict[str, Any]]:
+    """
+    Loads TSPLIB instances from `paths`, or the bundled ones by default.
+    """
+    paths = sorted(INSTANCES_DIR.glob("*.tsp")) if paths is None else paths
+
+    return [parse_tsplib(Path(path).read_text(encoding="utf-8")) for path in paths]
+
+
+def generate_instance(size: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Returns a problem with `size` locations spread uniformly over a 100x100 square.
+    """
+    rng = random.Random(seed)
+
+    return {
+        "name": f"uniform{size}",
+        "locations": [[round(rng.uniform(0, 100), 2), round(rng.uniform(0, 100), 2)] for _ in range(size)],
+        "metric": EUCLIDEAN,
+    }
+
+
+def generate_time_windows(size: int, seed: int = 0) -> List[List[int]]:
+    """
+    Returns `size` random time windows, the first one being the depot's.
+    """
+    rng = random.Random(seed)
+    time_windows = [[0, 5]]
+
+    for _ in range(size - 1):
+        start = rng.randint(0, 20)
+        time_windows.append([start, start + rng.randint(3, 10)])
+
+    return time_windows
+
+
+def measure(func: Callable[[], Any]) -> Tuple[Any, float, int]:
+    """
+    Returns the result of `func`, its wall time in seconds and its peak traced memory in bytes.
+
+    Only Python and NumPy allocations are traced, not the solver's own heap.
+    """
+    tracemalloc.start()
+
+    try:
+        start = time.perf_counter()
+        result = func()
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, wall_time, peak_memory
+
+
+def get_objective(solution: Optional[Dict[str, Any]]) -> Optional[int]:
+    return solution["objective"] if solution else None
+
+
+def benchmark_instance(
+    problem: Dict[str, Any], time_limit: float, num_vehicles: int, max_pure_size: int
+) -> List[Dict[str, Any]]:
+    """
+    Benchmarks matrix construction, scaling and solving of a single problem.
+    """
+    locations = problem.get("locations")
+    size = len(locations if locations is not None else problem["distance_matrix"])
+    time_windows = generate_time_windows(size)
+    results = []
+
+    def record(operation: str, variant: str, func: Callable[[], Any], objective: Optional[Callable] = None) -> Any:
+        result, wall_time, peak_memory = measure(func)
+        results.append(
+            {
+                "instance": problem["name"],
+                "size": size,
+                "operation": operation,
+                "variant": variant,
+                "wall_time": wall_time,
+                "peak_memory": peak_memory,
+                "objective": objective(result) if objective else None,
+            }
+        )
+        return result
+
+    if locations is not None:
+        coordinates: List[List[float]] = locations
+        metric = problem.get("metric", EUCLIDEAN)
+        distance_matrix = record(
+            "create_distance_matrix",
+            "array",
+            lambda: create_distance_matrix_array(coordinates, metric=metric).tolist(),
+        )
+
+        if metric == EUCLIDEAN and size <= max_pure_size:
+            record("create_distance_matrix", "pure", lambda: create_distance_matrix(coordinates))
+    else:
+        distance_matrix = problem["distance_matrix"]
+
+    record(
+        "scale_matrix",
+        "array",
+        lambda: scale_to_range(distance_matrix, np.min(time_windows), np.max(time_windows)),
+    )
+
+    variants: List[Tuple[str, Dict[str, Any]]] = [
+        ("default", {}),
+        ("vehicles", {"num_vehicles": num_vehicles}),
+        ("time_windows", {"time_windows": time_windows}),
+    ]
+
+    for variant, variant_options in variants:
+        record(
+            "find_route",
+            variant,
+            functools.partial(
+                find_route,
+                locations,
+                metric=problem.get("metric", EUCLIDEAN),
+                distance_matrix=problem.get("distance_matrix"),
+                solver_options={"time_limit": time_limit},
+                **variant_options,
+            ),
+            get_objective,
+        )
+
+    return results
+
+
+def run_benchmark(
+    problems: Iterable[Dict[str, Any]], time_limit: float = 5, num_vehicles: int = 4, max_pure_size: int = 1000
+) -> Dict[str, Any]:
+    """
+    Benchmarks every problem and returns a JSON-serializable report.
+    """
+    results = []
+
+    for problem in problems:
+        results.extend(benchmark_instance(problem, time_limit, num_vehicles, max_pure_size))
+
+    return {
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "time_limit": time_limit,
+        "num_vehicles": num_vehicles,
+        "results": results,
+    }
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Returns descriptions of results that are `threshold` times slower or worse than in `baseline`.
+    """
+    baseline_results = {
+        (result["instance"], result["operation"], result["variant"]): result for result in baseline["results"]
+    }
+    regressions = []
+
+    for result in report["results"]:
+        key = (result["instance"], result["operation"], result["variant"])
+        previous = baseline_results.get(key)
+
+        if previous is None:
+            continue
+
+        name = "/".join(key)
+
+        if result["wall_time"] > max(previous["wall_time"] * threshold, MIN_REGRESSION_WALL_TIME):
+            regressions.append(f"{name}: wall time {previous['wall_time']:.3f}s -> {result['wall_time']:.3f}s")
+
+        if previous["objective"] is not None and (
+            result["objective"] is None or result["objective"] > previous["objective"] * threshold
+        ):
+            regressions.append(f"{name}: objective {previous['objective']} -> {result['objective']}")
+
+    return regressions
@@ -0,0 +1,85 @@
+import functools
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from tsp.utils.metrics import SOLUTION_CACHE_HITS, SOLUTION_CACHE_MISSES
+from tsp.utils.solver_options import validate_solver_options
+from tsp.utils.store import SolutionStore, SQLiteSolutionStore
+
+
+def _float_matrix(matrix: Optional[List[List[float]]]) -> Optional[List[List[float]]]:
+    return [[float(value) for value in row] for row in matrix] if matrix is not None else None
+
+
+def get_problem_key(problem_data: Dict[str, Any]) -> str:
+    """
+    Returns a hash identifying every problem that has the same solution as `problem_data`.
+
+    Optional fields are filled with their defaults and numbers are normalized,
+    so equivalent payloads share a key.
+    """
+    normalized_problem = {
+        "locations": _float_matrix(problem_data.get("locations")),
+        "time_windows": problem_data.get("time_windows"),
+        "depot": problem_data.get("depot", 0),
+        "num_vehicles": problem_data.get("num_vehicles", 1),
+        "metric": problem_data.get("metric", "euclidean"),
+        "distance_matrix": _float_matrix(problem_data.get("distance_matrix")),
+        "time_matrix": _float_matrix(problem_data.get("time_matrix")),
+        "solver_options": validate_solver_options(
+            problem_data.get("solver_options"),
+            problem_data.get("num_vehicles", 1),
+            has_locations=bool(problem_data.get("locations")),
+        ),
+    }
+
+    return hashlib.sha256(json.dumps(normalized_problem, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class SolutionCache:
+    """
+    Content-addressed cache of solutions, keyed by `get_problem_key`.
+
+    Lookups are counted per cache, and per process in the exported metrics.
+    """
+
+    def __init__(self, store: SolutionStore) -> None:
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, problem_key: str) -> Optional[Dict[str, Any]]:
+        record = self.store.get(problem_key)
+
+        with self._lock:
+            if record is None:
+                self.misses += 1
+                SOLUTION_CACHE_MISSES.inc()
+            else:
+                self.hits += 1
+                SOLUTION_CACHE_HITS.inc()
+
+        return record["solution"] if record else None
+
+    def set(self, problem_key: str, solution: Dict[str, Any]) -> None:
+        self.store.set(problem_key, {"solution": solution})
+
+
+@functools.lru_cache(maxsize=None)
+def get_solution_cache() -> SolutionCache:
+    """
+    Returns the process-wide solution cache configured in settings.
+    """
+    return SolutionCache(
+        SQLiteSolutionStore(
+            settings.SOLUTION_STORE_PATH,
+            settings.SOLUTION_CACHE_TTL,
+            table="solution_cache",
+            max_entries=settings.SOLUTION_CACHE_SIZE,
+        )
+    )
@@ -0,0 +1,101 @@
+"""
+Partitioning of locations for the cluster-first decomposition of `tsp.utils.tsplib`.
+"""
+from typing import List
+
+import numpy as np
+import numpy.typing as npt
+
+SWEEP = "sweep"
+KMEANS = "kmeans"
+
+CLUSTERING_METHODS = (SWEEP, KMEANS)
+
+
+def sweep_clusters(points: npt.NDArray[np.float64], depot: int, cluster_count: int) -> List[List[int]]:
+    """
+    Returns `cluster_count` groups of about the same number of locations, by angle around the depot.
+
+    The sweep starts at the widest angular gap between two locations, so a
+    group of locations lying in one direction isn't split needlessly.
+    """
+    nodes = np.delete(np.arange(len(points)), depot)
+    offsets = points[nodes] - points[depot]
+    angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+    order = np.argsort(angles, kind="stable")
+
+    if len(order) > 1:
+        gaps = np.diff(angles[order], append=angles[order[0]] + 2 * np.pi)
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+
+    return [cluster.tolist() for cluster in np.array_split(nodes[order], cluster_count) if len(cluster)]
+
+
+def kmeans_clusters(
+    points: npt.NDArray[np.float64], depot: int, cluster_count: int, max_iterations: int = 100, seed: int = 0
+) -> List[List[int]]:
+    """
+    Returns at most `cluster_count` groups of nearby locations, excluding the depot.
+
+    Runs Lloyd's algorithm from a k-means++ initialization seeded with `seed`,
+    so the same problem always gives the same clusters.
+    """
+    # pylint:disable=too-many-locals
+    rng = np.random.default_rng(seed)
+    nodes = np.delete(np.arange(len(points)), depot)
+    node_points = points[nodes]
+    cluster_count = min(cluster_count, len(nodes))
+
+    if not cluster_count:
+        return []
+
+    centers = node_points[[rng.integers(len(nodes))]]
+
+    while len(centers) < cluster_count:
+        distances = ((node_points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        probabilities = distances / distances.sum() if distances.sum() else None
+        centers = np.vstack((centers, node_points[rng.choice(len(nodes), p=probabilities)]))
+
+    labels = np.zeros(len(nodes), dtype=np.int64)
+
+    for iteration in range(max_iterations):
+        distances = ((node_points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+
+        if iteration and np.array_equal(new_labels, labels):
+            break
+
+        labels = new_labels
+
+        for cluster in range(cluster_count):
+            members = node_points[labels == cluster]
+
+            if len(members):
+                centers[cluster] = members.mean(axis=0)
+
+    return [nodes[labels == cluster].tolist() for cluster in range(cluster_count) if np.any(labels == cluster)]
+
+
+def split_vehicles(cluster_sizes: List[int], num_vehicles: int) -> List[int]:
+    """
+    Returns the number of vehicles of each cluster, proportional to its size and at least one.
+
+    Raises `ValueError` if there are more clusters than vehicles.
+    """
+    if len(cluster_sizes) > num_vehicles:
+        raise ValueError(f"Cannot split {num_vehicles} vehicles between {len(cluster_sizes)} clusters.")
+
+    if not cluster_sizes:
+        return []
+
+    shares = np.asarray(cluster_sizes, dtype=np.float64) / max(sum(cluster_sizes), 1) * num_vehicles
+    vehicles = np.maximum(np.floor(shares).astype(np.int64), 1)
+
+    # Hand out the remaining vehicles by largest remainder, or take back from the largest clusters.
+    while vehicles.sum() < num_vehicles:
+        vehicles[np.argmax(shares - vehicles)] += 1
+
+    while vehicles.sum() > num_vehicles:
+        vehicles[np.argmax(np.where(vehicles > 1, vehicles - shares, -np.inf))] -= 1
+
+    return vehicles.tolist()
@@ -1,7 +1,8 @@
+import asyncio
 import logging
 import random
 from time import sleep
-from typing import Any, Callable, Tuple, Type
+from typing import Any, Awaitable, Callable, Tuple, Type
 
 logger = logging.getLogger(__name__)
 
@@ -29,3 +30,31 @@ def retry_with_backoff(
             logger.warning("Exception encountered, will retry in %.2f seconds", sleep_time)
 
             x += 1
+
+
+async def async_retry_with_backoff(
+    func: Callable[[], Awaitable[Any]],
+    retries: int = 5,
+    backoff_in_seconds: float = 1,
+    exceptions: Tuple[Type[Exception], ...] = (Exception,),
+) -> Any:
+    """
+    Equivalent of `retry_with_backoff` for coroutine functions, sleeping without blocking the event loop.
+    """
+    x = 0
+
+    while True:
+        try:
+            return await func()
+        except exceptions:
+            if x == retries:
+                logger.error("Max retry reached, re-raising original exception")
+                raise
+
+            sleep_time = backoff_in_seconds * 2**x + random.uniform(0, 1)  # nosec
+
+            await asyncio.sleep(sleep_time)
+
+            logger.warning("Exception encountered, will retry in %.2f seconds", sleep_time)
+
+            x += 1
@@ -0,0 +1,203 @@
+"""
+Lightweight engine for single-vehicle problems of a few locations.
+
+Building an OR-Tools routing model costs more than solving such problems.
+Tours of up to `HELD_KARP_MAX_LOCATIONS` locations are found exactly by
+dynamic programming, larger ones by a nearest neighbour tour improved with
+2-opt and Or-opt moves, whose gains are evaluated for all moves at once.
+"""
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+ORTOOLS = "ortools"
+FAST = "fast"
+
+ENGINES = (ORTOOLS, FAST)
+
+# Algorithms of the fast engine, recorded as the engine of its solutions.
+HELD_KARP = "held_karp"
+LOCAL_SEARCH = "local_search"
+
+# Held-Karp takes O(2^N·N²) time and O(2^N·N) memory, which stays within milliseconds up to here.
+HELD_KARP_MAX_LOCATIONS = 12
+
+# Longest run of consecutive locations moved elsewhere by an Or-opt move.
+OR_OPT_MAX_SEGMENT = 3
+
+
+def held_karp_tour(cost: npt.NDArray[np.int64], depot: int) -> List[int]:
+    """
+    Returns the shortest tour from the depot through every other location, without the depot.
+
+    Paths are built up one subset size at a time: the cheapest path over a
+    subset ending at a location extends the cheapest one over the subset
+    without it, computed for every subset of a size and every end at once.
+    """
+    # pylint:disable=too-many-locals
+    nodes = np.delete(np.arange(len(cost)), depot)
+    node_count = len(nodes)
+
+    if not node_count:
+        return []
+
+    node_costs = cost[np.ix_(nodes, nodes)].astype(np.float64)
+    bits = 1 << np.arange(node_count)
+    subsets = np.arange(1 << node_count)
+    sizes = ((subsets[:, None] & bits) > 0).sum(axis=1)
+
+    # Cost of the cheapest path from the depot over a subset, ending at each of its locations.
+    path_costs = np.full((len(subsets), node_count), np.inf)
+    previous_nodes = np.zeros((len(subsets), node_count), dtype=np.int64)
+    path_costs[bits, np.arange(node_count)] = cost[depot, nodes]
+
+    for size in range(2, node_count + 1):
+        layer = subsets[sizes == size]
+        # Ends outside a subset extend paths over a larger subset, which aren't computed yet and cost infinity.
+        totals = path_costs[layer[:, None] ^ bits[None, :]] + node_costs.T[None, :, :]
+        previous_nodes[layer] = totals.argmin(axis=2)
+        path_costs[layer] = np.take_along_axis(totals, previous_nodes[layer][..., None], axis=2)[..., 0]
+
+    subset = len(subsets) - 1
+    node = int(np.argmin(path_costs[subset] + cost[nodes, depot]))
+    tour = []
+
+    while subset:
+        tour.append(int(nodes[node]))
+        subset, node = subset ^ int(bits[node]), int(previous_nodes[subset, node])
+
+    return tour[::-1]
+
+
+def nearest_neighbor_tour(cost: npt.NDArray[np.int64], depot: int) -> List[int]:
+    """
+    Returns a tour from the depot always going to the nearest unvisited location, without the depot.
+    """
+    visited = np.zeros(len(cost), dtype=bool)
+    visited[depot] = True
+    tour = []
+    node = depot
+
+    for _ in range(len(cost) - 1):
+        node = int(np.argmin(np.where(visited, np.iinfo(np.int64).max, cost[node])))
+        visited[node] = True
+        tour.append(node)
+
+    return tour
+
+
+def _find_two_opt_move(cost: npt.NDArray[np.int64], path: npt.NDArray[np.int64]) -> Tuple[int, int, int]:
+    """
+    Returns the gain and the arcs `i` < `j` of the best 2-opt move, which reverses the path between them.
+
+    Gains account for the reversed arcs, so asymmetric costs are supported.
+    """
+    starts, ends = path[:-1], path[1:]
+    arc_costs = cost[starts, ends]
+    forward_costs = np.concatenate(([0], np.cumsum(arc_costs)))
+    backward_costs = np.concatenate(([0], np.cumsum(cost[ends, starts])))
+
+    # Arcs i and j are replaced by arcs from start i to start j and from end i to end j.
+    deltas = (
+        cost[starts[:, None], starts[None, :]]
+        + cost[ends[:, None], ends[None, :]]
+        - arc_costs[:, None]
+        - arc_costs[None, :]
+        + (backward_costs[None, :-1] - backward_costs[1:, None])
+        - (forward_costs[None, :-1] - forward_costs[1:, None])
+    )
+    deltas[np.tril_indices(len(deltas), k=1)] = np.iinfo(np.int64).max
+
+    i, j = divmod(int(np.argmin(deltas)), deltas.shape[1])
+
+    return int(deltas[i, j]), i, j
+
+
+def _find_or_opt_move(cost: npt.NDArray[np.int64], path: npt.NDArray[np.int64], length: int) -> Tuple[int, int, int]:
+    """
+    Returns the gain of the best Or-opt move of `length` locations, the segment's first position and the target arc.
+    """
+    starts, ends = path[:-1], path[1:]
+    arc_costs = cost[starts, ends]
+    # Segments of `length` locations, the depot at both ends of the path excluded.
+    first = np.arange(1, len(path) - length)
+    last = first + length - 1
+
+    removal_gains = (
+        cost[path[first - 1], path[first]] + cost[path[last], path[last + 1]] - cost[path[first - 1], path[last + 1]]
+    )
+    insertion_costs = (
+        cost[starts[None, :], path[first][:, None]] + cost[path[last][:, None], ends[None, :]] - arc_costs
+    )
+    deltas = insertion_costs - removal_gains[:, None]
+
+    # Arcs touching or inside a segment can't take it.
+    arcs = np.arange(len(starts))
+    deltas[(arcs[None, :] >= first[:, None] - 1) & (arcs[None, :] <= last[:, None])] = np.iinfo(np.int64).max
+
+    if not deltas.size:
+        return 0, 0, 0
+
+    segment, arc = divmod(int(np.argmin(deltas)), deltas.shape[1])
+
+    return int(deltas[segment, arc]), int(first[segment]), arc
+
+
+def improve_tour(
+    cost: npt.NDArray[np.int64],
+    depot: int,
+    tour: List[int],
+    deadline: Optional[float] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> List[int]:
+    """
+    Returns `tour` improved with the best 2-opt or Or-opt move until none improves it, `deadline` passes or `should_stop` returns true.
+
+    `deadline` is a `time.monotonic()` value.
+    """
+    path = np.array([depot] + tour + [depot], dtype=np.int64)
+
+    while (deadline is None or time.monotonic() < deadline) and not (should_stop is not None and should_stop()):
+        delta, i, j = _find_two_opt_move(cost, path)
+
+        if delta < 0:
+            path[i + 1 : j + 1] = path[i + 1 : j + 1][::-1]
+            continue
+
+        for length in range(1, min(OR_OPT_MAX_SEGMENT, len(path) - 3) + 1):
+            delta, first, arc = _find_or_opt_move(cost, path, length)
+
+            if delta < 0:
+                segment = path[first : first + length]
+                rest = np.delete(path, np.arange(first, first + length))
+                path = np.insert(rest, arc + 1 if arc < first else arc + 1 - length, segment)
+                break
+        else:
+            break
+
+    return path[1:-1].tolist()
+
+
+def solve_tour(
+    cost: npt.NDArray[np.int64],
+    depot: int,
+    initial_tour: Optional[List[int]] = None,
+    time_limit: Optional[float] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Tuple[List[int], str]:
+    """
+    Returns a tour from the depot through every other location (without the depot) and the algorithm that found it.
+
+    Local search starts from `initial_tour` if given and stops after
+    `time_limit` seconds, or as soon as `should_stop` returns true. Exact
+    tours take milliseconds and are always completed.
+    """
+    if len(cost) <= HELD_KARP_MAX_LOCATIONS:
+        return held_karp_tour(cost, depot), HELD_KARP
+
+    deadline = time.monotonic() + time_limit if time_limit else None
+    tour = initial_tour if initial_tour is not None else nearest_neighbor_tour(cost, depot)
+
+    return improve_tour(cost, depot, tour, deadline, should_stop), LOCAL_SEARCH
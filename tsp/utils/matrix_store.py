@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+from django.conf import settings
+
+# Age in seconds after which a temporary file is left over by a crashed write rather than still being written.
+TEMPORARY_FILE_MAX_AGE = 3600
+
+
+class MatrixStore:
+    """
+    Keeps computed distance matrices as `.npy` files, keyed by a hash of their locations and metric.
+
+    Files are opened as read-only memory maps, so processes on one host share
+    the pages of a matrix instead of each computing and holding a copy. Once
+    the files exceed `max_size` bytes, the least recently used ones are deleted.
+    """
+
+    def __init__(self, path: str, max_size: int) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def get_key(geocoded_locations: List[List[float]], metric: str) -> str:
+        locations = np.ascontiguousarray(geocoded_locations, dtype=np.float64)
+        return hashlib.sha256(metric.encode() + b"\0" + locations.tobytes()).hexdigest()
+
+    def get(self, key: str) -> Optional[npt.NDArray[np.int64]]:
+        path = self.path / f"{key}.npy"
+
+        try:
+            matrix = np.load(path, mmap_mode="r")
+            # Memory maps don't update the access time, keep track of use for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return matrix
+
+    def set(self, key: str, matrix: npt.NDArray[np.int64]) -> None:
+        # Written aside then renamed, so readers never see a partial file.
+        with tempfile.NamedTemporaryFile(dir=self.path, suffix=".tmp", delete=False) as file:
+            np.save(file, matrix)
+
+        os.replace(file.name, self.path / f"{key}.npy")
+
+        self.purge(keep=key)
+
+    def get_or_create(
+        self,
+        geocoded_locations: List[List[float]],
+        metric: str,
+        create: Callable[[List[List[float]], str], npt.NDArray[np.int64]],
+    ) -> npt.NDArray[np.int64]:
+        """
+        Returns the stored matrix of `geocoded_locations`, creating and storing it first if needed.
+
+        The created matrix itself is returned if its file is purged before it
+        can be mapped, e.g. by another process.
+        """
+        key = self.get_key(geocoded_locations, metric)
+        matrix = self.get(key)
+
+        if matrix is None:
+            created = create(geocoded_locations, metric)
+            self.set(key, created)
+            matrix = self.get(key)
+
+            if matrix is None:
+                return created
+
+        return matrix
+
+    def purge(self, keep: Optional[str] = None) -> None:
+        """
+        Deletes the least recently used matrices until the files fit in `max_size` bytes.
+
+        The matrix keyed `keep` is never deleted, even if it doesn't fit on its own.
+        Temporary files of writes that crashed before renaming them are deleted too.
+        """
+        for path in self.path.glob("*.tmp"):
+            try:
+                if path.stat().st_mtime < time.time() - TEMPORARY_FILE_MAX_AGE:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:  # Renamed or purged by another process.
+                continue
+
+        files = []
+
+        for path in self.path.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Purged by another process.
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(file_size for _, file_size, _ in files)
+
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+
+            if path.stem == keep:
+                continue
+
+            # Pages of open maps stay valid once their file is deleted.
+            path.unlink(missing_ok=True)
+            size -= file_size
+
+
+@functools.lru_cache(maxsize=None)
+def get_matrix_store() -> Optional[MatrixStore]:
+    """
+    Returns the process-wide matrix store configured in settings, `None` if disabled.
+    """
+    if not settings.MATRIX_STORE_PATH:
+        return None
+
+    return MatrixStore(settings.MATRIX_STORE_PATH, settings.MATRIX_STORE_MAX_SIZE)
@@ -0,0 +1,232 @@
+"""
+Prometheus-style histograms and counters of the API and solver hot paths.
+
+Metrics are kept per process and rendered in the Prometheus text exposition
+format by `render_metrics`, every sample labelled with the process id so
+scrapes of several processes can be told apart and summed. Processes without a web server can serve them,
+along with their readiness, with `start_metrics_server`.
+"""
+import bisect
+import contextlib
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, Union
+
+from tsp import STARTED_AT
+
+# Upper bounds (in seconds) of the histogram buckets, the last one being implicit.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Bucket counts, sum and count of a histogram's observations.
+HistogramSnapshot = Tuple[List[int], float, int]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HEALTH_PATH = "/health/"
+
+# Set once the process is ready to take work, cleared while it can't.
+READY = threading.Event()
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        """
+        Observes the wall time of the `with` block, whether it raises or not.
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> HistogramSnapshot:
+        with self._lock:
+            return list(self._counts), self._sum, sum(self._counts)
+
+    def merge(self, changes: HistogramSnapshot) -> None:
+        """
+        Adds observations made elsewhere, e.g. in another process.
+        """
+        counts, total, _ = changes
+
+        with self._lock:
+            self._counts = [count + other for count, other in zip(self._counts, counts)]
+            self._sum += total
+
+    def render(self) -> List[str]:
+        counts, total, count = self.snapshot()
+        pid = os.getpid()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        cumulative_count = 0
+
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative_count += bucket_count
+            upper_bound = "+Inf" if math.isinf(bound) else bound
+            lines.append(f'{self.name}_bucket{{le="{upper_bound}",pid="{pid}"}} {cumulative_count}')
+
+        lines.extend((f'{self.name}_sum{{pid="{pid}"}} {total}', f'{self.name}_count{{pid="{pid}"}} {count}'))
+
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+            self._count += 1
+
+    def snapshot(self) -> HistogramSnapshot:
+        # Shaped like a histogram without buckets, so changes are merged across processes the same way.
+        with self._lock:
+            return [], self._value, self._count
+
+    def merge(self, changes: HistogramSnapshot) -> None:
+        _, total, count = changes
+
+        with self._lock:
+            self._value += total
+            self._count += count
+
+    def render(self) -> List[str]:
+        _, total, _ = self.snapshot()
+
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f'{self.name}{{pid="{os.getpid()}"}} {total}',
+        ]
+
+
+Metric = Union[Histogram, Counter]
+
+REGISTRY: Dict[str, Metric] = {}
+
+
+def histogram(name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """
+    Returns a new histogram registered under `name`.
+    """
+    metric = REGISTRY[name] = Histogram(name, documentation, buckets)
+    return metric
+
+
+def counter(name: str, documentation: str) -> Counter:
+    """
+    Returns a new counter registered under `name`.
+    """
+    metric = REGISTRY[name] = Counter(name, documentation)
+    return metric
+
+
+def snapshot() -> Dict[str, HistogramSnapshot]:
+    return {name: metric.snapshot() for name, metric in REGISTRY.items()}
+
+
+def get_changes(previous: Dict[str, HistogramSnapshot]) -> Dict[str, HistogramSnapshot]:
+    """
+    Returns the observations made since the `previous` snapshot.
+    """
+    changes = {}
+
+    for name, (counts, total, count) in snapshot().items():
+        previous_counts, previous_total, previous_count = previous.get(name, ([0] * len(counts), 0.0, 0))
+
+        if count != previous_count:
+            changes[name] = (
+                [current - before for current, before in zip(counts, previous_counts)],
+                total - previous_total,
+                count - previous_count,
+            )
+
+    return changes
+
+
+def merge(changes: Dict[str, HistogramSnapshot]) -> None:
+    for name, changed in changes.items():
+        REGISTRY[name].merge(changed)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY.values() for line in metric.render()) + "\n"
+
+
+def observe_startup() -> float:
+    """
+    Observes and returns the time since the process started, see `tsp.STARTED_AT`.
+    """
+    seconds = time.monotonic() - STARTED_AT
+    STARTUP_SECONDS.observe(seconds)
+
+    return seconds
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # pylint:disable=invalid-name
+        # Health checks fail until the process is ready, so orchestrators hold traffic and restarts meanwhile.
+        if self.path == HEALTH_PATH:
+            status, body = (200, b"ok") if READY.is_set() else (503, b"starting")
+            content_type = "text/plain"
+        else:
+            status, content_type, body = 200, CONTENT_TYPE, render_metrics().encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint:disable=redefined-builtin
+        del format, args  # Scrapes would flood the logs.
+
+
+def start_metrics_server(port: int, host: str = "") -> ThreadingHTTPServer:
+    """
+    Serves the metrics of this process over HTTP from a daemon thread, and its readiness at `HEALTH_PATH`.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+
+    return server
+
+
+MATRIX_BUILD_SECONDS = histogram("tsp_matrix_build_seconds", "Time spent computing or loading cost matrices.")
+MATRIX_SCALING_SECONDS = histogram("tsp_matrix_scaling_seconds", "Time spent scaling distances into time windows.")
+SOLVE_SECONDS = histogram("tsp_solve_seconds", "Time spent searching routes with the routing solver.")
+SOLUTION_MODEL_BUILD_SECONDS = histogram(
+    "tsp_solution_model_build_seconds", "Time spent building solution models from solver assignments."
+)
+QUEUE_WAIT_SECONDS = histogram("tsp_queue_wait_seconds", "Time problems spent in the queue before being consumed.")
+PUBLISH_SECONDS = histogram("tsp_publish_seconds", "Time spent publishing problems to the queue.")
+SOLUTION_LOOKUP_SECONDS = histogram("tsp_solution_lookup_seconds", "Time spent reading solutions from the store.")
+STARTUP_SECONDS = histogram("tsp_startup_seconds", "Time from process start until ready to take work.")
+PREWARM_SECONDS = histogram("tsp_prewarm_seconds", "Time spent loading the routing solver and solving a first model.")
+AMQP_CONNECT_SECONDS = histogram(
+    "tsp_amqp_connect_seconds", "Time spent connecting to the broker and declaring queues."
+)
+SOLUTION_CACHE_HITS = counter("tsp_solution_cache_hits_total", "Solution cache lookups that found a solution.")
+SOLUTION_CACHE_MISSES = counter("tsp_solution_cache_misses_total", "Solution cache lookups that found none.")
@@ -0,0 +1,133 @@
+import functools
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+
+from tsp.utils.store import SQLiteSolutionStore
+
+QUEUED = "queued"
+SOLVING = "solving"
+SOLVED = "solved"
+FAILED = "failed"
+# Problems dropped by the worker instead of being solved, or aborted while being solved.
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+
+# Statuses after which a problem's progress no longer changes.
+FINAL_STATUSES = (SOLVED, FAILED, CANCELLED, EXPIRED)
+
+
+@functools.lru_cache(maxsize=None)
+def get_progress_store() -> SQLiteSolutionStore:
+    """
+    Returns the process-wide store of problem progress configured in settings.
+
+    Progress changes while a problem is solved, so unlike solutions it is
+    never cached in memory.
+    """
+    return SQLiteSolutionStore(settings.SOLUTION_STORE_PATH, settings.SOLUTION_STORE_TTL, table="progress")
+
+
+@functools.lru_cache(maxsize=None)
+def get_cancellation_store() -> SQLiteSolutionStore:
+    """
+    Returns the process-wide store of cancelled problems, kept apart from progress the worker overwrites.
+    """
+    return SQLiteSolutionStore(settings.SOLUTION_STORE_PATH, settings.SOLUTION_STORE_TTL, table="cancellations")
+
+
+def set_progress(problem_id: str, status: str, objective: Optional[int] = None) -> None:
+    get_progress_store().set(
+        problem_id,
+        {
+            "id": problem_id,
+            "status": status,
+            "objective": objective,
+            "updated_at": time.time(),
+        },
+    )
+
+
+def set_progress_many(problem_ids: Iterable[str], status: str) -> None:
+    updated_at = time.time()
+
+    get_progress_store().set_many(
+        {
+            problem_id: {
+                "id": problem_id,
+                "status": status,
+                "objective": None,
+                "updated_at": updated_at,
+            }
+            for problem_id in problem_ids
+        }
+    )
+
+
+def delete_progress(problem_ids: Iterable[str]) -> None:
+    """
+    Forgets the progress of problems, e.g. marked queued but never published.
+    """
+    for problem_id in problem_ids:
+        get_progress_store().delete(problem_id)
+
+
+def get_progress(problem_id: str) -> Optional[Dict[str, Any]]:
+    return get_progress_store().get(problem_id)
+
+
+def cancel_problem(problem_id: str) -> None:
+    """
+    Asks the worker to drop a problem, or to abort its search if it is being solved.
+    """
+    get_cancellation_store().set(problem_id, {"id": problem_id, "cancelled_at": time.time()})
+
+
+def is_cancelled(problem_id: str) -> bool:
+    return get_cancellation_store().get(problem_id) is not None
+
+
+class ProgressReporter:
+    """
+    Records the best objective found so far for a problem being solved.
+
+    Meant to be passed as `on_solution` to `find_route`. Writes at most one
+    update per `interval` seconds and can be pickled into solver processes.
+    """
+
+    def __init__(self, problem_id: str, interval: Optional[float] = None) -> None:
+        self.problem_id = problem_id
+        self.interval = settings.SOLUTION_PROGRESS_INTERVAL if interval is None else interval
+        self.last_reported_at = 0.0
+
+    def __call__(self, objective: int) -> None:
+        now = time.monotonic()
+
+        if now - self.last_reported_at >= self.interval:
+            self.last_reported_at = now
+            set_progress(self.problem_id, SOLVING, objective)
+
+
+class CancellationCheck:
+    """
+    Tells whether a problem being solved was cancelled.
+
+    Meant to be passed as `should_stop` to `find_route`. Reads the store at
+    most once per `interval` seconds and can be pickled into solver processes.
+    """
+
+    def __init__(self, problem_id: str, interval: Optional[float] = None) -> None:
+        self.problem_id = problem_id
+        self.interval = settings.SOLUTION_CANCELLATION_INTERVAL if interval is None else interval
+        self.last_checked_at = 0.0
+        self.cancelled = False
+
+    def __call__(self) -> bool:
+        now = time.monotonic()
+
+        if not self.cancelled and now - self.last_checked_at >= self.interval:
+            self.last_checked_at = now
+            self.cancelled = is_cancelled(self.problem_id)
+
+        return self.cancelled
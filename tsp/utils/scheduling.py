@@ -0,0 +1,68 @@
+"""
+Size tiers of problems, each queued separately so workers can serve them with their own concurrency.
+
+Small problems are solved in well under a second while large ones may hold a
+process for minutes. Queued together, a burst of large problems delays every
+small one behind it; queued by tier, interactive problems are served by
+workers of their own.
+"""
+from typing import Any, Dict
+
+from django.conf import settings
+
+INTERACTIVE = "interactive"
+STANDARD = "standard"
+BULK = "bulk"
+
+TIERS = (INTERACTIVE, STANDARD, BULK)
+
+
+def get_problem_size(problem_data: Dict[str, Any]) -> int:
+    """
+    Returns the number of locations of a problem, counted twice when it has time windows.
+
+    Problems without locations are sized by their largest matrix. Time windows
+    add a time dimension the search has to keep feasible, which makes a
+    problem about as slow to solve as one twice its size.
+    """
+    locations = (
+        problem_data.get("locations")
+        or max(problem_data.get("distance_matrix") or [], problem_data.get("time_matrix") or [], key=len)
+        or []
+    )
+    return len(locations) * (2 if problem_data.get("time_windows") else 1)
+
+
+def get_tier(problem_data: Dict[str, Any]) -> str:
+    size = get_problem_size(problem_data)
+
+    if size <= settings.SCHEDULING_INTERACTIVE_MAX_SIZE:
+        return INTERACTIVE
+
+    if size <= settings.SCHEDULING_STANDARD_MAX_SIZE:
+        return STANDARD
+
+    return BULK
+
+
+def parse_tier_concurrency(value: str) -> Dict[str, int]:
+    """
+    Parses a comma separated list of tiers, each optionally followed by `=<concurrency>`, e.g. `interactive=2,bulk`.
+
+    Tiers without a concurrency get 0, i.e. the default one. Raises
+    `ValueError` for unknown tiers and negative concurrencies.
+    """
+    tiers = {}
+
+    for item in value.split(","):
+        tier, _, concurrency = item.strip().partition("=")
+
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier {tier!r}, expected one of {', '.join(TIERS)}.")
+
+        tiers[tier] = int(concurrency) if concurrency else 0
+
+        if tiers[tier] < 0:
+            raise ValueError(f"Concurrency of tier {tier!r} must not be negative.")
+
+    return tiers
@@ -0,0 +1,55 @@
+"""
+Encodings of problems and solutions, over HTTP and on the queue.
+
+JSON is the default. msgpack encodes the same documents in a compact binary
+form: numbers take their binary size instead of their decimal digits, which
+shrinks location lists and route plans and makes them faster to parse.
+"""
+import json
+from typing import Any, Iterable, Optional
+
+import msgpack
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+# Media types accepted for each encoding, the first one being used in responses.
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+def get_content_type(media_type: Optional[str]) -> str:
+    """
+    Returns the encoding of `media_type`, JSON unless it is a msgpack type.
+    """
+    return MSGPACK_CONTENT_TYPE if media_type in MSGPACK_CONTENT_TYPES else JSON_CONTENT_TYPE
+
+
+def get_accepted_content_type(media_types: Iterable[str]) -> str:
+    """
+    Returns the encoding of the first of the `media_types` of an `Accept` header that has one, JSON by default.
+    """
+    for media_type in media_types:
+        if media_type in MSGPACK_CONTENT_TYPES or media_type == JSON_CONTENT_TYPE:
+            return get_content_type(media_type)
+
+    return JSON_CONTENT_TYPE
+
+
+def dumps(data: Any, content_type: str = JSON_CONTENT_TYPE) -> bytes:
+    if get_content_type(content_type) == MSGPACK_CONTENT_TYPE:
+        return msgpack.packb(data)
+
+    return json.dumps(data).encode()
+
+
+def loads(body: bytes, content_type: Optional[str] = JSON_CONTENT_TYPE) -> Any:
+    """
+    Decodes a document encoded with `content_type`, JSON unless it is a msgpack type.
+
+    Raises `ValueError` (including JSON and unicode decoding errors) if the
+    document can't be decoded.
+    """
+    if get_content_type(content_type) == MSGPACK_CONTENT_TYPE:
+        return msgpack.unpackb(body)
+
+    return json.loads(body)
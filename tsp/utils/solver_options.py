@@ -0,0 +1,155 @@
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from tsp.utils.clustering import CLUSTERING_METHODS
+from tsp.utils.fast_engine import ENGINES
+
+FIRST_SOLUTION_STRATEGIES = (
+    "AUTOMATIC",
+    "PATH_CHEAPEST_ARC",
+    "PATH_MOST_CONSTRAINED_ARC",
+    "SAVINGS",
+    "SWEEP",
+    "CHRISTOFIDES",
+    "ALL_UNPERFORMED",
+    "BEST_INSERTION",
+    "PARALLEL_CHEAPEST_INSERTION",
+    "SEQUENTIAL_CHEAPEST_INSERTION",
+    "LOCAL_CHEAPEST_INSERTION",
+    "GLOBAL_CHEAPEST_ARC",
+    "LOCAL_CHEAPEST_ARC",
+    "FIRST_UNBOUND_MIN_VALUE",
+)
+
+LOCAL_SEARCH_METAHEURISTICS = (
+    "AUTOMATIC",
+    "GREEDY_DESCENT",
+    "GUIDED_LOCAL_SEARCH",
+    "SIMULATED_ANNEALING",
+    "TABU_SEARCH",
+    "GENERIC_TABU_SEARCH",
+)
+
+
+def _validate_decomposition(
+    options: Dict[str, Any], num_vehicles: Any, has_locations: bool
+) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Returns the `decomposition` and `decomposition_clusters` options, see `validate_solver_options`.
+    """
+    decomposition = options.get("decomposition")
+
+    if decomposition is not None and decomposition not in CLUSTERING_METHODS:
+        raise ValueError(f"Decomposition must be one of {', '.join(CLUSTERING_METHODS)}.")
+
+    if decomposition is not None and not has_locations:
+        raise ValueError("Decomposition requires locations.")
+
+    decomposition_clusters = options.get("decomposition_clusters")
+
+    if decomposition_clusters is not None and (
+        isinstance(decomposition_clusters, bool)
+        or not isinstance(decomposition_clusters, int)
+        or decomposition_clusters < 1
+    ):
+        raise ValueError("Decomposition clusters must be a positive integer.")
+
+    # Every cluster gets at least one vehicle. Invalid vehicle counts are the solver's to reject.
+    if decomposition_clusters is not None and isinstance(num_vehicles, int) and decomposition_clusters > num_vehicles:
+        raise ValueError(f"Decomposition clusters must be at most the number of vehicles ({num_vehicles}).")
+
+    return decomposition, decomposition_clusters
+
+
+def validate_solver_options(
+    options: Optional[Dict[str, Any]], num_vehicles: Any = 1, has_locations: bool = True
+) -> Dict[str, Any]:
+    """
+    Returns the normalized `solver_options` block of a problem with `num_vehicles` vehicles.
+
+    Problems without locations, i.e. given as matrices only, can't be decomposed.
+
+    Missing values are filled with defaults and limits are checked against the
+    server-side caps from settings. Raises `ValueError` for invalid options.
+    """
+    if options is None:
+        options = {}
+
+    if not isinstance(options, dict):
+        raise ValueError("Solver options must be an object.")
+
+    unknown_options = set(options) - {
+        "time_limit",
+        "first_solution_strategy",
+        "local_search_metaheuristic",
+        "solution_limit",
+        "log_search",
+        "candidate_neighbors",
+        "decomposition",
+        "decomposition_clusters",
+        "decomposition_repair",
+        "engine",
+    }
+
+    if unknown_options:
+        raise ValueError(f"Unknown solver options: {', '.join(sorted(unknown_options))}.")
+
+    time_limit = options.get("time_limit", settings.SOLVER_DEFAULT_TIME_LIMIT)
+
+    if (
+        isinstance(time_limit, bool)
+        or not isinstance(time_limit, (int, float))
+        or not 0 < time_limit <= settings.SOLVER_MAX_TIME_LIMIT
+    ):
+        raise ValueError(f"Time limit must be a number between 0 and {settings.SOLVER_MAX_TIME_LIMIT} seconds.")
+
+    solution_limit = options.get("solution_limit")
+
+    if solution_limit is not None and (
+        isinstance(solution_limit, bool)
+        or not isinstance(solution_limit, int)
+        or not 0 < solution_limit <= settings.SOLVER_MAX_SOLUTION_LIMIT
+    ):
+        raise ValueError(f"Solution limit must be an integer between 1 and {settings.SOLVER_MAX_SOLUTION_LIMIT}.")
+
+    candidate_neighbors = options.get("candidate_neighbors")
+
+    if candidate_neighbors is not None and (
+        isinstance(candidate_neighbors, bool)
+        or not isinstance(candidate_neighbors, int)
+        or not 0 < candidate_neighbors <= settings.SOLVER_MAX_CANDIDATE_NEIGHBORS
+    ):
+        raise ValueError(
+            f"Candidate neighbors must be an integer between 1 and {settings.SOLVER_MAX_CANDIDATE_NEIGHBORS}."
+        )
+
+    decomposition, decomposition_clusters = _validate_decomposition(options, num_vehicles, has_locations)
+
+    engine = options.get("engine")
+
+    if engine is not None and engine not in ENGINES:
+        raise ValueError(f"Engine must be one of {', '.join(ENGINES)}.")
+
+    first_solution_strategy = options.get("first_solution_strategy", "PATH_CHEAPEST_ARC")
+
+    if first_solution_strategy not in FIRST_SOLUTION_STRATEGIES:
+        raise ValueError(f"First solution strategy must be one of {', '.join(FIRST_SOLUTION_STRATEGIES)}.")
+
+    local_search_metaheuristic = options.get("local_search_metaheuristic", "AUTOMATIC")
+
+    if local_search_metaheuristic not in LOCAL_SEARCH_METAHEURISTICS:
+        raise ValueError(f"Local search metaheuristic must be one of {', '.join(LOCAL_SEARCH_METAHEURISTICS)}.")
+
+    return {
+        "time_limit": float(time_limit),
+        "first_solution_strategy": first_solution_strategy,
+        "local_search_metaheuristic": local_search_metaheuristic,
+        "solution_limit": solution_limit,
+        "log_search": bool(options.get("log_search", False)),
+        "candidate_neighbors": candidate_neighbors,
+        "decomposition": decomposition,
+        "decomposition_clusters": decomposition_clusters,
+        "decomposition_repair": bool(options.get("decomposition_repair", False)),
+        "engine": engine,
+    }
@@ -0,0 +1,248 @@
+import abc
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+
+class SolutionStore(abc.ABC):
+    """
+    Key-value store for JSON documents that expire after a TTL (in seconds).
+    """
+
+    @abc.abstractmethod
+    def get_entry(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Returns the document stored under `key` along with its expiry timestamp.
+        """
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the documents stored under `keys`, leaving out missing ones.
+        """
+        values = {key: self.get(key) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def set_many(self, values: Dict[str, Dict[str, Any]], ttl: Optional[float] = None) -> None:
+        for key, value in values.items():
+            self.set(key, value, ttl)
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class SQLiteSolutionStore(SolutionStore):
+    """
+    Stores documents in a SQLite table that can be shared by processes on one host.
+
+    Expired rows are skipped on read and purged every `purge_interval` writes,
+    along with the rows expiring soonest beyond `max_entries` if set.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float,
+        purge_interval: int = 100,
+        table: str = "solutions",
+        max_entries: Optional[int] = None,
+    ) -> None:
+        # pylint:disable=too-many-arguments
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table!r}.")
+
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.table = table
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, nor with forked processes.
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = sqlite3.connect(self.path, timeout=30)
+            self._local.pid = os.getpid()
+
+        return self._local.connection
+
+    def get_entry(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        row = (
+            self._connection()
+            .execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ? AND expires_at > ?",  # nosec
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        keys = list(keys)
+        values: Dict[str, Dict[str, Any]] = {}
+
+        # Stay below SQLite's default limit of 999 parameters per statement.
+        for start in range(0, len(keys), 900):
+            chunk = keys[start : start + 900]
+            rows = (
+                self._connection()
+                .execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({', '.join('?' * len(chunk))})"  # nosec
+                    " AND expires_at > ?",
+                    (*chunk, time.time()),
+                )
+                .fetchall()
+            )
+            values.update((key, json.loads(value)) for key, value in rows)
+
+        return values
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, values: Dict[str, Dict[str, Any]], ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._connection() as connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",  # nosec
+                [(key, json.dumps(value), expires_at) for key, value in values.items()],
+            )
+
+        self._writes += len(values)
+
+        if self._writes >= self.purge_interval:
+            self._writes = 0
+            self.purge()
+
+    def delete(self, key: str) -> None:
+        with self._connection() as connection:
+            connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))  # nosec
+
+    def purge(self) -> None:
+        with self._connection() as connection:
+            connection.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))  # nosec
+
+            if self.max_entries is not None:
+                connection.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "  # nosec
+                    f"(SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+
+class CachedSolutionStore(SolutionStore):
+    """
+    Keeps the most recently used documents of `backend` in memory.
+
+    Only hits are cached, so a solution written by another process is seen as
+    soon as it reaches the backend.
+    """
+
+    def __init__(self, backend: SolutionStore, maxsize: int) -> None:
+        self.backend = backend
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_entry(self, key: str, entry: Tuple[Dict[str, Any], float]) -> None:
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _get_cached_entry(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            entry = self._cache.get(key)
+
+            if entry and entry[1] > time.time():
+                self._cache.move_to_end(key)
+                return entry
+
+            self._cache.pop(key, None)
+
+        return None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        entry = self._get_cached_entry(key)
+
+        if entry:
+            return entry
+
+        entry = self.backend.get_entry(key)
+
+        if entry:
+            self._cache_entry(key, entry)
+
+        return entry
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        values: Dict[str, Dict[str, Any]] = {}
+        missing_keys = []
+
+        for key in keys:
+            entry = self._get_cached_entry(key)
+
+            if entry is None:
+                missing_keys.append(key)
+            else:
+                values[key] = entry[0]
+
+        # Expiries aren't returned in bulk, so these are cached on their next single read.
+        values.update(self.backend.get_many(missing_keys))
+
+        return values
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, values: Dict[str, Dict[str, Any]], ttl: Optional[float] = None) -> None:
+        self.backend.set_many(values, ttl)
+
+        with self._lock:
+            # The expiry is only known to the backend, let the next read cache it.
+            for key in values:
+                self._cache.pop(key, None)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+        with self._lock:
+            self._cache.pop(key, None)
+
+
+@functools.lru_cache(maxsize=None)
+def get_solution_store() -> SolutionStore:
+    """
+    Returns the process-wide solution store configured in settings.
+    """
+    return CachedSolutionStore(
+        SQLiteSolutionStore(settings.SOLUTION_STORE_PATH, settings.SOLUTION_STORE_TTL),
+        settings.SOLUTION_STORE_CACHE_SIZE,
+    )
@@ -0,0 +1,123 @@
+import asyncio
+from unittest import mock
+
+import pika.exceptions
+
+from tsp.utils import amqp
+
+
+def test_publisher_pool_reuses_connection_and_reconnects(monkeypatch):
+    stale_publisher, fresh_publisher = mock.MagicMock(), mock.MagicMock()
+    stale_publisher.publish_problem.side_effect = pika.exceptions.StreamLostError()
+    publisher_class = mock.MagicMock(side_effect=[stale_publisher, fresh_publisher])
+    monkeypatch.setattr(amqp, "Publisher", publisher_class)
+
+    pool = amqp.PublisherPool(backoff_in_seconds=0)
+
+    for body in (b"first", b"second", b"third"):
+        pool.publish_problem(body)
+
+    assert publisher_class.call_count == 2
+    stale_publisher.close.assert_called_once()
+    assert fresh_publisher.publish_problem.call_args_list == [
+        mock.call(b"first", "application/json", "standard", None, None),
+        mock.call(b"second", "application/json", "standard", None, None),
+        mock.call(b"third", "application/json", "standard", None, None),
+    ]
+
+
+def test_async_publisher_pool_shares_channel_and_reconnects(monkeypatch):
+    stale_channel, fresh_channel = mock.MagicMock(is_closed=False), mock.MagicMock(is_closed=False)
+    stale_channel.default_exchange.publish = mock.AsyncMock(side_effect=ConnectionResetError())
+    fresh_channel.default_exchange.publish = mock.AsyncMock()
+    connect = mock.AsyncMock(side_effect=[(mock.AsyncMock(), stale_channel), (mock.AsyncMock(), fresh_channel)])
+    monkeypatch.setattr(amqp.AsyncPublisherPool, "_connect", connect)
+
+    pool = amqp.AsyncPublisherPool(backoff_in_seconds=0)
+
+    async def publish() -> None:
+        await asyncio.gather(*(pool.publish_problem(body) for body in (b"first", b"second", b"third")))
+
+    asyncio.run(publish())
+
+    assert connect.await_count == 2
+    assert [call.args[0].body for call in fresh_channel.default_exchange.publish.await_args_list] == [
+        b"first",
+        b"second",
+        b"third",
+    ]
+
+
+def test_publisher_waits_for_reply(monkeypatch):
+    connection = mock.MagicMock()
+    channel = connection.channel.return_value
+    channel.queue_declare.return_value.method.queue = "amq.gen-reply"
+    monkeypatch.setattr(amqp.pika, "BlockingConnection", mock.Mock(return_value=connection))
+
+    publisher = amqp.Publisher()
+    publisher.publish_problem(b"{}", correlation_id="problem")
+
+    properties = channel.basic_publish.call_args.kwargs["properties"]
+    assert (properties.reply_to, properties.correlation_id) == ("amq.gen-reply", "problem")
+    assert properties.expiration is None
+    assert amqp.AMQPBase.EXPIRES_AT_HEADER not in properties.headers
+
+    on_reply = channel.basic_consume.call_args.kwargs["on_message_callback"]
+    connection.process_data_events.side_effect = lambda time_limit: on_reply(
+        channel, None, pika.BasicProperties(correlation_id="problem"), b'{"status": "solved"}'
+    )
+
+    assert publisher.wait_for_reply("problem", 5) == {"status": "solved"}
+    assert publisher.wait_for_reply("problem", 0) is None
+    assert not publisher.replies
+
+
+def test_async_publisher_pool_waits_for_reply(monkeypatch):
+    channel = mock.MagicMock(is_closed=False)
+    channel.default_exchange.publish = mock.AsyncMock()
+    channel.declare_queue = mock.AsyncMock(return_value=mock.MagicMock(consume=mock.AsyncMock()))
+    channel.declare_queue.return_value.name = "amq.gen-reply"
+    monkeypatch.setattr(amqp.AsyncPublisherPool, "_connect", mock.AsyncMock(return_value=(mock.AsyncMock(), channel)))
+
+    pool = amqp.AsyncPublisherPool()
+
+    async def call() -> tuple:
+        await pool.publish_problem(b"{}", correlation_id="problem")
+        on_reply = channel.declare_queue.return_value.consume.await_args.args[0]
+        await on_reply(mock.Mock(correlation_id="problem", body=b'{"status": "solved"}', content_type=None))
+
+        return await pool.wait_for_reply("problem", 5), await pool.wait_for_reply("unknown", 5)
+
+    assert asyncio.run(call()) == ({"status": "solved"}, None)
+    assert channel.default_exchange.publish.await_args.args[0].reply_to == "amq.gen-reply"
+
+
+def test_publisher_sets_problem_deadline(monkeypatch):
+    connection = mock.MagicMock()
+    monkeypatch.setattr(amqp.pika, "BlockingConnection", mock.Mock(return_value=connection))
+
+    amqp.Publisher().publish_problem(b"{}", ttl=1.5)
+
+    properties = connection.channel.return_value.basic_publish.call_args.kwargs["properties"]
+    # Expired messages would be discarded by the broker without the problem being reported as expired.
+    assert properties.expiration is None
+    assert (
+        properties.headers[amqp.AMQPBase.EXPIRES_AT_HEADER]
+        == properties.headers[amqp.AMQPBase.ENQUEUED_AT_HEADER] + 1.5
+    )
+
+
+def test_publisher_declares_dead_letter_queue(monkeypatch):
+    connection = mock.MagicMock()
+    monkeypatch.setattr(amqp.pika, "BlockingConnection", mock.Mock(return_value=connection))
+
+    amqp.Publisher()
+
+    channel = connection.channel.return_value
+    channel.queue_bind.assert_called_once_with(
+        amqp.AMQPBase.DEAD_LETTER_QUEUE_NAME, amqp.AMQPBase.DEAD_LETTER_EXCHANGE_NAME
+    )
+    arguments = {call.kwargs["queue"]: call.kwargs.get("arguments") for call in channel.queue_declare.call_args_list}
+    # Arguments can't be added to problem queues already declared on a broker.
+    assert arguments["tspproblems"] is None
+    assert arguments[amqp.AMQPBase.DEAD_LETTER_QUEUE_NAME]["x-message-ttl"] > 0
@@ -0,0 +1,51 @@
+import pytest
+
+from tsp.utils.benchmark import find_regressions, generate_instance, load_instances, parse_tsplib, run_benchmark
+
+GEO_INSTANCE = """NAME : geo2
+TYPE : TSP
+DIMENSION : 2
+EDGE_WEIGHT_TYPE : GEO
+NODE_COORD_SECTION
+1 10.30 -5.30
+2 0.00 0.00
+EOF
+"""
+
+EXPLICIT_INSTANCE = """NAME : explicit2
+DIMENSION : 2
+EDGE_WEIGHT_TYPE : EXPLICIT
+EDGE_WEIGHT_FORMAT : FULL_MATRIX
+EDGE_WEIGHT_SECTION
+0 1
+2 0
+EOF
+"""
+
+
+def test_parse_tsplib_supports_coordinates_and_explicit_weights():
+    geo_problem = parse_tsplib(GEO_INSTANCE)
+
+    assert geo_problem["metric"] == "haversine"
+    assert geo_problem["locations"] == [[pytest.approx(10.5), pytest.approx(-5.5)], [0, 0]]
+    assert parse_tsplib(EXPLICIT_INSTANCE)["distance_matrix"] == [[0, 1], [2, 0]]
+    assert {problem["name"] for problem in load_instances()} >= {"uniform48", "geo30", "explicit12"}
+
+
+def test_run_benchmark_reports_every_operation():
+    report = run_benchmark([generate_instance(10)], time_limit=0.1, num_vehicles=2)
+    operations = {(result["operation"], result["variant"]) for result in report["results"]}
+
+    assert operations == {
+        ("create_distance_matrix", "array"),
+        ("create_distance_matrix", "pure"),
+        ("scale_matrix", "array"),
+        ("find_route", "default"),
+        ("find_route", "vehicles"),
+        ("find_route", "time_windows"),
+    }
+    assert not find_regressions(report, report, threshold=1.0)
+
+    slower_report = {"results": [{**result, "wall_time": result["wall_time"] + 1} for result in report["results"]]}
+
+    assert len(find_regressions(slower_report, report, threshold=1.25)) == len(report["results"])
@@ -0,0 +1,42 @@
+from tsp.utils import metrics
+from tsp.utils.cache import SolutionCache, get_problem_key
+from tsp.utils.store import SQLiteSolutionStore
+
+
+def test_get_problem_key_normalizes_problems():
+    problem = {"locations": [[0, 0], [1, 1]]}
+
+    assert get_problem_key(problem) == get_problem_key(
+        {
+            "locations": [[0.0, 0.0], [1.0, 1.0]],
+            "depot": 0,
+            "num_vehicles": 1,
+            "solver_options": {"first_solution_strategy": "PATH_CHEAPEST_ARC"},
+        }
+    )
+    assert get_problem_key(problem) != get_problem_key({**problem, "num_vehicles": 2})
+    assert get_problem_key(problem) != get_problem_key({**problem, "solver_options": {"time_limit": 1}})
+
+
+def test_solution_cache_counts_hits_and_misses(tmp_path):
+    cache = SolutionCache(SQLiteSolutionStore(str(tmp_path / "cache.sqlite3"), ttl=60, table="solution_cache"))
+    before = metrics.snapshot()
+
+    assert cache.get("key") is None
+
+    cache.set("key", {"objective": 1})
+
+    assert cache.get("key") == {"objective": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    changes = metrics.get_changes(before)
+    assert changes[metrics.SOLUTION_CACHE_HITS.name][1] == changes[metrics.SOLUTION_CACHE_MISSES.name][1] == 1
+
+
+def test_sqlite_solution_store_is_size_bounded(tmp_path):
+    store = SQLiteSolutionStore(str(tmp_path / "cache.sqlite3"), ttl=60, purge_interval=5, max_entries=3)
+
+    for i in range(5):
+        store.set(str(i), {"solution": i})
+
+    assert [store.get(str(i)) is not None for i in range(5)] == [False, False, True, True, True]
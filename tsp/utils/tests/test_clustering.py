@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from tsp.utils.clustering import kmeans_clusters, split_vehicles, sweep_clusters
+
+
+def test_sweep_clusters_splits_locations_by_angle():
+    # Depot at the origin, two locations in each quadrant.
+    points = np.array([[0, 0], [1, 1], [2, 1], [-1, 1], [-1, 2], [-1, -1], [-2, -1], [1, -1], [1, -2]], dtype=float)
+
+    clusters = sweep_clusters(points, 0, 4)
+
+    assert sorted(sorted(cluster) for cluster in clusters) == [[1, 2], [3, 4], [5, 6], [7, 8]]
+    assert sweep_clusters(points, 0, 20) == [[node] for node in sum(clusters, [])]
+
+
+def test_kmeans_clusters_groups_nearby_locations():
+    rng = np.random.default_rng(0)
+    centers = [[0, 0], [50, 50], [100, 0]]
+    points = np.vstack([[[50, 20]]] + [rng.normal(center, 1, (10, 2)) for center in centers])
+
+    clusters = kmeans_clusters(points, 0, 3)
+
+    assert sorted(sorted(cluster) for cluster in clusters) == [
+        list(range(1, 11)),
+        list(range(11, 21)),
+        list(range(21, 31)),
+    ]
+    assert kmeans_clusters(points, 0, 3) == clusters
+
+
+def test_split_vehicles_is_proportional():
+    assert split_vehicles([10, 10], 2) == [1, 1]
+    assert split_vehicles([30, 10], 4) == [3, 1]
+    assert split_vehicles([100, 1, 1], 4) == [2, 1, 1]
+    assert split_vehicles([], 2) == []
+
+    with pytest.raises(ValueError):
+        split_vehicles([1, 1, 1], 2)
@@ -0,0 +1,44 @@
+import itertools
+
+import numpy as np
+
+from tsp.utils.fast_engine import HELD_KARP, LOCAL_SEARCH, held_karp_tour, improve_tour, solve_tour
+
+
+def get_tour_cost(cost, depot, tour):
+    path = [depot] + tour + [depot]
+    return sum(cost[a, b] for a, b in zip(path, path[1:]))
+
+
+def test_held_karp_tour_is_optimal_for_asymmetric_costs():
+    rng = np.random.default_rng(0)
+
+    for location_count in range(1, 8):
+        cost = rng.integers(0, 100, (location_count, location_count))
+        depot = location_count // 2
+        others = [node for node in range(location_count) if node != depot]
+        optimal_cost = min(get_tour_cost(cost, depot, list(tour)) for tour in itertools.permutations(others))
+
+        assert get_tour_cost(cost, depot, held_karp_tour(cost, depot)) == optimal_cost
+
+
+def test_improve_tour_uncrosses_and_moves_locations():
+    # Locations on a circle, the optimal tour visits them in order.
+    angles = np.linspace(0, 2 * np.pi, 16, endpoint=False)
+    points = np.column_stack((np.cos(angles), np.sin(angles))) * 1000
+    cost = np.rint(np.linalg.norm(points[:, None] - points[None, :], axis=2)).astype(np.int64)
+    tour = [8, 2, 9, 1, 3, 15, 4, 14, 5, 13, 6, 12, 7, 11, 10]
+
+    improved_tour = improve_tour(cost, 0, tour)
+
+    assert improved_tour in (list(range(1, 16)), list(range(15, 0, -1)))
+    assert solve_tour(cost, 0, tour)[1] == LOCAL_SEARCH
+    assert solve_tour(cost[:5, :5], 0)[1] == HELD_KARP
+
+
+def test_improve_tour_stops_when_asked():
+    cost = np.random.default_rng(0).integers(0, 100, (30, 30))
+    tour = list(range(1, 30))
+
+    assert improve_tour(cost, 0, tour, should_stop=lambda: True) == tour
+    assert solve_tour(cost, 0, tour, should_stop=lambda: True) == (tour, LOCAL_SEARCH)
@@ -0,0 +1,76 @@
+import os
+from unittest import mock
+
+import numpy as np
+
+from tsp.utils.matrix_store import MatrixStore
+from tsp.utils.tsplib import create_cost_matrix, create_distance_matrix_array
+
+
+def test_matrix_store_computes_each_matrix_once(tmp_path):
+    store = MatrixStore(str(tmp_path), max_size=2**20)
+    locations = [[0, 0], [3, 4], [6, 8]]
+    create = mock.Mock(side_effect=lambda locations, metric: create_distance_matrix_array(locations, metric=metric))
+
+    matrix = store.get_or_create(locations, "euclidean", create)
+
+    assert isinstance(matrix, np.memmap)
+    assert not matrix.flags.writeable
+    assert store.get_or_create(locations, "euclidean", create).tolist() == matrix.tolist()
+    assert create.call_count == 1
+
+    store.get_or_create(locations, "manhattan", create)
+
+    assert create.call_count == 2
+    assert create_cost_matrix(locations, matrix_store=store).tolist() == create_cost_matrix(locations).tolist()
+
+
+def test_matrix_store_evicts_least_recently_used_matrices(tmp_path):
+    store = MatrixStore(str(tmp_path), max_size=2000)
+
+    for key in "abc":
+        store.set(key, np.zeros((10, 10), dtype=np.int64))
+        os.utime(tmp_path / f"{key}.npy", (ord(key), ord(key)))
+
+    assert store.get("a") is None
+    assert store.get("b") is not None
+
+    store.set("d", np.zeros((10, 10), dtype=np.int64))
+
+    assert store.get("b") is not None
+    assert store.get("c") is None
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_matrix_store_keeps_matrices_larger_than_its_size(tmp_path):
+    store = MatrixStore(str(tmp_path), max_size=100)
+    create = mock.Mock(side_effect=lambda locations, metric: create_distance_matrix_array(locations, metric=metric))
+
+    matrix = store.get_or_create([[0, 0], [3, 4], [6, 8]], "euclidean", create)
+
+    assert matrix.tolist() == create_distance_matrix_array([[0, 0], [3, 4], [6, 8]]).tolist()
+    assert store.get(store.get_key([[0, 0], [3, 4], [6, 8]], "euclidean")) is not None
+
+
+def test_matrix_store_returns_created_matrix_purged_before_read(tmp_path, monkeypatch):
+    store = MatrixStore(str(tmp_path), max_size=2**20)
+    monkeypatch.setattr(store, "get", mock.Mock(return_value=None))
+
+    matrix = store.get_or_create(
+        [[0, 0], [3, 4]], "euclidean", lambda locations, metric: create_distance_matrix_array(locations, metric=metric)
+    )
+
+    assert matrix.tolist() == create_distance_matrix_array([[0, 0], [3, 4]]).tolist()
+
+
+def test_matrix_store_purges_leftover_temporary_files(tmp_path):
+    store = MatrixStore(str(tmp_path), max_size=2**20)
+    leftover, pending = tmp_path / "leftover.tmp", tmp_path / "pending.tmp"
+    leftover.write_bytes(b"partial")
+    pending.write_bytes(b"partial")
+    os.utime(leftover, (0, 0))
+
+    store.purge()
+
+    assert not leftover.exists()
+    assert pending.exists()
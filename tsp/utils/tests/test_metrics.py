@@ -0,0 +1,86 @@
+import http.client
+import os
+
+from tsp.utils import metrics
+from tsp.utils.metrics import (
+    HEALTH_PATH,
+    READY,
+    Counter,
+    Histogram,
+    get_changes,
+    histogram,
+    merge,
+    snapshot,
+    start_metrics_server,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    metric = Histogram("test_seconds", "Test durations.", buckets=(0.1, 1))
+
+    for value in (0.05, 0.5, 0.5, 3):
+        metric.observe(value)
+
+    pid = os.getpid()
+
+    assert metric.render() == [
+        "# HELP test_seconds Test durations.",
+        "# TYPE test_seconds histogram",
+        f'test_seconds_bucket{{le="0.1",pid="{pid}"}} 1',
+        f'test_seconds_bucket{{le="1",pid="{pid}"}} 3',
+        f'test_seconds_bucket{{le="+Inf",pid="{pid}"}} 4',
+        f'test_seconds_sum{{pid="{pid}"}} 4.05',
+        f'test_seconds_count{{pid="{pid}"}} 4',
+    ]
+
+
+def test_counter_renders_total_and_merges_changes():
+    metric = Counter("test_total", "Test events.")
+    metric.inc()
+    metric.inc(2)
+
+    assert metric.render() == [
+        "# HELP test_total Test events.",
+        "# TYPE test_total counter",
+        f'test_total{{pid="{os.getpid()}"}} 3.0',
+    ]
+
+    metric.merge(([], 4.0, 1))
+
+    assert metric.snapshot() == ([], 7.0, 3)
+
+
+def test_get_changes_can_be_merged_back(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", {})
+    metric = histogram("test_changes_seconds", "Test durations.", buckets=(1,))
+    metric.observe(0.5)
+    before = snapshot()
+
+    metric.observe(2)
+    changes = get_changes(before)
+
+    assert changes == {"test_changes_seconds": ([0, 1], 2.0, 1)}
+
+    merge(changes)
+
+    assert metric.snapshot() == ([1, 2], 4.5, 3)
+
+
+def test_metrics_server_reports_readiness():
+    server = start_metrics_server(0, "127.0.0.1")
+
+    def get_health_status() -> int:
+        connection = http.client.HTTPConnection(*server.server_address)
+        connection.request("GET", HEALTH_PATH)
+
+        return connection.getresponse().status
+
+    try:
+        assert get_health_status() == 503
+
+        READY.set()
+
+        assert get_health_status() == 200
+    finally:
+        READY.clear()
+        server.shutdown()
@@ -0,0 +1,38 @@
+import pytest
+
+from tsp.utils.progress import (
+    SOLVED,
+    SOLVING,
+    CancellationCheck,
+    ProgressReporter,
+    cancel_problem,
+    get_progress,
+    set_progress,
+)
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_progress_reporter_throttles_updates():
+    reporter = ProgressReporter("problem", interval=60)
+
+    reporter(100)
+    reporter(90)
+
+    assert get_progress("problem")["objective"] == 100
+    assert get_progress("problem")["status"] == SOLVING
+
+    set_progress("problem", SOLVED, 80)
+
+    assert get_progress("problem")["status"] == SOLVED
+
+
+@pytest.mark.usefixtures("solution_store")
+def test_cancellation_check_throttles_reads():
+    check = CancellationCheck("problem", interval=60)
+
+    assert not check()
+
+    cancel_problem("problem")
+
+    assert not check()
+    assert CancellationCheck("problem", interval=60)()
@@ -0,0 +1,26 @@
+import pytest
+
+from tsp.utils.scheduling import BULK, INTERACTIVE, STANDARD, get_tier, parse_tier_concurrency
+
+
+def test_get_tier_classifies_problems_by_size(settings):
+    settings.SCHEDULING_INTERACTIVE_MAX_SIZE = 4
+    settings.SCHEDULING_STANDARD_MAX_SIZE = 8
+    locations = [[index, index] for index in range(5)]
+
+    assert get_tier({"locations": locations[:4]}) == INTERACTIVE
+    assert get_tier({"locations": locations}) == STANDARD
+    assert get_tier({"distance_matrix": [[0] * 3] * 3}) == INTERACTIVE
+    assert get_tier({"time_matrix": [[0] * 5] * 5, "time_windows": [[0, 10]] * 5}) == BULK
+    # Time windows count every location twice.
+    assert get_tier({"locations": locations, "time_windows": [[0, 10]] * 5}) == BULK
+
+
+def test_parse_tier_concurrency():
+    assert parse_tier_concurrency("interactive=4, bulk") == {INTERACTIVE: 4, BULK: 0}
+
+    with pytest.raises(ValueError):
+        parse_tier_concurrency("urgent")
+
+    with pytest.raises(ValueError):
+        parse_tier_concurrency("standard=-1")
@@ -0,0 +1,36 @@
+import pytest
+
+from tsp.utils.serialization import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    dumps,
+    get_accepted_content_type,
+    get_content_type,
+    loads,
+)
+
+
+@pytest.mark.parametrize("content_type", [JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, "application/x-msgpack"])
+def test_documents_round_trip(content_type):
+    problem = {"locations": [[40.74924, 169.19068], [-45.81594, 146.19084]], "depot": 0, "time_windows": None}
+
+    assert loads(dumps(problem, content_type), content_type) == problem
+
+
+def test_msgpack_is_more_compact():
+    problem = {"locations": [[index / 7, -index / 3] for index in range(1000)]}
+
+    assert len(dumps(problem, MSGPACK_CONTENT_TYPE)) < len(dumps(problem)) / 1.5
+
+
+def test_content_types_default_to_json():
+    assert get_content_type(None) == JSON_CONTENT_TYPE
+    assert get_content_type("text/plain") == JSON_CONTENT_TYPE
+    assert get_accepted_content_type(["*/*"]) == JSON_CONTENT_TYPE
+    assert get_accepted_content_type(["text/html", "application/msgpack", "application/json"]) == MSGPACK_CONTENT_TYPE
+    assert get_accepted_content_type(["application/json", "application/msgpack"]) == JSON_CONTENT_TYPE
+
+
+def test_loads_rejects_invalid_msgpack():
+    with pytest.raises(ValueError):
+        loads(b"\xc1", MSGPACK_CONTENT_TYPE)
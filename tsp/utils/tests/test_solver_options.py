@@ -0,0 +1,64 @@
+import pytest
+
+from tsp.utils.solver_options import validate_solver_options
+
+
+def test_validate_solver_options_fills_defaults(settings):
+    settings.SOLVER_DEFAULT_TIME_LIMIT = 10
+
+    assert validate_solver_options(None) == {
+        "time_limit": 10.0,
+        "first_solution_strategy": "PATH_CHEAPEST_ARC",
+        "local_search_metaheuristic": "AUTOMATIC",
+        "solution_limit": None,
+        "log_search": False,
+        "candidate_neighbors": None,
+        "decomposition": None,
+        "decomposition_clusters": None,
+        "decomposition_repair": False,
+        "engine": None,
+    }
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"time_limit": 0},
+        {"time_limit": 301},
+        {"time_limit": "10"},
+        {"solution_limit": 0},
+        {"solution_limit": 100001},
+        {"first_solution_strategy": "FASTEST"},
+        {"local_search_metaheuristic": "EVOLUTION"},
+        {"candidate_neighbors": 0},
+        {"candidate_neighbors": True},
+        {"decomposition": "random"},
+        {"decomposition_clusters": 0},
+        {"decomposition": "sweep", "decomposition_clusters": 2},
+        {"engine": "held_karp"},
+        {"unknown": 1},
+        [],
+    ],
+)
+def test_validate_solver_options_rejects_invalid_options(settings, options):
+    settings.SOLVER_MAX_TIME_LIMIT = 300
+    settings.SOLVER_MAX_SOLUTION_LIMIT = 100000
+
+    with pytest.raises(ValueError):
+        validate_solver_options(options)
+
+
+def test_validate_solver_options_rejects_decomposition_without_locations():
+    assert validate_solver_options({"decomposition": "sweep"}, has_locations=True)["decomposition"] == "sweep"
+
+    with pytest.raises(ValueError):
+        validate_solver_options({"decomposition": "sweep"}, has_locations=False)
+
+
+def test_validate_solver_options_caps_decomposition_clusters_at_num_vehicles():
+    options = {"decomposition": "sweep", "decomposition_clusters": 3}
+
+    assert validate_solver_options(options, num_vehicles=3)["decomposition_clusters"] == 3
+
+    with pytest.raises(ValueError):
+        validate_solver_options(options, num_vehicles=2)
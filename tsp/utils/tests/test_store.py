@@ -0,0 +1,49 @@
+import time
+
+from tsp.utils.store import CachedSolutionStore, SQLiteSolutionStore
+
+
+def test_sqlite_solution_store_expires_entries(tmp_path):
+    store = SQLiteSolutionStore(str(tmp_path / "store.sqlite3"), ttl=60)
+
+    store.set("a", {"solution": 1})
+    store.set("b", {"solution": 2}, ttl=-1)
+
+    assert store.get("a") == {"solution": 1}
+    assert store.get("b") is None
+
+    store.purge()
+    store.delete("a")
+
+    assert store.get("a") is None
+
+
+def test_cached_solution_store_evicts_least_recently_used(tmp_path):
+    backend = SQLiteSolutionStore(str(tmp_path / "store.sqlite3"), ttl=60)
+    store = CachedSolutionStore(backend, maxsize=2)
+
+    for key in "abc":
+        backend.set(key, {"solution": key})
+        assert store.get(key) == {"solution": key}
+
+    assert list(store._cache) == ["b", "c"]
+
+    store.set("c", {"solution": "updated"})
+
+    assert store.get("c") == {"solution": "updated"}
+
+    store._cache["b"] = ({"solution": "b"}, time.time() - 1)
+    backend.delete("b")
+
+    assert store.get("b") is None
+
+
+def test_cached_solution_store_reads_and_writes_in_bulk(tmp_path):
+    backend = SQLiteSolutionStore(str(tmp_path / "store.sqlite3"), ttl=60)
+    store = CachedSolutionStore(backend, maxsize=2)
+
+    store.set_many({str(index): {"solution": index} for index in range(1000)})
+
+    assert store.get("0") == {"solution": 0}
+    assert store.get_many(["0", "999", "missing"]) == {"0": {"solution": 0}, "999": {"solution": 999}}
+    assert len(backend.get_many(str(index) for index in range(1000))) == 1000
@@ -1,4 +1,20 @@
-from tsp.utils.tsplib import find_route
+import random
+import subprocess  # nosec
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from tsp.utils import tsplib
+from tsp.utils.tsplib import (
+    create_distance_matrix,
+    create_distance_matrix_array,
+    find_nearest_neighbors,
+    find_route,
+    find_route_for_problem,
+    scale_to_range,
+)
 
 
 def test_find_route_returns_result():
@@ -10,4 +26,241 @@ def test_find_route_returns_result():
         [16.53802, -148.45893],
     ]
 
+    # Pinned to OR-Tools, the fast engine would solve such a small problem without a routing model.
+    solver_options = {"engine": "ortools"}
+    solution = find_route(locations, solver_options=solver_options)
+
+    assert solution is not None
+    assert solution["engine"] == "ortools"
+    assert solution == find_route(locations, vectorized=False, solver_options=solver_options)
+    assert solution == find_route(locations, native_transit=False, solver_options=solver_options)
     assert find_route(locations) is not None
+
+
+def test_create_distance_matrix_array_matches_pure_python():
+    rng = random.Random(42)
+    locations = [[rng.uniform(-90, 90), rng.uniform(-180, 180)] for _ in range(50)]
+
+    assert create_distance_matrix_array(locations).tolist() == create_distance_matrix(locations)
+
+    float_matrix = create_distance_matrix_array(locations, dtype=np.float32)
+
+    assert float_matrix.dtype == np.float32
+    assert np.allclose(np.rint(float_matrix), create_distance_matrix(locations))
+    assert create_distance_matrix_array(locations, dtype=np.int32).dtype == np.int32
+
+
+def test_scale_to_range_maps_values_onto_new_range():
+    matrix = np.array([[0, 3, 10], [3, 0, 7], [10, 7, 0]], dtype=np.int64)
+
+    scaled = scale_to_range(matrix, 5, 20, out=matrix)
+
+    assert scaled is matrix
+    # Truncated like `int((20 - 5) * ((value - 0) / (10 - 0)) + 5)`.
+    assert scaled.tolist() == [[5, 9, 20], [9, 5, 15], [20, 15, 5]]
+    # Equal values have no range to scale from.
+    assert scale_to_range([[4, 4], [4, 4]], 0, 30).tolist() == [[0, 0], [0, 0]]
+
+
+def test_scale_to_range_scales_blocks_of_rows(monkeypatch):
+    matrix = np.arange(49, dtype=np.int64).reshape(7, 7)
+    expected = scale_to_range(matrix, 0, 1000)
+    monkeypatch.setattr(tsplib, "MATRIX_BLOCK_SIZE", 3)
+
+    assert scale_to_range(matrix, 0, 1000).tolist() == expected.tolist()
+    assert scale_to_range(matrix.ravel(), 0, 1000).tolist() == expected.ravel().tolist()
+
+
+def test_distance_metrics():
+    locations = [[51.5007, -0.1246], [40.6892, -74.0445], [0.0, 3.0]]
+    matrix = create_distance_matrix_array(locations, metric="haversine")
+
+    assert abs(matrix[0][1] - 5574840) < 5000  # London -> New York, in meters.
+    assert (matrix == matrix.T).all()
+    assert create_distance_matrix_array([[0, 0], [3, 4]], metric="manhattan").tolist() == [[0, 7], [7, 0]]
+
+    with pytest.raises(ValueError):
+        create_distance_matrix_array(locations, metric="unknown")
+
+
+def test_find_route_uses_supplied_matrix():
+    distance_matrix = [
+        [0, 1, 100, 1],
+        [1, 0, 1, 100],
+        [100, 1, 0, 1],
+        [1, 100, 1, 0],
+    ]
+
+    solution = find_route(None, distance_matrix=distance_matrix)
+
+    assert solution is not None
+    assert solution["objective"] > 0
+    assert solution["route_plans"][0]["route_distance"] == 4
+
+    with pytest.raises(ValueError):
+        find_route([[0, 0], [1, 1]], distance_matrix=distance_matrix)
+
+
+def test_find_route_applies_solver_options():
+    rng = random.Random(7)
+    locations = [[rng.uniform(0, 100), rng.uniform(0, 100)] for _ in range(30)]
+    solver_options = {
+        "time_limit": 1,
+        "first_solution_strategy": "SAVINGS",
+        "local_search_metaheuristic": "GUIDED_LOCAL_SEARCH",
+    }
+
+    guided_solution = find_route(locations, solver_options=solver_options)
+
+    assert guided_solution is not None
+    assert guided_solution["objective"] <= find_route(locations)["objective"]
+
+
+def test_find_route_solves_haversine_problems():
+    locations = [[51.5007, -0.1246], [48.8584, 2.2945], [52.5163, 13.3777], [41.8902, 12.4922]]
+
+    solution = find_route(locations, metric="haversine")
+
+    assert solution is not None
+    assert solution["objective"] > 3000
+
+
+def test_find_route_dispatches_small_problems_to_fast_engine(settings):
+    settings.SOLVER_FAST_ENGINE_MAX_LOCATIONS = 15
+    rng = random.Random(3)
+    locations = [[rng.uniform(0, 1000), rng.uniform(0, 1000)] for _ in range(15)]
+    ortools_solution = find_route(locations, solver_options={"engine": "ortools"})
+
+    assert find_route(locations[:10])["engine"] == "held_karp"
+    assert find_route(locations[:10], num_vehicles=2)["engine"] == "ortools"
+    assert find_route(locations + [[0, 0]])["engine"] == "ortools"
+
+    solution = find_route(locations)
+
+    # Same objective as OR-Tools solutions, the span cost included.
+    assert solution["engine"] == "local_search"
+    assert solution["objective"] <= ortools_solution["objective"]
+    assert sorted(route["route_index"] for route in solution["route_plans"][0]["routes"][1:-1]) == list(range(1, 15))
+
+    with pytest.raises(ValueError):
+        find_route(locations, num_vehicles=2, solver_options={"engine": "fast"})
+
+
+def test_find_route_reports_improving_solutions():
+    rng = random.Random(3)
+    locations = [[rng.uniform(0, 100), rng.uniform(0, 100)] for _ in range(30)]
+    objectives = []
+
+    solution = find_route(locations, solver_options={"time_limit": 1}, on_solution=objectives.append)
+
+    assert objectives
+    assert objectives == sorted(objectives, reverse=True)
+    assert objectives[-1] == solution["objective"]
+
+
+@pytest.mark.parametrize("dimensions", [2, 3])
+def test_find_nearest_neighbors_matches_brute_force(dimensions):
+    rng = np.random.default_rng(5)
+    # Clustered points exercise cells with many or no points.
+    points = np.concatenate([rng.normal(center, 1, (150, dimensions)) for center in (0, 20, 21)])
+
+    distances = ((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+    np.fill_diagonal(distances, np.inf)
+    neighbors = find_nearest_neighbors(points, 8)
+
+    assert np.allclose(np.take_along_axis(distances, neighbors, axis=1), np.sort(distances, axis=1)[:, :8])
+    assert find_nearest_neighbors(points[:3], 8).shape == (3, 2)
+
+
+@pytest.mark.parametrize("metric", ["euclidean", "haversine"])
+def test_find_route_solves_over_candidate_graph(settings, metric):
+    settings.SOLVER_SPARSE_MIN_LOCATIONS = 200
+    rng = random.Random(9)
+    locations = [[rng.uniform(-10, 10), rng.uniform(-10, 10)] for _ in range(200)]
+
+    solution = find_route_for_problem(
+        {"locations": locations, "metric": metric, "num_vehicles": 2, "solver_options": {"time_limit": 1}}
+    )
+
+    visited = [route["route_index"] for plan in solution["route_plans"] for route in plan["routes"][1:-1]]
+    assert sorted(visited) == list(range(1, 200))
+
+    with pytest.raises(ValueError):
+        find_route(locations, time_windows=[[0, 5]] * 200, solver_options={"candidate_neighbors": 8})
+
+
+@pytest.mark.parametrize(
+    "solver_options",
+    [
+        {"decomposition": "sweep"},
+        {"decomposition": "kmeans", "decomposition_clusters": 2},
+        {"decomposition": "kmeans", "decomposition_repair": True},
+    ],
+)
+def test_find_route_decomposes_multi_vehicle_problems(solver_options):
+    rng = random.Random(11)
+    locations = [[rng.uniform(0, 100), rng.uniform(0, 100)] for _ in range(40)]
+
+    solution = find_route(locations, depot=5, num_vehicles=4, solver_options={"time_limit": 1, **solver_options})
+
+    visited = [route["route_index"] for plan in solution["route_plans"] for route in plan["routes"][1:-1]]
+    assert sorted(visited) == [node for node in range(40) if node != 5]
+    assert [plan["vehicle_id"] for plan in solution["route_plans"]] == [0, 1, 2, 3]
+    assert all(plan["routes"][0]["route_index"] == 5 for plan in solution["route_plans"])
+    assert solution["max_route_distance"] == max(plan["route_distance"] for plan in solution["route_plans"])
+
+
+def test_find_route_decomposes_depot_only_problems():
+    solution = find_route([[0, 0]], num_vehicles=2, solver_options={"decomposition": "sweep"})
+
+    assert solution["objective"] == 0
+    assert [[route["route_index"] for route in plan["routes"]] for plan in solution["route_plans"]] == [[0, 0], [0, 0]]
+
+
+@pytest.mark.parametrize("solver_options", [{}, {"candidate_neighbors": 4}])
+def test_find_route_starts_from_initial_routes(solver_options):
+    locations = np.random.default_rng(3).random((40, 2)).tolist()
+    initial_routes = [list(range(30, 0, -1)) + [99], [0, 5]]
+
+    solution = find_route(locations, num_vehicles=2, solver_options=solver_options, initial_routes=initial_routes)
+
+    assert solution is not None
+    assert sorted(route["route_index"] for plan in solution["route_plans"] for route in plan["routes"][1:-1]) == list(
+        range(1, 40)
+    )
+
+
+def test_tsplib_loads_the_solver_on_first_use():
+    # Checked in a fresh interpreter, this one has loaded it for other tests.
+    code = (
+        "import sys, django; django.setup(); from tsp.utils.tsplib import find_route; "
+        "assert find_route([[0, 0], [3, 4], [6, 8]])['engine'] == 'held_karp'; sys.exit('ortools' in sys.modules)"
+    )
+
+    assert subprocess.run([sys.executable, "-c", code], check=False).returncode == 0  # nosec
+
+
+def test_find_route_stops_searching_when_asked():
+    rng = random.Random(0)
+    locations = [[rng.uniform(0, 100), rng.uniform(0, 100)] for _ in range(100)]
+    solver_options = {"time_limit": 30, "local_search_metaheuristic": "GUIDED_LOCAL_SEARCH", "engine": "ortools"}
+    objectives = []
+    started_at = time.monotonic()
+
+    assert (
+        find_route(
+            locations,
+            solver_options=solver_options,
+            on_solution=objectives.append,
+            should_stop=lambda: bool(objectives),
+        )
+        is not None
+    )
+    assert time.monotonic() - started_at < 10
+
+
+def test_find_route_does_not_solve_when_already_stopped():
+    locations = [[0, 0], [3, 4], [6, 8], [1, 1]]
+
+    assert find_route(locations, should_stop=lambda: True) is None
+    assert find_route(locations, solver_options={"engine": "ortools"}, should_stop=lambda: True) is None
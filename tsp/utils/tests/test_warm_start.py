@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from tsp.utils.warm_start import fit_initial_routes, get_solution_routes, validate_initial_routes
+
+
+def test_get_solution_routes_matches_stops_by_location():
+    solution = {
+        "route_plans": [
+            {"routes": [{"route_index": 0}, {"route_index": 2}, {"route_index": 1}, {"route_index": 0}]},
+            {"routes": [{"route_index": 0}, {"route_index": 3}, {"route_index": 0}]},
+        ]
+    }
+    previous_locations = [[0, 0], [1, 1], [2, 2], [3, 3]]
+    locations = [[0, 0], [2.0, 2.0], [4, 4], [3, 3]]
+
+    assert get_solution_routes(solution, previous_locations, locations) == [[1], [3]]
+    assert get_solution_routes(solution, None, locations) == [[2, 1], [3]]
+
+
+def test_fit_initial_routes_inserts_missing_locations_at_least_cost():
+    points = np.array([[0, 0], [0, 1], [1, 1], [1, 0], [0.5, 1.1], [3, 1]])
+    matrix = np.rint(np.hypot(*(points[:, None] - points[None]).transpose(2, 0, 1)) * 100).astype(np.int64)
+
+    routes = fit_initial_routes(
+        [[1, 0, 2, 9, 2, 3], [5]],
+        len(points),
+        0,
+        1,
+        lambda from_nodes, to_nodes: matrix[from_nodes, to_nodes],
+    )
+
+    # The depot, unknown and repeated locations are dropped, so are extra vehicles' routes.
+    assert routes == [[1, 4, 2, 5, 3]]
+    assert fit_initial_routes([], 3, 1, 2, lambda from_nodes, to_nodes: matrix[from_nodes, to_nodes]) == [[2, 0], []]
+
+
+@pytest.mark.parametrize("initial_routes", [[1, 2], [[1, "2"]], [[True]], {"routes": []}])
+def test_validate_initial_routes_rejects_invalid_routes(initial_routes):
+    with pytest.raises(ValueError):
+        validate_initial_routes(initial_routes)
@@ -1,7 +1,38 @@
+import functools
+import itertools
 import math
-from typing import Any, Dict, List, Optional
-
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from django.conf import settings
+
+from tsp.utils.clustering import SWEEP, kmeans_clusters, split_vehicles, sweep_clusters
+from tsp.utils.fast_engine import FAST, ORTOOLS, solve_tour
+from tsp.utils.matrix_store import MatrixStore, get_matrix_store
+from tsp.utils.metrics import (
+    MATRIX_BUILD_SECONDS,
+    MATRIX_SCALING_SECONDS,
+    PREWARM_SECONDS,
+    SOLUTION_MODEL_BUILD_SECONDS,
+    SOLVE_SECONDS,
+)
+from tsp.utils.solver_options import validate_solver_options
+from tsp.utils.warm_start import fit_initial_routes
+
+# OR-Tools takes a while to load and only the solver needs it, it's imported on first use.
+if TYPE_CHECKING:
+    from ortools.constraint_solver import pywrapcp
+
+# Engine of decomposed solutions whose clusters were solved by different engines.
+MIXED_ENGINES = "mixed"
+
+# Number of matrix rows computed per vectorized block. Bounds the size of the
+# temporary float64 buffers to `MATRIX_BLOCK_SIZE * location_count` cells.
+MATRIX_BLOCK_SIZE = 1024
 
 
 def calculate_distance(from_location: List[float], to_location: List[float]) -> float:
@@ -20,6 +51,129 @@ def create_distance_matrix(geocoded_locations: List[List[float]]) -> List[List[i
     return distance_matrix
 
 
+# Cost of the longest route per unit of distance, on top of the total distance,
+# that balances routes of problems without time windows.
+SPAN_COST_COEFFICIENT = 100
+
+# Mean Earth radius used by the haversine metric, in meters.
+EARTH_RADIUS = 6371008.8
+
+EUCLIDEAN = "euclidean"
+HAVERSINE = "haversine"
+MANHATTAN = "manhattan"
+
+DistanceMetric = Callable[[npt.NDArray[np.float64], npt.NDArray[np.float64]], npt.NDArray[np.float64]]
+
+DISTANCE_METRICS: Dict[str, DistanceMetric] = {}
+
+
+def register_distance_metric(name: str) -> Callable[[DistanceMetric], DistanceMetric]:
+    """
+    Registers a pairwise distance function under `name`.
+
+    The function receives an `(m, 2)` block of origins and an `(n, 2)` array of
+    destinations and must return the `(m, n)` float64 distances between them.
+    """
+
+    def decorator(func: DistanceMetric) -> DistanceMetric:
+        DISTANCE_METRICS[name] = func
+        return func
+
+    return decorator
+
+
+def get_distance_metric(name: str) -> DistanceMetric:
+    try:
+        return DISTANCE_METRICS[name]
+    except KeyError:
+        raise ValueError(f"Unknown distance metric {name!r}, expected one of {sorted(DISTANCE_METRICS)}.") from None
+
+
+@register_distance_metric(EUCLIDEAN)
+def euclidean_distances(
+    origins: npt.NDArray[np.float64], destinations: npt.NDArray[np.float64]
+) -> npt.NDArray[np.float64]:
+    distances = np.subtract.outer(origins[:, 0], destinations[:, 0])
+    return np.hypot(distances, np.subtract.outer(origins[:, 1], destinations[:, 1]), out=distances)
+
+
+@register_distance_metric(MANHATTAN)
+def manhattan_distances(
+    origins: npt.NDArray[np.float64], destinations: npt.NDArray[np.float64]
+) -> npt.NDArray[np.float64]:
+    distances = np.abs(np.subtract.outer(origins[:, 0], destinations[:, 0]))
+    distances += np.abs(np.subtract.outer(origins[:, 1], destinations[:, 1]))
+    return distances
+
+
+@register_distance_metric(HAVERSINE)
+def haversine_distances(
+    origins: npt.NDArray[np.float64], destinations: npt.NDArray[np.float64]
+) -> npt.NDArray[np.float64]:
+    """
+    Great-circle distances in meters between (lat, long) pairs given in degrees.
+    """
+    origins, destinations = np.radians(origins), np.radians(destinations)
+
+    distances = np.sin(np.subtract.outer(origins[:, 0], destinations[:, 0]) / 2) ** 2
+    distances += (
+        np.outer(np.cos(origins[:, 0]), np.cos(destinations[:, 0]))
+        * np.sin(np.subtract.outer(origins[:, 1], destinations[:, 1]) / 2) ** 2
+    )
+    np.clip(distances, 0, 1, out=distances)
+    np.sqrt(distances, out=distances)
+    np.arcsin(distances, out=distances)
+    distances *= 2 * EARTH_RADIUS
+
+    return distances
+
+
+def create_distance_matrix_array(
+    geocoded_locations: List[List[float]], dtype: npt.DTypeLike = np.int64, metric: str = EUCLIDEAN
+) -> npt.NDArray[Any]:
+    """
+    Vectorized equivalent of `create_distance_matrix` for any registered metric.
+
+    Pairwise distances are broadcast one block of rows at a time into a
+    preallocated `dtype` array. Integer dtypes are rounded in bulk (half to
+    even, same as `round`), float dtypes keep the exact distances.
+    """
+    distance_function = get_distance_metric(metric)
+    locations = np.asarray(geocoded_locations, dtype=np.float64).reshape(-1, 2)
+    location_count = len(locations)
+    distance_matrix = np.empty((location_count, location_count), dtype=dtype)
+    is_integer = np.issubdtype(distance_matrix.dtype, np.integer)
+
+    for start in range(0, location_count, MATRIX_BLOCK_SIZE):
+        block = distance_function(locations[start : start + MATRIX_BLOCK_SIZE], locations)
+
+        if is_integer:
+            np.rint(block, out=block)
+
+        distance_matrix[start : start + MATRIX_BLOCK_SIZE] = block
+
+    np.fill_diagonal(distance_matrix, 0)
+
+    return distance_matrix
+
+
+def validate_matrix(matrix: List[List[float]], location_count: Optional[int] = None) -> npt.NDArray[np.int64]:
+    """
+    Returns a caller-supplied matrix as a square integer array.
+
+    Raises `ValueError` if it is not square or does not match `location_count`.
+    """
+    array = np.asarray(matrix, dtype=np.float64)
+
+    if array.ndim != 2 or array.shape[0] != array.shape[1]:
+        raise ValueError(f"Matrix must be square, got shape {array.shape}.")
+
+    if location_count is not None and array.shape[0] != location_count:
+        raise ValueError(f"Matrix size {array.shape[0]} does not match location count {location_count}.")
+
+    return np.rint(array).astype(np.int64)
+
+
 def create_data_model(distance_matrix: List[List[float]]) -> Dict[str, Any]:
     return {
         "distance_matrix": distance_matrix,
@@ -29,7 +183,7 @@ def create_data_model(distance_matrix: List[List[float]]) -> Dict[str, Any]:
 
 
 def build_solution_model(
-    data: Dict[str, Any], manager: pywrapcp.RoutingIndexManager, routing: pywrapcp.RoutingModel, solution: Any
+    data: Dict[str, Any], manager: "pywrapcp.RoutingIndexManager", routing: "pywrapcp.RoutingModel", solution: Any
 ) -> Dict[str, Any]:
     """
     Builds and returns the solution data model.
@@ -38,6 +192,7 @@ def build_solution_model(
         "objective": solution.ObjectiveValue(),
         "max_route_distance": 0,
         "route_plans": [],
+        "engine": ORTOOLS,
     }
 
     for vehicle_id in range(data["num_vehicles"]):
@@ -71,14 +226,39 @@ def build_solution_model(
     return solution_data
 
 
+def build_tour_solution_model(cost: npt.NDArray[np.int64], depot: int, tour: List[int], engine: str) -> Dict[str, Any]:
+    """
+    Builds and returns the solution data model of a single vehicle's tour, like `build_solution_model` does.
+
+    The objective adds the span cost of the routing model, so it compares
+    with the objective of OR-Tools solutions.
+    """
+    nodes = [depot] + tour + [depot]
+    route_distance = int(cost[nodes[:-1], nodes[1:]].sum())
+
+    return {
+        "objective": route_distance * (1 + SPAN_COST_COEFFICIENT),
+        "max_route_distance": route_distance,
+        "route_plans": [
+            {
+                "vehicle_id": 0,
+                "routes": [{"route_index": node} for node in nodes],
+                "route_distance": route_distance,
+            }
+        ],
+        "engine": engine,
+    }
+
+
 def build_solution_model_with_time_windows(
-    data: Dict[str, Any], manager: pywrapcp.RoutingIndexManager, routing: pywrapcp.RoutingModel, solution: Any
+    data: Dict[str, Any], manager: "pywrapcp.RoutingIndexManager", routing: "pywrapcp.RoutingModel", solution: Any
 ) -> Dict[str, Any]:
     """
     Builds and returns the solution data model.
     """
     solution_data = {
         "objective": solution.ObjectiveValue(),  # in minutes
+        "engine": ORTOOLS,
         "total_time": 0,  # Total time of all routes (in minutes).
         "route_plans": [],
     }
@@ -123,63 +303,757 @@ def build_solution_model_with_time_windows(
     return solution_data
 
 
-def get_matrix_range(distance_matrix):
-    min_distance, max_distance = 0, 0
+def scale_to_range(
+    values: npt.ArrayLike, new_min: float, new_max: float, out: Optional[npt.NDArray[np.int64]] = None
+) -> npt.NDArray[np.int64]:
+    """
+    Returns `values` mapped linearly from their own range onto `new_min`..`new_max`, truncated to integers.
 
-    for i, row in enumerate(distance_matrix):
-        _max = max(row)
-        _min = min(row)
+    The transform runs `MATRIX_BLOCK_SIZE` rows at a time and is written
+    into `out` if given, which may be `values` itself. Values that are all
+    equal have no range and are all mapped to `new_min`.
+    """
+    array = np.asarray(values)
 
-        if not i:
-            min_distance = _min
-            max_distance = _max
-            continue
+    if out is None:
+        out = np.empty(array.shape, dtype=np.int64)
 
-        if _min < min_distance:
-            min_distance = _min
+    if not array.size:
+        return out
 
-        if _max > max_distance:
-            max_distance = _max
+    old_min, old_max = array.min(), array.max()
 
-    return min_distance, max_distance
+    if old_min == old_max:
+        out.fill(int(new_min))
+        return out
 
+    rows, out_rows = np.atleast_1d(array), np.atleast_1d(out)
 
-def scale(value, old_min, old_max, new_min, new_max):
-    result = ((new_max - new_min) * ((value - old_min) / (old_max - old_min))) + new_min
-    return int(result)
+    for start in range(0, len(rows), MATRIX_BLOCK_SIZE):
+        # Same operations in the same order as scaling each value on its own, so results don't depend on the path.
+        scaled = np.subtract(rows[start : start + MATRIX_BLOCK_SIZE], old_min, dtype=np.float64)
+        scaled /= old_max - old_min
+        scaled *= new_max - new_min
+        scaled += new_min
 
+        # Unsafe casting truncates towards zero like `int()`.
+        np.copyto(out_rows[start : start + MATRIX_BLOCK_SIZE], scaled, casting="unsafe")
 
-def scale_matrix(matrix, old_min, old_max, new_min, new_max):
-    for i, row in enumerate(matrix):
-        for j, _ in enumerate(row):
-            matrix[i][j] = scale(matrix[i][j], old_min, old_max, new_min, new_max)
+    return out
 
-    return matrix
 
+def create_cost_matrix(
+    geocoded_locations: Optional[List[List[float]]],
+    metric: str = EUCLIDEAN,
+    distance_matrix: Optional[List[List[float]]] = None,
+    time_matrix: Optional[List[List[float]]] = None,
+    vectorized: bool = True,
+    time_windows: Optional[List[List[int]]] = None,
+    matrix_store: Optional[MatrixStore] = None,
+) -> npt.NDArray[np.int64]:
+    """
+    Returns the arc cost matrix of a problem, as an integer array.
+
+    A caller-supplied `time_matrix` takes precedence over `distance_matrix`,
+    and either one skips computing distances from `geocoded_locations`.
+    `vectorized=False` selects the pure-Python fallback for euclidean distances.
+    Distances are scaled into the time window range when `time_windows` are given.
 
-def find_route(
+    Computed distances are read from and written to `matrix_store` if given.
+    Their matrices are returned as the store's read-only memory maps, whose
+    pages are shared between processes as long as they aren't copied.
+    """
+    # pylint:disable=too-many-arguments
+    location_count = len(geocoded_locations) if geocoded_locations else None
+    matrix = time_matrix if time_matrix is not None else distance_matrix
+
+    with MATRIX_BUILD_SECONDS.time():
+        if matrix is not None:
+            cost_matrix = validate_matrix(matrix, location_count)
+        elif not geocoded_locations:
+            raise ValueError("Either locations or a distance/time matrix must be provided.")
+        elif matrix_store is not None:
+            cost_matrix = matrix_store.get_or_create(
+                geocoded_locations,
+                metric,
+                lambda locations, metric: create_distance_matrix_array(locations, metric=metric),
+            )
+        elif vectorized or metric != EUCLIDEAN:
+            cost_matrix = create_distance_matrix_array(geocoded_locations, metric=metric)
+        else:
+            cost_matrix = np.asarray(create_distance_matrix(geocoded_locations), dtype=np.int64)
+
+    if time_windows and time_matrix is None:
+        with MATRIX_SCALING_SECONDS.time():
+            windows = np.asarray(time_windows)
+            # Stored matrices are read-only memory maps, others are scaled in place.
+            cost_matrix = scale_to_range(
+                cost_matrix, windows.min(), windows.max(), out=cost_matrix if cost_matrix.flags.writeable else None
+            )
+
+    return cost_matrix
+
+
+def _get_cells_within(
+    cell: Tuple[int, ...], radius: int, buckets: Dict[Tuple[int, ...], npt.NDArray[np.int64]], keys: npt.NDArray[Any]
+) -> List[npt.NDArray[np.int64]]:
+    """
+    Returns the buckets of the non-empty grid cells at most `radius` cells away from `cell`.
+    """
+    if (2 * radius + 1) ** len(cell) <= len(buckets):
+        offsets = itertools.product(range(-radius, radius + 1), repeat=len(cell))
+        cells = (tuple(a + b for a, b in zip(cell, offset)) for offset in offsets)
+        return [buckets[cell] for cell in cells if cell in buckets]
+
+    # Sparse grids have fewer non-empty cells than cells around `cell`.
+    return [buckets[tuple(key)] for key in keys[np.abs(keys - cell).max(axis=1) <= radius].tolist()]
+
+
+def get_spatial_points(locations: npt.NDArray[np.float64], metric: str) -> npt.NDArray[np.float64]:
+    """
+    Returns points whose straight-line distances order `locations` like `metric`.
+
+    Haversine locations become points on the unit sphere, whose chord lengths
+    order them like great-circle distances. Other locations are kept as is.
+    """
+    if metric != HAVERSINE:
+        return locations
+
+    latitudes, longitudes = np.radians(locations).T
+    return np.column_stack(
+        (np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes), np.sin(latitudes))
+    )
+
+
+def find_nearest_neighbors(points: npt.NDArray[np.float64], k: int) -> npt.NDArray[np.int64]:
+    """
+    Returns the indices of the `k` nearest points of every point, nearest first.
+
+    Points are bucketed into a uniform grid of about `k` points per cell. The
+    neighbours of a cell's points are searched in growing rings of cells until
+    the k-th nearest one is closer than any point outside, which only takes
+    O(N·k) distances for evenly spread points.
+    """
+    # pylint:disable=too-many-locals
+    point_count, dimensions = points.shape
+    k = min(k, point_count - 1)
+    neighbors = np.empty((point_count, max(k, 0)), dtype=np.int64)
+
+    if k <= 0:
+        return neighbors
+
+    cells_per_axis = max(1, int((point_count / k) ** (1 / dimensions)))
+    cell_size = float(np.ptp(points, axis=0).max()) / cells_per_axis or 1.0
+    cells = np.minimum((points - points.min(axis=0)) // cell_size, cells_per_axis - 1).astype(np.int64)
+
+    keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+    order = np.argsort(inverse.reshape(-1), kind="stable")
+    bounds = np.searchsorted(inverse.reshape(-1)[order], np.arange(len(keys) + 1))
+    buckets = {tuple(key): order[bounds[i] : bounds[i + 1]] for i, key in enumerate(keys.tolist())}
+
+    for cell, members in buckets.items():
+        for radius in itertools.count(1):
+            candidates = np.concatenate(_get_cells_within(cell, radius, buckets, keys))
+            is_exhaustive = radius >= cells_per_axis
+
+            if len(candidates) <= k and not is_exhaustive:
+                continue
+
+            distances = ((points[members, None, :] - points[None, candidates, :]) ** 2).sum(axis=2)
+            distances[members[:, None] == candidates[None, :]] = np.inf
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+
+            if is_exhaustive or nearest_distances.max() <= (radius * cell_size) ** 2:
+                break
+
+        ranking = np.argsort(nearest_distances, axis=1, kind="stable")
+        neighbors[members] = candidates[np.take_along_axis(nearest, ranking, axis=1)]
+
+    return neighbors
+
+
+class CandidateGraph:
+    """
+    Sparse arc costs between every location and its `k` nearest neighbours.
+
+    Neighbours are the nearest in a straight line, which are exact for the
+    euclidean and haversine metrics. Every location may also go back to the
+    depot, and the arcs of a nearest neighbour `route` through all locations
+    are computed on demand so a feasible route always exists. Memory grows
+    with `N·k` instead of `N²`, assuming a symmetric metric.
+    """
+
+    def __init__(self, geocoded_locations: List[List[float]], k: int, metric: str = EUCLIDEAN, depot: int = 0) -> None:
+        self.distance_function = get_distance_metric(metric)
+        self.locations = np.asarray(geocoded_locations, dtype=np.float64).reshape(-1, 2)
+        self.depot = depot
+
+        points = get_spatial_points(self.locations, metric)
+        neighbors = find_nearest_neighbors(points, k)
+
+        self.depot_costs = self._get_costs(depot, np.arange(len(self.locations)))
+        self.costs: List[Dict[int, int]] = []
+
+        for node, node_neighbors in enumerate(neighbors):
+            nodes = node_neighbors[node_neighbors != depot]
+            self.costs.append(dict(zip(nodes.tolist(), self._get_costs(node, nodes).tolist())))
+
+        # Arcs go both ways, so routes can be reversed by local search.
+        for node, node_costs in enumerate(self.costs):
+            if node != depot:
+                for neighbor, cost in list(node_costs.items()):
+                    self.costs[neighbor].setdefault(node, cost)
+
+        self.route = self._create_route(np.lexsort(points.T[::-1]).tolist())
+        self.max_route_cost = self._get_max_route_cost()
+
+    def _get_max_route_cost(self) -> int:
+        """
+        Returns an upper bound of the cost of a route through every location.
+        """
+        return sum(
+            max(max(costs.values(), default=0), int(depot_cost))
+            for costs, depot_cost in zip(self.costs, self.depot_costs)
+        )
+
+    def _get_costs(self, node: int, nodes: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+        costs = self.distance_function(self.locations[node : node + 1], self.locations[nodes])[0]
+        return np.rint(costs).astype(np.int64)
+
+    def _create_route(self, order: List[int]) -> List[int]:
+        """
+        Returns a nearest neighbour route from the depot through every location.
+
+        When every neighbour of a location was visited, the route jumps to the
+        first unvisited location in `order` and that arc joins the graph.
+        """
+        visited = [False] * len(self.locations)
+        visited[self.depot] = True
+        route: List[int] = []
+        node = self.depot
+        unvisited = iter(order)
+
+        for _ in range(len(self.locations) - 1):
+            next_node = min(
+                (neighbor for neighbor in self.costs[node] if not visited[neighbor]),
+                key=self.costs[node].__getitem__,
+                default=None,
+            )
+
+            if next_node is None:
+                next_node = next(candidate for candidate in unvisited if not visited[candidate])
+                self.costs[node][next_node] = int(self._get_costs(node, np.array([next_node]))[0])
+
+            visited[next_node] = True
+            route.append(next_node)
+            node = next_node
+
+        return route
+
+    def get_costs(self, from_nodes: Any, to_nodes: Any) -> npt.NDArray[np.int64]:
+        """
+        Returns the exact costs of the arcs from `from_nodes` to `to_nodes`, broadcast together.
+
+        Arcs sharing a location are computed in a single call, others one at a time.
+        """
+        from_nodes, to_nodes = np.broadcast_arrays(np.atleast_1d(from_nodes), np.atleast_1d(to_nodes))
+
+        if np.all(from_nodes == from_nodes[0]):
+            return self._get_costs(from_nodes[0], to_nodes)
+
+        if np.all(to_nodes == to_nodes[0]):  # Costs are symmetric.
+            return self._get_costs(to_nodes[0], from_nodes)
+
+        return np.array(
+            [self._get_costs(from_node, np.array([to_node]))[0] for from_node, to_node in zip(from_nodes, to_nodes)],
+            dtype=np.int64,
+        )
+
+    def add_routes(self, routes: List[List[int]]) -> None:
+        """
+        Adds the arcs of `routes` to the graph, e.g. so the search may start from them.
+        """
+        for route in routes:
+            for from_node, to_node in zip([self.depot] + route, route):
+                if to_node not in self.costs[from_node]:
+                    self.costs[from_node][to_node] = int(self.get_costs(from_node, to_node)[0])
+
+        self.max_route_cost = self._get_max_route_cost()
+
+    def get_arc_cost(self, from_node: int, to_node: int) -> int:
+        if to_node == self.depot:
+            return int(self.depot_costs[from_node])
+
+        if from_node == to_node:
+            return 0
+
+        # Arcs outside the graph are forbidden, yet evaluated by local search
+        # before being filtered out: price them out without computing them.
+        return self.costs[from_node].get(to_node, self.max_route_cost)
+
+    def get_allowed_nodes(self, node: int) -> List[int]:
+        """
+        Returns the nodes other than the depot that may be visited right after `node`.
+        """
+        return list(self.costs[node])
+
+
+def create_search_parameters(solver_options: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Returns routing search parameters for a normalized `solver_options` block.
+
+    See `tsp.utils.solver_options.validate_solver_options`. Without options the
+    search uses `PATH_CHEAPEST_ARC` and runs until a local optimum is reached.
+    """
+    # pylint:disable=import-outside-toplevel
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+    solver_options = solver_options or {}
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+
+    # Setting first solution heuristic.
+    search_parameters.first_solution_strategy = getattr(
+        routing_enums_pb2.FirstSolutionStrategy,  # pylint: disable=no-member
+        solver_options.get("first_solution_strategy", "PATH_CHEAPEST_ARC"),
+    )
+    search_parameters.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic,  # pylint: disable=no-member
+        solver_options.get("local_search_metaheuristic", "AUTOMATIC"),
+    )
+
+    if solver_options.get("time_limit"):
+        search_parameters.time_limit.FromMilliseconds(int(solver_options["time_limit"] * 1000))
+
+    if solver_options.get("solution_limit"):
+        search_parameters.solution_limit = solver_options["solution_limit"]
+
+    search_parameters.log_search = bool(solver_options.get("log_search"))
+
+    return search_parameters
+
+
+def add_solution_callback(
+    routing: "pywrapcp.RoutingModel",
+    on_solution: Optional[Callable[[int], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> None:
+    """
+    Calls `on_solution` with the objective of every improving solution, and ends the search once `should_stop` is true.
+
+    The search is ended from the solution monitor: it costs nothing between
+    solutions, whereas a custom search limit is polled between every move
+    and made searches about twice as slow.
+    """
+    if on_solution is None and should_stop is None:
+        return
+
+    def at_solution() -> None:
+        if on_solution is not None:
+            on_solution(routing.CostVar().Max())
+
+        if should_stop is not None and should_stop():
+            routing.solver().FinishCurrentSearch()
+
+    routing.AddAtSolutionCallback(at_solution)
+
+
+def find_sparse_route(
     geocoded_locations: List[List[float]],
+    candidate_neighbors: int,
+    depot: int = 0,
+    num_vehicles: int = 1,
+    metric: str = EUCLIDEAN,
+    solver_options: Optional[Dict[str, Any]] = None,
+    on_solution: Optional[Callable[[int], None]] = None,
+    initial_routes: Optional[List[List[int]]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns the solution model of a problem without time windows or `None` if none found.
+
+    Routes are searched over a `CandidateGraph` of `candidate_neighbors`
+    nearest neighbours: every other arc is removed from the routing model, so
+    neither the model nor the search ever looks at a dense matrix. First
+    solution strategies can't cope with so few arcs, the search starts from
+    the graph's route instead, or from `initial_routes` whose arcs are added
+    to the graph.
+    """
+    # pylint:disable=too-many-arguments,too-many-locals,import-outside-toplevel
+    from ortools.constraint_solver import pywrapcp
+    from ortools.util import optional_boolean_pb2
+
+    graph = CandidateGraph(geocoded_locations, candidate_neighbors, metric, depot)
+
+    if initial_routes is not None:
+        initial_routes = fit_initial_routes(
+            initial_routes, len(geocoded_locations), depot, num_vehicles, graph.get_costs
+        )
+        graph.add_routes(initial_routes)
+    else:
+        initial_routes = [graph.route] + [[]] * (num_vehicles - 1)
+
+    data = {
+        "num_vehicles": num_vehicles,
+        "depot": depot,
+    }
+
+    manager = pywrapcp.RoutingIndexManager(len(geocoded_locations), num_vehicles, depot)
+    routing = pywrapcp.RoutingModel(manager)
+
+    def transit_callback(from_index, to_index):
+        return graph.get_arc_cost(manager.IndexToNode(from_index), manager.IndexToNode(to_index))
+
+    transit_callback_index = routing.RegisterTransitCallback(transit_callback)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    routing.AddDimension(transit_callback_index, 0, max(3000, graph.max_route_cost), True, "Distance")
+    routing.GetDimensionOrDie("Distance").SetGlobalSpanCostCoefficient(SPAN_COST_COEFFICIENT)
+
+    ends = [routing.End(vehicle_id) for vehicle_id in range(num_vehicles)]
+
+    # Member constraints are much cheaper to add than `SetValues` on large domains.
+    for index in range(routing.Size()):
+        next_indices = [manager.NodeToIndex(node) for node in graph.get_allowed_nodes(manager.IndexToNode(index))]
+        routing.solver().Add(routing.solver().MemberCt(routing.NextVar(index), next_indices + ends))
+
+    add_solution_callback(routing, on_solution, should_stop)
+
+    search_parameters = create_search_parameters(solver_options)
+    # Lin-Kernighan looks at every arc to find its neighbours.
+    search_parameters.local_search_operators.use_lin_kernighan = optional_boolean_pb2.BOOL_FALSE
+    routing.CloseModelWithParameters(search_parameters)
+
+    initial_solution = routing.ReadAssignmentFromRoutes(initial_routes, True)
+
+    if initial_solution is None:
+        return None
+
+    with SOLVE_SECONDS.time():
+        # The search may run out of time before improving on the initial solution.
+        solution = routing.SolveFromAssignmentWithParameters(initial_solution, search_parameters) or initial_solution
+
+    with SOLUTION_MODEL_BUILD_SECONDS.time():
+        return build_solution_model(data, manager, routing, solution)
+
+
+def find_decomposed_route(
+    geocoded_locations: Optional[List[List[float]]],
     time_windows: Optional[List[List[int]]] = None,
     depot: int = 0,
     num_vehicles: int = 1,
+    vectorized: bool = True,
+    metric: str = EUCLIDEAN,
+    distance_matrix: Optional[List[List[float]]] = None,
+    time_matrix: Optional[List[List[float]]] = None,
+    solver_options: Optional[Dict[str, Any]] = None,
+    on_solution: Optional[Callable[[int], None]] = None,
+    matrix_store: Optional[MatrixStore] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns the solution model of a problem solved one cluster of locations at a time, or `None` if none found.
+
+    Locations are partitioned around the depot with the `decomposition` method
+    of `solver_options` (see `tsp.utils.clustering`) into
+    `decomposition_clusters` clusters, one per vehicle by default. Clusters are
+    solved as problems of their own with a share of the vehicles, in parallel
+    processes if there are several CPUs, and their routes are stitched back
+    into a single solution model.
+
+    With `decomposition_repair` the whole problem is then searched from the
+    stitched routes for the last quarter of the time limit, which moves
+    locations between clusters.
+    """
+    # pylint:disable=too-many-arguments,too-many-locals,too-many-branches
+    solver_options = solver_options or {}
+
+    if not geocoded_locations:
+        raise ValueError("Decomposition requires locations.")
+
+    cost_matrix = create_cost_matrix(
+        geocoded_locations,
+        metric,
+        distance_matrix,
+        time_matrix,
+        vectorized,
+        time_windows=time_windows,
+        matrix_store=matrix_store,
+    )
+    locations = np.asarray(geocoded_locations, dtype=np.float64).reshape(-1, 2)
+    cluster_count = solver_options.get("decomposition_clusters") or num_vehicles
+
+    if solver_options["decomposition"] == SWEEP:
+        clusters = sweep_clusters(locations, depot, cluster_count)
+    else:
+        clusters = kmeans_clusters(get_spatial_points(locations, metric), depot, cluster_count)
+
+    if not clusters:
+        # Only the depot, every vehicle gets an empty route.
+        return find_route(
+            geocoded_locations,
+            time_windows,
+            depot,
+            num_vehicles,
+            metric=metric,
+            distance_matrix=None if time_windows else cost_matrix.tolist(),
+            time_matrix=cost_matrix.tolist() if time_windows else None,
+            solver_options={**solver_options, "decomposition": None},
+            on_solution=on_solution,
+            should_stop=should_stop,
+        )
+
+    cluster_vehicles = split_vehicles([len(cluster) for cluster in clusters], num_vehicles)
+
+    # Daemonic processes, e.g. of a multiprocessing pool, can't start their own.
+    workers = 1 if multiprocessing.current_process().daemon else min(len(clusters), os.cpu_count() or 1)
+    time_limit = solver_options.get("time_limit")
+    repair = bool(solver_options.get("decomposition_repair")) and len(clusters) > 1
+    cluster_options = {
+        **solver_options,
+        "decomposition": None,
+        "candidate_neighbors": None,
+        # Clusters solved one after another share the time limit.
+        "time_limit": time_limit * (0.75 if repair else 1) / math.ceil(len(clusters) / workers)
+        if time_limit
+        else None,
+    }
+    subproblems = []
+
+    for cluster, vehicles in zip(clusters, cluster_vehicles):
+        nodes = [depot] + cluster
+        matrix = cost_matrix[np.ix_(nodes, nodes)].tolist()
+        subproblems.append(
+            functools.partial(
+                find_route,
+                locations[nodes].tolist(),
+                [time_windows[node] for node in nodes] if time_windows else None,
+                0,
+                vehicles,
+                metric=metric,
+                distance_matrix=None if time_windows else matrix,
+                time_matrix=matrix if time_windows else None,
+                solver_options=cluster_options,
+                should_stop=should_stop,
+            )
+        )
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(subproblem) for subproblem in subproblems]
+            solutions = [future.result() for future in futures]
+    else:
+        solutions = [subproblem() for subproblem in subproblems]
+
+    route_plans: List[Dict[str, Any]] = []
+
+    for cluster, solution in zip(clusters, solutions):
+        if solution is None:
+            return None
+
+        nodes = [depot] + cluster
+
+        for route_plan in solution["route_plans"]:
+            route_plan["vehicle_id"] = len(route_plans)
+
+            for route in route_plan["routes"]:
+                route["route_index"] = nodes[route["route_index"]]
+
+            route_plans.append(route_plan)
+
+    solution_data: Dict[str, Any]
+    engines = {solution["engine"] for solution in solutions if solution}
+
+    if time_windows:
+        solution_data = {
+            "objective": sum(solution["objective"] for solution in solutions if solution),
+            "total_time": sum(solution["total_time"] for solution in solutions if solution),
+            "route_plans": route_plans,
+            "engine": engines.pop() if len(engines) == 1 else MIXED_ENGINES,
+        }
+    else:
+        max_route_distance = max(route_plan["route_distance"] for route_plan in route_plans)
+        solution_data = {
+            "objective": sum(route_plan["route_distance"] for route_plan in route_plans)
+            + SPAN_COST_COEFFICIENT * max_route_distance,
+            "max_route_distance": max_route_distance,
+            "route_plans": route_plans,
+            "engine": engines.pop() if len(engines) == 1 else MIXED_ENGINES,
+        }
+
+    if repair:
+        return find_route(
+            geocoded_locations,
+            time_windows,
+            depot,
+            num_vehicles,
+            metric=metric,
+            distance_matrix=None if time_windows else cost_matrix.tolist(),
+            time_matrix=cost_matrix.tolist() if time_windows else None,
+            solver_options={**cluster_options, "time_limit": time_limit / 4 if time_limit else None},
+            on_solution=on_solution,
+            initial_routes=[[route["route_index"] for route in plan["routes"][1:-1]] for plan in route_plans],
+            should_stop=should_stop,
+        )
+
+    if on_solution is not None:
+        on_solution(solution_data["objective"])
+
+    return solution_data
+
+
+def find_tour(
+    cost: npt.NDArray[np.int64],
+    depot: int = 0,
+    solver_options: Optional[Dict[str, Any]] = None,
+    on_solution: Optional[Callable[[int], None]] = None,
+    initial_routes: Optional[List[List[int]]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the solution model of a single vehicle problem solved by `tsp.utils.fast_engine`.
+
+    Local search starts from the fitted `initial_routes` if given and
+    stops after the `time_limit` of `solver_options`, or once `should_stop`
+    returns true with the best tour so far.
+    """
+    # pylint:disable=too-many-arguments
+    solver_options = solver_options or {}
+    initial_tour = None
+
+    if initial_routes is not None:
+        initial_tour = fit_initial_routes(
+            initial_routes, len(cost), depot, 1, lambda from_nodes, to_nodes: cost[from_nodes, to_nodes]
+        )[0]
+
+    with SOLVE_SECONDS.time():
+        tour, engine = solve_tour(cost, depot, initial_tour, solver_options.get("time_limit"), should_stop)
+
+    with SOLUTION_MODEL_BUILD_SECONDS.time():
+        solution_data = build_tour_solution_model(cost, depot, tour, engine)
+
+    if on_solution is not None:
+        on_solution(solution_data["objective"])
+
+    return solution_data
+
+
+def find_route(
+    geocoded_locations: Optional[List[List[float]]],
+    time_windows: Optional[List[List[int]]] = None,
+    depot: int = 0,
+    num_vehicles: int = 1,
+    vectorized: bool = True,
+    metric: str = EUCLIDEAN,
+    distance_matrix: Optional[List[List[float]]] = None,
+    time_matrix: Optional[List[List[float]]] = None,
+    native_transit: bool = True,
+    solver_options: Optional[Dict[str, Any]] = None,
+    on_solution: Optional[Callable[[int], None]] = None,
+    initial_routes: Optional[List[List[int]]] = None,
+    matrix_store: Optional[MatrixStore] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     Returns the solution model or `None` if none found.
 
+    Arc costs come from `create_cost_matrix`. A supplied `time_matrix` is used
+    as is, whereas distances are scaled into the time window range when
+    `time_windows` are given.
+
+    With `native_transit` the cost matrix is registered with the routing model
+    directly, so arc costs never cross into Python during search. Pass `False`
+    to fall back to a Python transit callback.
+
+    `solver_options` tunes the search, see `create_search_parameters`. Its
+    `candidate_neighbors` solves the problem with `find_sparse_route` and its
+    `decomposition` with `find_decomposed_route` instead.
+    `on_solution` is called with the objective of every improving solution,
+    and the search ends early with the best one so far once `should_stop`
+    returns true, see `add_solution_callback`. It is also checked before
+    solving starts, `None` being returned if it is already true, since the
+    routing solver only calls back once it has found a first solution.
+
+    The search starts from `initial_routes` if given, one list of locations
+    (without the depot) per vehicle, unless they break the model's constraints.
+    They are fitted to the problem first, see
+    `tsp.utils.warm_start.fit_initial_routes`. Decomposition ignores them.
+
+    Distance matrices are shared through `matrix_store` if given, see
+    `create_cost_matrix`.
+
     NOTE: Uses `time_matrix` and `distance_matrix` interchangeably for the sake of simplicity.
     """
-    # pylint:disable=too-many-locals
-    distance_matrix = create_distance_matrix(geocoded_locations)
+    # pylint:disable=too-many-arguments,too-many-locals,too-many-branches,too-many-statements,too-many-return-statements
+    solver_options = solver_options or {}
+    candidate_neighbors = solver_options.get("candidate_neighbors")
+    engine = solver_options.get("engine")
+    is_single_tour = (
+        num_vehicles == 1 and not time_windows and not candidate_neighbors and not solver_options.get("decomposition")
+    )
+    given_matrix = time_matrix if time_matrix is not None else distance_matrix
+    location_count = len(given_matrix if given_matrix is not None else geocoded_locations or [])
+
+    if engine == FAST and not is_single_tour:
+        raise ValueError("The fast engine only solves single vehicle problems without time windows.")
+
+    if engine is None and is_single_tour and location_count <= settings.SOLVER_FAST_ENGINE_MAX_LOCATIONS:
+        engine = FAST
+
+    if should_stop is not None and should_stop():
+        return None
+
+    if solver_options.get("decomposition"):
+        return find_decomposed_route(
+            geocoded_locations,
+            time_windows,
+            depot,
+            num_vehicles,
+            vectorized=vectorized,
+            metric=metric,
+            distance_matrix=distance_matrix,
+            time_matrix=time_matrix,
+            solver_options=solver_options,
+            on_solution=on_solution,
+            matrix_store=matrix_store,
+            should_stop=should_stop,
+        )
 
-    if time_windows:
-        min_distance, max_distance = get_matrix_range(distance_matrix)
-        min_time, max_time = get_matrix_range(time_windows)
-        distance_matrix = scale_matrix(distance_matrix, min_distance, max_distance, min_time, max_time)
+    if candidate_neighbors:
+        if not geocoded_locations or time_windows or distance_matrix is not None or time_matrix is not None:
+            raise ValueError("Candidate neighbors require locations without time windows or matrices.")
+
+        return find_sparse_route(
+            geocoded_locations,
+            candidate_neighbors,
+            depot,
+            num_vehicles,
+            metric,
+            solver_options,
+            on_solution,
+            initial_routes=initial_routes,
+            should_stop=should_stop,
+        )
+
+    cost_matrix = create_cost_matrix(
+        geocoded_locations,
+        metric,
+        distance_matrix,
+        time_matrix,
+        vectorized,
+        time_windows=time_windows,
+        matrix_store=matrix_store,
+    )
+
+    if engine == FAST:
+        return find_tour(cost_matrix, depot, solver_options, on_solution, initial_routes, should_stop)
+
+    # Only loaded once a problem needs it, see `prewarm`.
+    from ortools.constraint_solver import pywrapcp  # pylint:disable=import-outside-toplevel
 
     matrix_model_name = "time_matrix" if time_windows else "distance_matrix"
 
     data: Dict[str, Any] = {
-        matrix_model_name: distance_matrix,
+        matrix_model_name: cost_matrix,
         "time_windows": time_windows,
         "num_vehicles": num_vehicles,
         "depot": depot,
@@ -191,14 +1065,19 @@ def find_route(
     # Create Routing Model.
     routing = pywrapcp.RoutingModel(manager)
 
-    def transit_callback(from_index, to_index):
-        """Returns the travel time between the two nodes."""
-        # Convert from routing variable Index to time matrix NodeIndex.
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data[matrix_model_name][from_node][to_node]
+    if native_transit:
+        # The matrix is copied into the solver and evaluated in C++, the lists it is copied from are dropped right away.
+        transit_callback_index = routing.RegisterTransitMatrix(data[matrix_model_name].tolist())
+    else:
 
-    transit_callback_index = routing.RegisterTransitCallback(transit_callback)
+        def transit_callback(from_index, to_index):
+            """Returns the travel time between the two nodes."""
+            # Convert from routing variable Index to time matrix NodeIndex.
+            from_node = manager.IndexToNode(from_index)
+            to_node = manager.IndexToNode(to_index)
+            return int(data[matrix_model_name][from_node, to_node])
+
+        transit_callback_index = routing.RegisterTransitCallback(transit_callback)
 
     # Define cost of each arc.
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -206,10 +1085,13 @@ def find_route(
     # Add Time Windows constraint.
     dimension_name = "Time" if time_windows else "Distance"
 
+    # Large enough for a single route to visit every location, e.g. with haversine distances in meters.
+    max_route_distance = max(3000, int(data[matrix_model_name].max(axis=1).sum()))
+
     routing.AddDimension(
         transit_callback_index,
         30 if time_windows else 0,  # allow waiting time.
-        30 if time_windows else 3000,  # maximum time per vehicle or max travel distance.
+        30 if time_windows else max_route_distance,  # maximum time per vehicle or max travel distance.
         not time_windows,  # Don't force start cumul to zero or start.
         dimension_name,
     )
@@ -217,7 +1099,7 @@ def find_route(
     time_dimension = routing.GetDimensionOrDie(dimension_name)
 
     if not time_windows:
-        time_dimension.SetGlobalSpanCostCoefficient(100)
+        time_dimension.SetGlobalSpanCostCoefficient(SPAN_COST_COEFFICIENT)
 
     if time_windows:
         # Add time window constraints for each location except depot.
@@ -242,20 +1124,106 @@ def find_route(
             routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.Start(i)))
             routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(i)))
 
-    # Setting first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC  # pylint: disable=no-member
-    )
+    search_parameters = create_search_parameters(solver_options)
+
+    add_solution_callback(routing, on_solution, should_stop)
+
+    # Building large models takes a while too.
+    if should_stop is not None and should_stop():
+        return None
+
+    initial_solution = None
+
+    if initial_routes is not None:
+        cost_array = data[matrix_model_name]
+        initial_routes = fit_initial_routes(
+            initial_routes,
+            len(cost_array),
+            depot,
+            num_vehicles,
+            lambda from_nodes, to_nodes: cost_array[from_nodes, to_nodes],
+        )
+
+        routing.CloseModelWithParameters(search_parameters)
+        initial_solution = routing.ReadAssignmentFromRoutes(initial_routes, True)
 
     # Solve the problem.
-    solution = routing.SolveWithParameters(search_parameters)
+    with SOLVE_SECONDS.time():
+        if initial_solution is not None:
+            # The search may run out of time before improving on the initial solution.
+            solution = (
+                routing.SolveFromAssignmentWithParameters(initial_solution, search_parameters) or initial_solution
+            )
+        else:
+            solution = routing.SolveWithParameters(search_parameters)
 
     # Print solution on console.
     if solution:
-        if time_windows:
-            return build_solution_model_with_time_windows(data, manager, routing, solution)
+        with SOLUTION_MODEL_BUILD_SECONDS.time():
+            if time_windows:
+                return build_solution_model_with_time_windows(data, manager, routing, solution)
 
-        return build_solution_model(data, manager, routing, solution)
+            return build_solution_model(data, manager, routing, solution)
 
     return None
+
+
+def find_route_for_problem(
+    problem_data: Dict[str, Any],
+    on_solution: Optional[Callable[[int], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Solves a problem payload as described in the README's problem request model.
+
+    Problems with `SOLVER_SPARSE_MIN_LOCATIONS` locations or more are solved
+    over a sparse candidate graph unless they need a dense matrix. Dense
+    matrices of `MATRIX_STORE_MIN_LOCATIONS` locations or more are shared
+    through the matrix store. The search starts from the payload's
+    `initial_routes` if any.
+    """
+    locations = problem_data.get("locations")
+    solver_options = validate_solver_options(
+        problem_data.get("solver_options"), problem_data.get("num_vehicles", 1), has_locations=bool(locations)
+    )
+
+    if (
+        solver_options["candidate_neighbors"] is None
+        and locations
+        and len(locations) >= settings.SOLVER_SPARSE_MIN_LOCATIONS
+        and not any(problem_data.get(field) for field in ("time_windows", "distance_matrix", "time_matrix"))
+    ):
+        solver_options["candidate_neighbors"] = settings.SOLVER_CANDIDATE_NEIGHBORS
+
+    return find_route(
+        locations,
+        problem_data.get("time_windows"),
+        problem_data.get("depot", 0),
+        problem_data.get("num_vehicles", 1),
+        metric=problem_data.get("metric", EUCLIDEAN),
+        distance_matrix=problem_data.get("distance_matrix"),
+        time_matrix=problem_data.get("time_matrix"),
+        solver_options=solver_options,
+        on_solution=on_solution,
+        should_stop=should_stop,
+        initial_routes=problem_data.get("initial_routes"),
+        matrix_store=get_matrix_store()
+        if locations and len(locations) >= settings.MATRIX_STORE_MIN_LOCATIONS
+        else None,
+    )
+
+
+def prewarm() -> None:
+    """
+    Loads OR-Tools and solves a throwaway routing model, so the first problem solved by this process doesn't pay for it.
+
+    Runs outside of `find_route` to keep the solve metrics free of it.
+    """
+    # pylint:disable=import-outside-toplevel
+    with PREWARM_SECONDS.time():
+        from ortools.constraint_solver import pywrapcp
+
+        manager = pywrapcp.RoutingIndexManager(3, 1, 0)
+        routing = pywrapcp.RoutingModel(manager)
+        routing.SetArcCostEvaluatorOfAllVehicles(routing.RegisterTransitMatrix([[0, 1, 1], [1, 0, 1], [1, 1, 0]]))
+        routing.SolveWithParameters(create_search_parameters())
@@ -0,0 +1,116 @@
+"""
+Warm starts of the routing search from the routes of a previous solution.
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+# Returns the costs of the arcs from `from_nodes` to `to_nodes`, broadcast together.
+ArcCosts = Callable[[Any, Any], npt.NDArray[np.int64]]
+
+
+def validate_initial_routes(initial_routes: Any) -> Optional[List[List[int]]]:
+    """
+    Returns the `initial_routes` of a problem, one list of location indices per vehicle.
+
+    Raises `ValueError` if they aren't lists of integers.
+    """
+    if initial_routes is None:
+        return None
+
+    if not isinstance(initial_routes, list) or not all(
+        isinstance(route, list) and all(isinstance(node, int) and not isinstance(node, bool) for node in route)
+        for route in initial_routes
+    ):
+        raise ValueError("Initial routes must be lists of location indices.")
+
+    return initial_routes
+
+
+def get_solution_routes(
+    solution: Dict[str, Any],
+    previous_locations: Optional[List[List[float]]],
+    locations: Optional[List[List[float]]],
+) -> List[List[int]]:
+    """
+    Returns the routes of a previous solution as indices of `locations`, without the depot.
+
+    Stops are matched by coordinates, so locations may be added, removed or
+    reordered between the problems, and the stops that are gone are left out.
+    Indices are kept as is when either problem has no locations.
+    """
+    routes = [[route["route_index"] for route in plan["routes"][1:-1]] for plan in solution["route_plans"]]
+
+    if previous_locations is None or locations is None:
+        return routes
+
+    indices: Dict[Any, List[int]] = {}
+
+    # Duplicated locations are matched in reverse order of appearance, any order will do.
+    for index, location in enumerate(locations):
+        indices.setdefault(tuple(map(float, location)), []).append(index)
+
+    matched_routes = []
+
+    for route in routes:
+        matched_route = []
+
+        for node in route:
+            matches = indices.get(tuple(map(float, previous_locations[node])))
+
+            if matches:
+                matched_route.append(matches.pop())
+
+        matched_routes.append(matched_route)
+
+    return matched_routes
+
+
+def fit_initial_routes(
+    routes: List[List[int]], location_count: int, depot: int, num_vehicles: int, get_costs: ArcCosts
+) -> List[List[int]]:
+    """
+    Returns `routes` fitted to a problem: one route per vehicle visiting every location but the depot once.
+
+    Unknown and repeated locations are dropped along with the routes of extra
+    vehicles. Every missing location is then inserted where it adds the least
+    cost, so the rest of the routes are left untouched.
+    """
+    # pylint:disable=too-many-arguments,too-many-locals
+    visited = np.zeros(location_count, dtype=bool)
+    visited[depot] = True
+    paths = []
+
+    for route in routes[:num_vehicles]:
+        nodes = [depot]
+
+        for node in route:
+            if 0 <= node < location_count and not visited[node]:
+                visited[node] = True
+                nodes.append(node)
+
+        paths.append(np.array(nodes + [depot], dtype=np.int64))
+
+    paths.extend(np.array([depot, depot], dtype=np.int64) for _ in range(num_vehicles - len(paths)))
+    path_costs = [get_costs(path[:-1], path[1:]) for path in paths]
+
+    for node in np.flatnonzero(~visited).tolist():
+        insertions = []
+
+        for path, costs in zip(paths, path_costs):
+            from_costs = get_costs(path[:-1], node)
+            to_costs = get_costs(node, path[1:])
+            added_costs = from_costs + to_costs - costs
+            position = int(np.argmin(added_costs))
+            insertions.append((added_costs[position], position, from_costs[position], to_costs[position]))
+
+        path_index = int(np.argmin([insertion[0] for insertion in insertions]))
+        _, position, from_cost, to_cost = insertions[path_index]
+
+        paths[path_index] = np.insert(paths[path_index], position + 1, node)
+        # The arc replaced by the node becomes the arcs to and from it.
+        path_costs[path_index] = np.insert(path_costs[path_index], position, from_cost)
+        path_costs[path_index][position + 1] = to_cost
+
+    return [path[1:-1].tolist() for path in paths]
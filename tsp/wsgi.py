@@ -11,6 +11,10 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from tsp.utils.metrics import observe_startup
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tsp.settings")
 
 application = get_wsgi_application()
+
+observe_startup()